@@ -26,7 +26,8 @@ SRC = [("pico/src/%s.py" % m, "src/%s.py" % m) for m in (
     # deploy-time editable (never frozen — see manifest.py)
     "BOOT", "CONFIG",
     # core pipeline
-    "adc_device", "log_record",
+    "adc_device", "sample_ring", "live_frames", "live_view", "record_queue",
+    "log_record",
     # storage / logging
     "flash_writer", "session_profile", "error_buffer", "logconfig",
     # crash handling
@@ -44,6 +44,10 @@ freeze("$(APP_DIR)", "boot.py")
 freeze("$(APP_DIR)/src", (
     # ADC / Core 1
     "adc_device.py",
+    "sample_ring.py",
+    "live_frames.py",
+    "live_view.py",
+    "record_queue.py",
     "log_record.py",
 
     # Storage / logging
@@ -12,18 +12,21 @@
 #   1. sys.path guard - /src importable from anywhere.
 #   2. Grab the pre-log ErrorBuffer from boot.py.
 #   3. Factory-reset check (Button A held at boot) - blocking, headless.
-#   4. Logging: timestamped syslog file, flush errbuf.
+#   4. Logging: timestamped syslog file, flush errbuf. Then recovery of the
+#      session a reset left open (flash_writer.recover — that file only),
+#      an integrity pass over the sessions not yet checked
+#      (flash_writer.verify_new, or verify_all with CONFIG.FLASH_VERIFY_ALL;
+#      logged only) and the boot statvfs for the free-space cache.
 #   5. Exception handlers: asyncio loop handler + Core 1 fault bridge.
 #   6. Core 1: polled ADC capture thread.
 #   7. Core 0 asyncio tasks: publisher, monitor, buttons, beeper, flash
-#      writer, flash quota monitor, Wi-Fi (optional), BLE (optional),
-#      web server (optional, needs Wi-Fi), watchdog.
+#      writer, flush scheduler, flash quota monitor, Wi-Fi (optional), BLE
+#      (optional), web server (optional, needs Wi-Fi), watchdog.
 
 import sys
 import gc
 import time
 import array
-import struct
 import _thread
 import asyncio
 from micropython import const
@@ -46,16 +49,35 @@ import fatal_handler
 from factory_reset import check_and_run as _factory_reset_check
 from adc_device import ADCDevice
 import adc_device as _adc
+from sample_ring import SampleRing
+from live_frames import Fanout, GAP
+from live_view import LiveView
+from record_queue import RecordQueue
 from buzzer import Beeper
-from primitives import Pushbutton, RingbufQueue
+from primitives import Pushbutton
 import flash_writer as fw
 from flash_writer import FlashWriter
 
 try:
-    from CONFIG import MODE, SAMPLE_RATE_HZ, CRASH_AUTO_REBOOT_MS, WIFI_MIN_FREE_BYTES
+    from CONFIG import (MODE, SAMPLE_RATE_HZ, CRASH_AUTO_REBOOT_MS, WIFI_MIN_FREE_BYTES,
+                        SESSION_FORMAT, SESSION_BLOCK_CRC, SESSION_RAW_ADC,
+                        SESSION_TIME_UNIT_US, FLASH_RECONCILE_S, FLASH_TIME_WARN_S,
+                        FLASH_AUTO_COMPACT, FLASH_VERIFY_ALL, ADC_OVERSAMPLE,
+                        CORE1_WAKE_EVERY, CORE1_WAKE_MS)
 except Exception:
     MODE = "debug"
     SAMPLE_RATE_HZ = 200
+    ADC_OVERSAMPLE = 1
+    CORE1_WAKE_EVERY = 4
+    CORE1_WAKE_MS = 20
+    SESSION_FORMAT = 1
+    SESSION_BLOCK_CRC = True
+    SESSION_RAW_ADC = False
+    SESSION_TIME_UNIT_US = 1000
+    FLASH_RECONCILE_S = 60
+    FLASH_TIME_WARN_S = (300, 120, 60)
+    FLASH_AUTO_COMPACT = False
+    FLASH_VERIFY_ALL = False
     CRASH_AUTO_REBOOT_MS = 120_000
     WIFI_MIN_FREE_BYTES = 40 * 1024
 
@@ -70,24 +92,40 @@ from session_profile import PROFILE, LANE_COLORS, lane_color
 log = None   # assigned in _setup_logging()
 
 # ── Inter-core shared state ────────────────────────────────────────────────
-_stop_flag       = [False]
-_core1_lock      = _thread.allocate_lock()
+_stop_flag       = [False]       # read by Core 1 without a lock, see adc_device
 _core1_fault_msg = [""]
 
-# Zero-allocation ring: Core 1 writes only machine integers. Layout: 4 int32
-# per slot = (t_us, raw_adc0, raw_adc1, raw_adc2). Sized generously for a
-# 200 Hz default rate (256 slots ~= 1.28 s of buffering) while staying a
-# power of 2, as adc_device.py requires.
+# Zero-allocation lock-free ring (sample_ring.py): Core 1 writes only machine
+# integers. Layout: 4 int32 per slot = (t_us, raw_adc0, raw_adc1, raw_adc2).
+# Sized generously for a 200 Hz default rate (256 slots ~= 1.28 s of
+# buffering) while staying a power of 2, as SampleRing requires.
 _RING_SLOTS = const(256)
-_ring      = array.array('i', (0 for _ in range(_RING_SLOTS * 4)))
-_ring_head = array.array('i', [0])    # written by Core 1 only
-_ring_tail = array.array('i', [0])    # written by Core 0 only
-
-# Direct fan-out, same shape as the reference: publisher packs one wire
-# tuple and put_nowait's it to every subscriber (flash writer, /ws clients).
-# Format must match webserver.LIVE_FMT.
-_LIVE_FMT = '<ifff'   # t_us(i32), current_A, track_V, supply_V
-_subscribers: list = []
+_ring = SampleRing(_RING_SLOTS)
+# Core 1 pacing counters (adc_device "Pacing instrumentation"), written by
+# Core 1 only; _timing_base is the flash writer's copy at session start.
+_timing      = _adc.new_timing()
+_timing_base = _adc.new_timing()
+
+# Fan-out in frames (live_frames.py): the publisher copies samples from the
+# ring into one preallocated frame of up to _FRAME_SAMPLES rows and hands its
+# rows to every tap and subscriber. The flash writer subscribes with a
+# RecordQueue (record_queue.py) and gets a copy of the rows, so its headroom
+# is a compact int array of its own — and when that's full the publisher
+# leaves samples in the ring rather than drop them, so the writer can fall
+# _WRITER_RECORDS + _RING_SLOTS samples (~3.2 s at 200 Hz) behind before
+# anything is lost. /ws viewers don't subscribe to frames at all: _view
+# (live_view.py) taps every frame once and hands them bucket lines at the
+# rate they asked for, so nothing keeps a frame and one is enough. Rows are
+# raw read_u16() counts, not units: each consumer converts only if it needs
+# to (adc_device.to_units) — a raw-ADC flash session never does. When Core 1
+# laps the publisher, the overwritten slots are gone: a GAP row
+# (live_frames.GAP) then precedes the next sample.
+_FRAME_SAMPLES = const(8)      # 8 rows x 16 B, allocated once
+_WRITER_RECORDS = const(384)   # ~1.9 s at 200 Hz: 384 x 16 B = 6 KB
+_WRITER_BATCH  = const(64)     # rows per get_many() drain
+_fanout = Fanout(_FRAME_SAMPLES)
+_view = LiveView(_adc.to_units)
+_fanout.tap(_view)
 
 _recording       = [False]   # Button A / BLE / web toggle
 _marker_pending  = [False]   # Button B / BLE / web one-shot
@@ -104,6 +142,7 @@ _wifi_monitor_task_handle = None
 
 from asyncio import ThreadSafeFlag as _TSF
 _core1_fault_ts: _TSF = _TSF()
+_ring_ready: _TSF = _TSF()      # set by Core 1 when samples are waiting
 
 
 # ══════════════════════════════════════════════════════════════════════════
@@ -125,6 +164,30 @@ def _setup_logging() -> None:
               MODE, gc.mem_free())
 
 
+def _verify_sessions() -> None:
+    """Recover the session a reset left open (flash_writer.recover — only
+    that file is read), then report torn or corrupted session files among
+    those not verified yet (every file with FLASH_VERIFY_ALL). Reads each
+    block of those once (CRC32 in C, no record decoding), before Core 1 is
+    competing for the bus; never fails boot."""
+    t0 = time.ticks_ms()
+    try:
+        rec = fw.recover()
+        if rec is not None:
+            log.warning("Session %s recovered: kept %d of %d bytes",
+                        rec['name'], rec['kept'], rec['size'])
+        bad = fw.verify_all() if FLASH_VERIFY_ALL else fw.verify_new()
+    except Exception as e:
+        log.warning("Session verify skipped: %s", e)
+        return
+    for name, r in bad.items():
+        log.warning("Session %s damaged: good to offset %d of %d (%d blocks, crc=%s, closed=%s)",
+                    name, r['good_end'], r['size'], r['blocks'], r['crc'], r['closed'])
+    log.info("Session verify: %d damaged, %d ms", len(bad),
+             time.ticks_diff(time.ticks_ms(), t0))
+    fw.space.refresh()
+
+
 # ══════════════════════════════════════════════════════════════════════════
 # Stage 5 — Exception handlers
 # ══════════════════════════════════════════════════════════════════════════
@@ -147,8 +210,7 @@ def _core1_exception_handler(exc_type, exc_value) -> None:
     msg = "{}: {}".format(exc_type.__name__ if exc_type else "?", exc_value)
     print("Core1: fault:", msg)
     _core1_fault_msg[0] = msg
-    with _core1_lock:
-        _stop_flag[0] = True
+    _stop_flag[0] = True
     _core1_fault_ts.set()
 
 
@@ -173,9 +235,9 @@ def _start_core1() -> None:
     global _worker
     ADCDevice.fault_handler = _core1_exception_handler
     _worker = ADCDevice(
-        ring=_ring, ring_head=_ring_head, ring_tail=_ring_tail,
-        ring_slots=_RING_SLOTS, lock=_core1_lock, stop_flag=_stop_flag,
-        sample_rate_hz=SAMPLE_RATE_HZ,
+        ring=_ring, stop_flag=_stop_flag, sample_rate_hz=SAMPLE_RATE_HZ, oversample=ADC_OVERSAMPLE,
+        timing=_timing, wake=_ring_ready,
+        wake_every=CORE1_WAKE_EVERY, wake_ms=CORE1_WAKE_MS,
     )
     log.info("Starting Core 1 ADC capture thread")
     _thread.start_new_thread(_worker.run, ())
@@ -188,48 +250,42 @@ def _start_core1() -> None:
 # ── 7a. Publisher ───────────────────────────────────────────────────────────
 
 async def _publisher_task() -> None:
-    """Drain the Core 1 ring, scale to physical units, fan out to subscribers."""
+    """Drain the Core 1 ring a frame at a time and fan each frame out to
+    the live view and the flash writer (live_frames.py). Each sample is
+    already the mean of ADC_OVERSAMPLE reads per channel. Sleeps until
+    Core 1 sets _ring_ready (every CORE1_WAKE_EVERY samples or
+    CORE1_WAKE_MS), then takes everything waiting in one pass — at most
+    about _RING_SLOTS, so one pass stays short."""
     log.info("Publisher task started")
-    SCALE_I = _adc.VOLT_PER_COUNT / _adc.CURRENT_SENSITIVITY_V_PER_A
-    SCALE_V = _adc.VOLT_PER_COUNT * _adc.VOLTAGE_DIVIDER_GAIN
-    BATCH = const(20)
     n_published = 0
+    n_wakeups = 0
     last_report = time.ticks_ms()
-    ring, head, tail = _ring, _ring_head, _ring_tail
-    mask = _RING_SLOTS - 1
+    last_missed = 0
+    last_held = 0
+    get = _ring.get
+    fanout = _fanout
 
     try:
         while True:
-            zero = _adc.zero_current_raw
-            count = 0
-            while count < BATCH:
-                t = tail[0]
-                h = head[0]
-                if t == h:
-                    break
-                if ((h - t) & 0x3FFFFFFF) > _RING_SLOTS:
-                    t = (h - _RING_SLOTS) & 0x3FFFFFFF   # Core 1 lapped us
-                i = (t & mask) << 2
-                t_us = ring[i]
-                current_A = (ring[i + 1] - zero) * SCALE_I
-                track_V   = ring[i + 2] * SCALE_V
-                supply_V  = ring[i + 3] * SCALE_V
-
-                packed = struct.pack(_LIVE_FMT, t_us, current_A, track_V, supply_V)
-                for q in _subscribers:
-                    try:
-                        q.put_nowait(packed)
-                    except Exception:
-                        pass   # subscriber overrun - oldest discarded
-                tail[0] = (t + 1) & 0x3FFFFFFF
-                count += 1
+            await _ring_ready.wait()
+            n_wakeups += 1
+            count = fanout.pump(get, _RING_SLOTS)
             n_published += count
 
             if time.ticks_diff(time.ticks_ms(), last_report) >= 5000:
-                log.info("Publisher: %d samples total, %d subscribers",
-                          n_published, len(_subscribers))
+                log.info("Publisher: %d samples total (x%d oversampled), %d wake-ups, "
+                          "%d subscribers", n_published, ADC_OVERSAMPLE,
+                          n_wakeups, len(fanout.subscribers))
+                missed = _timing[_adc.T_MISSED]
+                if missed != last_missed:
+                    log.warning("Core 1: %d slots missed in 5 s, worst lateness %d us",
+                                missed - last_missed, _timing[_adc.T_MAX_US])
+                    last_missed = missed
+                if fanout.held != last_held:
+                    log.warning("Flash writer behind: publisher held back %d times in 5 s",
+                                fanout.held - last_held)
+                    last_held = fanout.held
                 last_report = time.ticks_ms()
-            await asyncio.sleep_ms(5)
     except asyncio.CancelledError:
         log.info("Publisher task cancelled")
         raise
@@ -305,8 +361,9 @@ def _do_erase() -> None:
         log.warning("Erase refused: capture still running")
         _beeper.command_rejected()
         return
-    n_data = fw.erase_all()
+    n_data = fw.erase_all(refresh=False)
     n_logs = logconfig.erase_logs()
+    fw.space.refresh()          # once both are gone, not between them
     log.info("Erased %d session file(s), %d log file(s) (BLE command)", n_data, n_logs)
     _beeper.erase_done()
 
@@ -407,15 +464,23 @@ def _status_dict() -> dict:
         'flash_free_pct': _flash_free_pct(),
         'record_count': _writer.record_count() if _writer else 0,
         'wifi_up': _wifi.connected() if _wifi else False,
+        'flash_io': _writer.io_stats() if _writer else None,
+        'time_left_s': _writer.seconds_left() if _writer else None,
+        'flush_hist': _flush_policy.histogram(),
+        'adc_oversample': ADC_OVERSAMPLE,
+        'core1_timing': _adc.timing_dict(_timing),
+        'ring_overruns': _ring.overruns,
+        'ring_lost_slots': _ring.lost,
+        'publisher_held': _fanout.held,
+        'subscribers': _fanout.stats() + _view.stats(),
+        'live_view_lines': _view.lines,
     }
 
 
 def _flash_free_pct() -> int:
-    import os
+    """From flash_writer's cached figure — no statvfs per status request."""
     try:
-        st = os.statvfs('/')
-        total, free = st[2], st[3]
-        return int(free * 100 / total) if total else 0
+        return fw.space.pct()
     except Exception:
         return 0
 
@@ -429,61 +494,153 @@ async def _flash_writer_task() -> None:
     dt_ms stays a true "since previous record" delta (see log_record.py)."""
     global _writer
     log.info("Flash writer task started")
-    queue: RingbufQueue = RingbufQueue(200)
-    _subscribers.append(queue)
-    _writer = FlashWriter(sample_rate_hz=SAMPLE_RATE_HZ)
+    queue = RecordQueue(_WRITER_RECORDS)
+    sub = _fanout.subscribe(queue, _WRITER_RECORDS, 'flash')
+    rows = array.array('i', (0 for _ in range(_WRITER_BATCH * 4)))
+    raw = SESSION_RAW_ADC and SESSION_FORMAT == 2
+    _writer = FlashWriter(sample_rate_hz=SAMPLE_RATE_HZ, version=SESSION_FORMAT,
+                          block_crc=SESSION_BLOCK_CRC, raw_adc=raw,
+                          time_unit_us=SESSION_TIME_UNIT_US if SESSION_FORMAT == 2 else 1000,
+                          sync_ms=None,     # _flush_task syncs, off this path
+                          oversample=ADC_OVERSAMPLE)
     was_recording = False
 
     try:
         while True:
-            packed = await queue.get()
-            t_us, current_A, track_V, supply_V = struct.unpack(_LIVE_FMT, packed)
-
-            if _recording[0]:
-                if not was_recording:
-                    try:
-                        fname = _writer.start()
-                        was_recording = True
-                        log.info("Session started: %s", fname)
-                    except fw.FlashQuotaError as e:
-                        log.error("Cannot start session: %s", e)
-                        _recording[0] = False
-                        _beeper.flash_full()
-                        continue
-
-                if _marker_pending[0]:
-                    _marker_pending[0] = False
-                    _writer.write_marker(t_us, track_V, supply_V)
-                _writer.write_sample(t_us, current_A, track_V, supply_V)
-
-                if _writer.record_count() % 100 == 0:
-                    _writer.flush()
-            else:
-                if was_recording:
+            # Everything waiting, in one step.
+            got = await queue.get_many(rows)
+            for k in range(0, got << 2, 4):
+                t_us, raw_i, raw_vt, raw_vs = rows[k], rows[k + 1], rows[k + 2], rows[k + 3]
+                if raw_i == GAP:
+                    if was_recording:
+                        _writer.write_gap(t_us, raw_vt)
+                    continue
+
+                if _recording[0]:
+                    if not was_recording:
+                        try:
+                            fname = _writer.start(raw_cal=_adc.raw_cal() if raw else None)
+                            _adc.timing_mark(_timing, _timing_base)
+                            was_recording = True
+                            log.info("Session started: %s", fname)
+                        except fw.FlashQuotaError as e:
+                            log.error("Cannot start session: %s", e)
+                            _recording[0] = False
+                            _beeper.flash_full()
+                            continue
+
+                    if raw:
+                        if _marker_pending[0]:
+                            _marker_pending[0] = False
+                            _writer.write_marker(t_us, raw_vt, raw_vs)
+                        _writer.write_sample(t_us, raw_i, raw_vt, raw_vs)
+                    else:
+                        current_A, track_V, supply_V = _adc.to_units(raw_i, raw_vt, raw_vs)
+                        if _marker_pending[0]:
+                            _marker_pending[0] = False
+                            _writer.write_marker(t_us, track_V, supply_V)
+                        _writer.write_sample(t_us, current_A, track_V, supply_V)
+                    # No flush here: FlashWriter writes whole 4 KB blocks and
+                    # _flush_task decides when to sync them.
+                elif was_recording:
                     n = _writer.record_count()
-                    _writer.close()
+                    timing = _adc.timing_dict(_timing, _timing_base)
+                    _writer.close(timing=timing)
                     was_recording = False
-                    log.info("Session closed (%d records)", n)
+                    log.info("Session closed (%d records, %d lost to ring overruns, "
+                             "%d slots missed, worst lateness %d us)",
+                             n, _writer.lost_samples(), timing['missed'],
+                             timing['max_late_us'])
 
     except asyncio.CancelledError:
         if was_recording:
-            _writer.close()
-        try:
-            _subscribers.remove(queue)
-        except ValueError:
-            pass
+            _writer.close(timing=_adc.timing_dict(_timing, _timing_base))
+        _fanout.unsubscribe(sub)
         log.info("Flash writer task cancelled")
         raise
 
 
+_compacting = [None]      # session name while _compact_task runs
+
+
+async def _compact_task(name: str) -> None:
+    """Compact one session (flash_writer.Compactor) a chunk of rows per
+    event-loop turn, so capture, the web server and BLE keep running."""
+    t0 = time.ticks_ms()
+    try:
+        c = fw.Compactor(name)
+    except Exception as e:
+        log.warning("Cannot compact %s: %s", name, e)
+        _compacting[0] = None
+        return
+    try:
+        while not c.step():
+            await asyncio.sleep_ms(0)
+        old, new = c.commit()
+        log.info("Compacted %s: %d -> %d bytes in %d ms", name, old, new,
+                 time.ticks_diff(time.ticks_ms(), t0))
+    except Exception as e:
+        c.abort()
+        log.error("Compacting %s failed: %s", name, e)
+    finally:
+        _compacting[0] = None
+
+
+_flush_policy = fw.FlushPolicy()
+
+
+async def _flush_task() -> None:
+    """Sync the open session when _flush_policy says so — pending bytes past
+    CONFIG.FLASH_FLUSH_BYTES or older than CONFIG.FLASH_SYNC_MS — in its
+    own task, so a slow littlefs commit never runs inside the sample loop.
+    Each flush's duration goes into the policy's histogram (/api/status
+    'flush_hist')."""
+    while True:
+        await asyncio.sleep_ms(50)
+        w = _writer
+        if w is not None and w.is_open() and _flush_policy.due(w):
+            us = _flush_policy.flush(w)
+            if us > 100_000:
+                log.warning("Slow flash flush: %d ms", us // 1000)
+
+
 async def _flash_quota_task() -> None:
     """Stop recording when flash drops below CONFIG.FLASH_MIN_FREE; warn at
     CONFIG.FLASH_LOW_WARN. Polled rather than checked per-sample — cheap and
-    frequent enough (2 s) given the small floors involved."""
+    frequent enough (2 s) given the small floors involved, since it reads
+    the cached free-space figure; the real statvfs runs every
+    CONFIG.FLASH_RECONCILE_S to correct its drift. While recording, also
+    beeps once as the estimated capture time left drops through each of
+    CONFIG.FLASH_TIME_WARN_S. With CONFIG.FLASH_AUTO_COMPACT, a low or full
+    flash starts compacting the oldest session, one at a time."""
     warned = False
+    time_warned = None       # lowest FLASH_TIME_WARN_S threshold beeped for
+    last = time.ticks_ms()
     while True:
         await asyncio.sleep(2)
+        if time.ticks_diff(time.ticks_ms(), last) >= FLASH_RECONCILE_S * 1000:
+            last = time.ticks_ms()
+            drift = fw.space.refresh()
+            if drift:
+                log.debug("Flash free estimate off by %d bytes", drift)
+        if _recording[0] and _writer is not None:
+            left = _writer.seconds_left()
+            level = None
+            for th in FLASH_TIME_WARN_S:
+                if left <= th and (level is None or th < level):
+                    level = th
+            if level is not None and (time_warned is None or level < time_warned):
+                log.warning("About %d s of recording left", left)
+                _beeper.time_low()
+                time_warned = level
+        else:
+            time_warned = None
         state = FlashWriter.quota_state()
+        if FLASH_AUTO_COMPACT and state != "ok" and _compacting[0] is None:
+            name = fw.compact_candidate()
+            if name is not None:
+                _compacting[0] = name
+                asyncio.create_task(_compact_task(name))
         if state == "full":
             if _recording[0]:
                 log.error("Flash below floor — stopping recording")
@@ -545,7 +702,7 @@ async def _webserver_task() -> None:
     # big import compacts the heap so the allocation has room.
     gc.collect()
     from webserver import app, configure as configure_webserver
-    configure_webserver(_status_dict, _do_start, _do_stop, _do_mark, _subscribers)
+    configure_webserver(_status_dict, _do_start, _do_stop, _do_mark, _view)
     log.info("Web server starting on :80")
     try:
         await app.start_server(host='0.0.0.0', port=80, debug=(MODE != "production"))
@@ -618,6 +775,7 @@ async def _main() -> None:
 
     tasks.append(asyncio.create_task(_buttons_task()))
     tasks.append(asyncio.create_task(_flash_writer_task()))
+    tasks.append(asyncio.create_task(_flush_task()))
     tasks.append(asyncio.create_task(_flash_quota_task()))
 
     # BLE is a FALLBACK at boot, not started alongside a working Wi-Fi web
@@ -666,6 +824,7 @@ async def _main() -> None:
 def _boot() -> None:
     _check_factory_reset()   # stage 3
     _setup_logging()         # stage 4
+    _verify_sessions()
     _start_core1()           # stage 6
     time.sleep_ms(50)        # let Core 1 finish calibration before Core 0 reads it
 
@@ -679,8 +838,7 @@ if __name__ == "__main__":
         _boot()
         asyncio.run(_main())
     except KeyboardInterrupt:
-        with _core1_lock:
-            _stop_flag[0] = True
+        _stop_flag[0] = True
         if log:
             log.info("Keyboard interrupt - shutting down")
         else:
@@ -700,6 +858,5 @@ if __name__ == "__main__":
             pass
         raise
     finally:
-        with _core1_lock:
-            _stop_flag[0] = True
+        _stop_flag[0] = True
         asyncio.new_event_loop()
@@ -17,9 +17,51 @@ REBOOT_BUTTON_PIN    = 16        # held at boot -> factory reset (Button A's pin
 
 # ── ADC capture ────────────────────────────────────────────────────────────
 # Published sample rate. See README "Flash budget" for the space/duration
-# tradeoff — 8 bytes/record, so e.g. 200 Hz = 1.6 KB/s.
+# tradeoff — 8 bytes/record, so e.g. 200 Hz = 1.6 KB/s (v1; v2 below is
+# typically 2-3x smaller).
 SAMPLE_RATE_HZ       = 200
 
+# Reads per channel per published sample. Core 1 sums them and stores the
+# rounded mean, so the stored rate and format don't change but uncorrelated
+# noise (the LEM current channel's, mostly) drops by ~sqrt(N). 1 = off.
+# SAMPLE_RATE_HZ x ADC_OVERSAMPLE is capped (adc_device.MAX_READ_RATE).
+ADC_OVERSAMPLE       = 4
+
+# Core 1 wakes the Core 0 publisher (a ThreadSafeFlag) once every
+# CORE1_WAKE_EVERY samples, or sooner once CORE1_WAKE_MS has passed since
+# the last wake-up — the latency bound at low sample rates. The publisher
+# otherwise sleeps, and drains everything waiting on each wake-up.
+CORE1_WAKE_EVERY     = 4
+CORE1_WAKE_MS        = 20
+
+# ── Session file format (log_record.py) ─────────────────────────────────────
+# 1 = 'SCL1', fixed 8-byte records (what older tools/decode_log.py copies
+#     understand). 2 = 'SCL2', delta/varint-compressed blocks — several
+#     times more session time in the same flash, but tools/decode_log.py
+#     copies older than SCL2 support can't read it. The device's CSV
+#     download and the current tools/decode_log.py read both. Opt in.
+SESSION_FORMAT       = 1
+
+# v2 only: end every block with a CRC32 (4 bytes of each 512) so a torn tail
+# after a power cut, or flash bit-rot, is detected — by the boot-time verify
+# pass, tools/decode_log.py --verify, and every reader, which skips a bad
+# block instead of decoding garbage.
+SESSION_BLOCK_CRC    = True
+
+# v2 only: store the raw read_u16() ADC counts (scaling constants and the
+# calibrated zero go in the session header) instead of centi-amps/-volts —
+# no float conversion per sample on the device, and no precision lost to
+# re-quantizing. Readers (CSV download, tools/decode_log.py) convert, but a
+# reader that ignores the header's RAW_ADC flag shows wrong values. Opt in.
+SESSION_RAW_ADC      = False
+
+# v2 only: timebase for record times, in us — 1000 (whole ms), 100 or 10.
+# Above ~500 Hz a whole-ms dt is only ever 0 or 1, so per-sample timing is
+# lost (the session's total time stays exact either way — the encoder
+# carries the sub-unit remainder). Finer units cost a little compression,
+# since tick jitter then shows up in every dt.
+SESSION_TIME_UNIT_US = 1000
+
 # ── Flash quota guard (flash_writer.py) ─────────────────────────────────────
 # Absolute free-space floor, in bytes, below which capture is stopped.
 # Measured on real hardware (mpy build, unfrozen): the littlefs filesystem's
@@ -36,6 +78,36 @@ FLASH_LOW_WARN       = 96 * 1024   # beeper "flash-low" warning threshold
 # deleting a driver's data is worse than telling them to unload it.
 FLASH_AUTO_ROTATE    = False
 
+# If True, once flash is low main.py compacts the oldest session in the
+# background instead: rewritten as (min, max, mean) per
+# FLASH_COMPACT_BUCKET_MS bucket with every lap marker kept, replacing the
+# original. Loses sample-level detail but keeps every session's lap data.
+FLASH_AUTO_COMPACT   = False
+FLASH_COMPACT_BUCKET_MS = 50
+
+# Boot integrity pass (flash_writer): by default only sessions closed since
+# the last boot (or already found damaged) are checked, so boot time doesn't
+# grow with flash usage. True re-reads every session file in full each boot.
+FLASH_VERIFY_ALL     = False
+
+# Longest a session's records sit written-but-unsynced before flash_writer
+# flushes the file (a littlefs metadata commit). Bounds what a power cut can
+# lose; between syncs records go out in whole 4 KB writes.
+FLASH_SYNC_MS        = 2000
+# ...and the most that can sit unsynced before it's flushed sooner. Both are
+# applied by main.py's flush task (flash_writer.FlushPolicy), off the sample
+# path.
+FLASH_FLUSH_BYTES    = 8 * 1024
+
+# Free space is tracked from the bytes written (statvfs is slow on littlefs);
+# how often flash_writer's estimate is checked against a real statvfs.
+FLASH_RECONCILE_S    = 60
+
+# Recording-time-left warnings: while capturing, the beeper sounds once as
+# the estimated capture time left (flash_writer.FlashWriter.seconds_left)
+# drops through each of these, in seconds. () disables them.
+FLASH_TIME_WARN_S    = (300, 120, 60)
+
 # ── BLE-triggered dynamic Wi-Fi start ───────────────────────────────────────
 # Free-heap floor main.py checks before starting Wi-Fi + the web server on a
 # BLE "start Wi-Fi" command, refusing (and beeping command_rejected) rather
@@ -12,6 +12,14 @@
 # prototype's device.py already used successfully on this exact board —
 # paced to CONFIG.SAMPLE_RATE_HZ (default 200 Hz) in a tight Core 1 loop.
 #
+# What oversampling it does is plain integer arithmetic: with
+# CONFIG.ADC_OVERSAMPLE = N, each slot takes N reads per channel (channels
+# interleaved), sums them in small ints and stores the rounded mean — still a
+# u16 count, so the ring, the wire format and raw-ADC sessions are unchanged.
+# read_u16() is the 12-bit conversion scaled up by 16, so the mean's low bits
+# carry real sub-LSB resolution once N > 1. The factor is recorded in the
+# session header (log_record FLAG_OVERSAMPLE).
+#
 # ── Core 1 design rules (same as the reference, still apply) ──────────────────
 #   1. ZERO heap allocation inside the run loop after init. The ADC objects
 #      are constructed in __init__, which MUST run on Core 0 — allocation on
@@ -20,23 +28,48 @@
 #   2. No logging-module calls, ever, in the loop. print() only in one-time
 #      init / shutdown / exception paths.
 #   3. Data leaves Core 1 through a pre-allocated integer ring buffer built
-#      on Core 0. Core 1 writes head; Core 0 (publisher) writes tail; a
-#      _thread lock (also allocated on Core 0) guards head publication and
-#      the stop flag.
+#      on Core 0 (sample_ring.SampleRing). Core 1 writes head; Core 0
+#      (publisher) writes tail; no lock — see sample_ring.py for why plain
+#      word stores are enough. The stop flag is read without a lock too,
+#      once every STOP_CHECK_EVERY slots.
 #   4. The worker object MUST be constructed on Core 0. Only the bound
 #      method worker.run is handed to _thread.start_new_thread.
+#   5. Core 0 isn't polled for: every wake_every samples, or once wake_ms
+#      has passed since the last time, the loop sets the `wake`
+#      ThreadSafeFlag (allocated on Core 0; set() allocates nothing) and
+#      the publisher drains whatever has piled up. Head itself is still
+#      stored per sample — it's one word store, and holding it back would
+#      only shrink the consumer's margin before an overrun.
+#
+# ── Pacing instrumentation ───────────────────────────────────────────────────
+# The loop never blocks on Core 0, but Core 0's GC, Wi-Fi and BLE still
+# contend for the bus and flash, so a slot can start late — and past a whole
+# interval late, the loop skips to the next boundary rather than bunching
+# samples. Both are counted in a `timing` int array built on Core 0
+# (new_timing()) and only ever written by Core 1, each element a single word
+# store: a lateness histogram (bin upper edges TIMING_EDGES_US, last bin open),
+# missed slots, and the worst lateness — lifetime and since the last
+# timing_mark(). Core 0 reads it any time with timing_dict().
 
 import time
 import array
 from machine import ADC, Pin
 
 MIN_RATE, MAX_RATE = 10, 2000     # sane bounds for a polled (no-DMA) capture
+MAX_OVERSAMPLE = 64
+# Cap on rate x oversample: three read_u16() calls plus loop overhead cost
+# roughly 30 us per round under MicroPython — an estimate, not a bench
+# figure — and this keeps that under about half of every slot.
+MAX_READ_RATE = 16_000
+# Slots between stop-flag checks: up to ~0.16 s at 200 Hz before a stop is
+# noticed, and not a per-sample cost.
+STOP_CHECK_EVERY = 32
 
 ADC_PIN_26 = 26   # ADC0 - current, LEM CASR 50-NP, +-0.025 V/A
 ADC_PIN_27 = 27   # ADC1 - track voltage divider
 ADC_PIN_28 = 28   # ADC2 - supply voltage divider
 
-# ── Scaling constants (applied on Core 0 by the publisher) ────────────────────
+# ── Scaling constants (applied on Core 0, by whichever consumer needs units) ──
 # machine.ADC.read_u16() always returns a 16-bit-scaled value regardless of
 # the underlying 12-bit SAR resolution, so these are simpler than the
 # reference's raw-12-bit-register maths — same constants the early prototype
@@ -44,36 +77,93 @@ ADC_PIN_28 = 28   # ADC2 - supply voltage divider
 VOLT_PER_COUNT        = 3.3 / 65535     # ADC reference / full u16 range
 CURRENT_SENSITIVITY_V_PER_A = 0.025     # LEM CASR 50-NP
 VOLTAGE_DIVIDER_GAIN  = 17.966 / 3.3    # divider: 0-18V track/supply -> 0-3.3V
+SCALE_I = VOLT_PER_COUNT / CURRENT_SENSITIVITY_V_PER_A   # amps per count
+SCALE_V = VOLT_PER_COUNT * VOLTAGE_DIVIDER_GAIN          # volts per count
 
 # Zero-current offset in u16 ADC counts. Updated by calibrate_current();
-# read by the Core 0 publisher (import adc_device; adc_device.zero_current_raw).
+# read on Core 0 (import adc_device; adc_device.zero_current_raw).
 zero_current_raw: int = 32768   # mid-scale until calibrated
 
 
+# ── timing array layout (see "Pacing instrumentation" above) ──────────────────
+TIMING_EDGES_US = (50, 100, 250, 500, 1000, 2500, 5000, 10000)
+T_MISSED     = 0     # slots skipped because the loop ran a whole interval late
+T_MAX_US     = 1     # worst lateness since boot
+T_MARK_MAX_US = 2    # worst lateness since timing_mark()
+T_HIST       = 3     # len(TIMING_EDGES_US) + 1 bin counts from here
+TIMING_LEN   = T_HIST + len(TIMING_EDGES_US) + 1
+
+
+def new_timing():
+    """A zeroed timing array. Core 0 only — it allocates."""
+    return array.array('i', (0 for _ in range(TIMING_LEN)))
+
+
+def timing_mark(timing, base) -> None:
+    """Copy timing into base (another new_timing() array) and restart the
+    since-mark maximum, so timing_dict(timing, base) covers only what
+    happened after this call — e.g. one session. Core 0."""
+    for k in range(TIMING_LEN):
+        base[k] = timing[k]
+    timing[T_MARK_MAX_US] = 0
+
+
+def timing_dict(timing, base=None) -> dict:
+    """{'edges_us', 'counts', 'missed', 'max_late_us'} — lifetime, or since
+    timing_mark(timing, base) when base is given. Core 0."""
+    if base is None:
+        return {'edges_us': TIMING_EDGES_US,
+                'counts': [timing[k] for k in range(T_HIST, TIMING_LEN)],
+                'missed': timing[T_MISSED], 'max_late_us': timing[T_MAX_US]}
+    return {'edges_us': TIMING_EDGES_US,
+            'counts': [timing[k] - base[k] for k in range(T_HIST, TIMING_LEN)],
+            'missed': timing[T_MISSED] - base[T_MISSED],
+            'max_late_us': timing[T_MARK_MAX_US]}
+
+
+def to_units(raw_i: int, raw_vt: int, raw_vs: int):
+    """read_u16() counts -> (current_A, track_V, supply_V). Core 0 only —
+    three float operations per call."""
+    return ((raw_i - zero_current_raw) * SCALE_I, raw_vt * SCALE_V, raw_vs * SCALE_V)
+
+
+def raw_cal():
+    """(amps/count, volts/count, zero-current count) for a raw-ADC session
+    header (log_record.RAW_CAL_FMT)."""
+    return (SCALE_I, SCALE_V, zero_current_raw)
+
+
 class ADCDevice:
     """
     Core 1 ADC capture worker. Construct on Core 0, then:
         _thread.start_new_thread(worker.run, ())
-    Stop by setting stop_flag[0] = True under the lock.
+    Stop by setting stop_flag[0] = True; the loop notices within
+    STOP_CHECK_EVERY slots. Samples go to `ring` (a SampleRing), pacing
+    counters to `timing` (new_timing(); one is made if not given); `wake`,
+    if given, is set per rule 5 above.
     """
 
     # Set by main.py to escalate Core 1 exceptions: ADCDevice.fault_handler = fn
     fault_handler = None
 
-    def __init__(self, ring, ring_head, ring_tail, ring_slots, lock, stop_flag,
-                 sample_rate_hz: int = 200):
-        if ring_slots & (ring_slots - 1):
-            raise ValueError("ring_slots must be a power of 2")
+    def __init__(self, ring, stop_flag, sample_rate_hz: int = 200,
+                 oversample: int = 1, timing=None, wake=None,
+                 wake_every: int = 1, wake_ms: int = 20):
         if not MIN_RATE <= sample_rate_hz <= MAX_RATE:
             raise ValueError("sample_rate_hz out of range (%d..%d)" % (MIN_RATE, MAX_RATE))
+        if not 1 <= oversample <= MAX_OVERSAMPLE:
+            raise ValueError("oversample out of range (1..%d)" % MAX_OVERSAMPLE)
+        if sample_rate_hz * oversample > MAX_READ_RATE:
+            raise ValueError("sample_rate_hz x oversample over %d reads/s" % MAX_READ_RATE)
 
         self._ring  = ring
-        self._head  = ring_head
-        self._tail  = ring_tail
-        self._mask  = ring_slots - 1
-        self._lock  = lock
         self._stop  = stop_flag
         self._interval_us = 1_000_000 // sample_rate_hz
+        self._n = oversample
+        self.timing = new_timing() if timing is None else timing
+        self._wake = wake
+        self._wake_every = max(1, wake_every)
+        self._wake_us = wake_ms * 1000
         self._running = False
 
         # ADC objects are constructed HERE, on Core 0 — allocation-free from
@@ -84,7 +174,8 @@ class ADCDevice:
         self._adc2 = ADC(Pin(ADC_PIN_28))
 
         print("Core1: ADCDevice ready  pins 26/27/28  rate =",
-              sample_rate_hz, "Hz  interval =", self._interval_us, "us")
+              sample_rate_hz, "Hz  interval =", self._interval_us, "us  oversample =",
+              oversample)
 
     # ── Hardware init (one-time, prints allowed) ──────────────────────────────
 
@@ -124,8 +215,9 @@ class ADCDevice:
 
     def _loop(self):
         """
-        Allocation-free polling loop: read three channels, timestamp, store,
-        pace to the target interval. No DMA — the ADC's own conversion time
+        Allocation-free polling loop: read three channels (n times each,
+        summed and averaged in small ints), timestamp, store, pace to the
+        target interval. No DMA — the ADC's own conversion time
         (a few microseconds per channel) plus a tight sleep_us gives ample
         margin at the target rates (10-2000 Hz) without missing a beat even
         with Core 0 busy on Wi-Fi/BLE, since a Core 0 GC pause only delays
@@ -133,47 +225,81 @@ class ADCDevice:
         FIFO, there is no overrun to recover from — read_u16() just runs a
         touch late).
         """
-        lock = self._lock
         stop = self._stop
-        ring = self._ring
-        head = self._head
-        mask = self._mask
+        put = self._ring.put
         interval = self._interval_us
+        n = self._n
+        half = n >> 1
         adc0, adc1, adc2 = self._adc0, self._adc1, self._adc2
+        timing = self.timing
+        edges = TIMING_EDGES_US
+        n_edges = len(edges)
 
-        next_due = time.ticks_add(time.ticks_us(), interval)
+        due = time.ticks_us()
+        next_due = time.ticks_add(due, interval)
+        check = STOP_CHECK_EVERY
+        wake = self._wake
+        wake_every = self._wake_every
+        wake_us = self._wake_us
+        pending = 0
+        woke = due
 
         while True:
-            lock.acquire()
-            s = stop[0]
-            lock.release()
-            if s:
-                print("Core1: stop flag set - exiting loop")
-                break
+            check -= 1
+            if not check:
+                if stop[0]:
+                    print("Core1: stop flag set - exiting loop")
+                    break
+                check = STOP_CHECK_EVERY
 
             t = time.ticks_us()
-            r0 = adc0.read_u16()
-            r1 = adc1.read_u16()
-            r2 = adc2.read_u16()
+            late = time.ticks_diff(t, due)
+            if late < 0:
+                late = 0
+            k = 0
+            while k < n_edges and late >= edges[k]:
+                k += 1
+            timing[T_HIST + k] += 1
+            if late > timing[T_MARK_MAX_US]:
+                timing[T_MARK_MAX_US] = late
+                if late > timing[T_MAX_US]:
+                    timing[T_MAX_US] = late
 
-            h = head[0]
-            i = (h & mask) << 2
-            ring[i]     = t
-            ring[i + 1] = r0
-            ring[i + 2] = r1
-            ring[i + 3] = r2
+            if n == 1:
+                r0 = adc0.read_u16()
+                r1 = adc1.read_u16()
+                r2 = adc2.read_u16()
+            else:
+                # Sums stay under 64 x 65535 — small ints, no allocation
+                # (and for-range compiles to a plain counter loop).
+                r0 = r1 = r2 = half
+                for _ in range(n):
+                    r0 += adc0.read_u16()
+                    r1 += adc1.read_u16()
+                    r2 += adc2.read_u16()
+                r0 //= n
+                r1 //= n
+                r2 //= n
 
-            lock.acquire()
-            head[0] = (h + 1) & 0x3FFFFFFF
-            lock.release()
+            put(t, r0, r1, r2)
+            if wake is not None:
+                pending += 1
+                if pending >= wake_every or time.ticks_diff(t, woke) >= wake_us:
+                    wake.set()
+                    pending = 0
+                    woke = t
 
             # Pace to the next slot. If we're already late (Core 0 stole a
-            # lot of time), skip straight to the next boundary instead of
+            # lot of time), sample that slot now, count any whole slots that
+            # went by unsampled and re-anchor on the next boundary instead of
             # accumulating drift.
             now = time.ticks_us()
             remaining = time.ticks_diff(next_due, now)
+            due = next_due
             if remaining > 0:
                 time.sleep_us(remaining)
                 next_due = time.ticks_add(next_due, interval)
             else:
+                if remaining <= -interval:
+                    timing[T_MISSED] += -remaining // interval
                 next_due = time.ticks_add(now, interval)
@@ -106,9 +106,18 @@ _FILE_CHUNK_UUID   = bluetooth.UUID('B1190F03-176F-4B32-A715-89B3425A4076')  # r
 #                                  fetched listing's order (data files
 #                                  first, then log files, each sorted —
 #                                  see _file_entries)
+#   _CTRL_LAPS + u16-LE index (3 bytes total)   -> stream that session's
+#                                  lap table (JSON) instead of its
+#                                  contents — read from the session
+#                                  catalog or the file's trailer, so it's
+#                                  a few hundred bytes even for a
+#                                  40-minute session (null while
+#                                  recording if it would need a full
+#                                  scan, see flash_writer.lap_table)
 _CTRL_NEXT   = b'\x00'
 _CTRL_LIST   = b'\x01'
 _CTRL_SELECT = 0x02
+_CTRL_LAPS   = 0x03
 
 _ADV_APPEARANCE_LOGGER = 128   # org.bluetooth.characteristic.gap.appearance "Generic Computer"
 
@@ -128,7 +137,9 @@ CMD_LANE_ROTATE = 6
 CMD_LANE_SET    = 7   # byte 1: lane number, 1-8
 CMD_RACE_TOGGLE = 8   # flips practice <-> race
 
-_STATUS_FMT = '<BBHB'  # recording(0/1), flash_free_pct(0-100), record_count(u16, wraps), wifi_up(0/1)
+_STATUS_FMT = '<BBHBHHH'  # recording(0/1), flash_free_pct(0-100), record_count(u16, wraps), wifi_up(0/1),
+                          # time_left_s(u16, 0xFFFF = unknown or longer),
+                          # Core 1 missed slots (u16, wraps), worst lateness (u16 us, saturates)
 
 
 def _device_id() -> str:
@@ -174,7 +185,7 @@ class BLEServer:
         self._logger_svc = aioble.Service(_LOGGER_SVC_UUID)
         self._status = aioble.Characteristic(
             self._logger_svc, _LOGGER_STATUS_UUID, read=True, notify=True,
-            initial=struct.pack(_STATUS_FMT, 0, 100, 0))
+            initial=struct.pack(_STATUS_FMT, 0, 100, 0, 0, 0xFFFF, 0, 0))
         self._control = aioble.Characteristic(
             self._logger_svc, _LOGGER_CONTROL_UUID, write=True, capture=True)
         self._profile = aioble.Characteristic(
@@ -256,12 +267,17 @@ class BLEServer:
             if self._connection is not None and self._status_fn is not None:
                 try:
                     st = self._status_fn()
+                    left = st.get('time_left_s')
+                    timing = st.get('core1_timing') or {}
                     packed = struct.pack(
                         _STATUS_FMT,
                         1 if st.get('recording') else 0,
                         max(0, min(100, st.get('flash_free_pct', 0))),
                         st.get('record_count', 0) & 0xFFFF,
-                        1 if st.get('wifi_up') else 0)
+                        1 if st.get('wifi_up') else 0,
+                        0xFFFF if left is None else min(left, 0xFFFF),
+                        timing.get('missed', 0) & 0xFFFF,
+                        min(timing.get('max_late_us', 0), 0xFFFF))
                     self._status.write(packed)
                     self._status.notify(self._connection)
                 except Exception as e:
@@ -324,12 +340,17 @@ class BLEServer:
     #      FILE_SELECT and repeat until a chunk comes back empty. What
     #      you've reassembled is JSON: a list of {"name", "kind"
     #      ("data"/"log"), "size"} objects, in a fixed order (data files
-    #      first, then log files, each sorted).
+    #      first, then log files, each sorted). Data files also carry
+    #      "records", "duration_ms", "summary" and "lost" (from the
+    #      session catalog — summary is null for a session still
+    #      recording; lost counts samples a ring overrun dropped).
     #   3. To fetch one of them, write _CTRL_SELECT + its position in that
     #      list as a u16-LE (3 bytes total) to FILE_SELECT, then repeat
     #      step 2 to pull its contents. Empty on the very first read means
     #      the index was out of range (e.g. the list changed underneath
     #      you — erase or a new session — since step 2; re-fetch it).
+    #   4. Same as 3 with _CTRL_LAPS instead of _CTRL_SELECT pulls just a
+    #      data file's lap table: JSON list of {"record", "t_ms"}.
     #
     # Like status/profile, FILE_CHUNK is a plain cached characteristic —
     # aioble's Characteristic serves whatever was last .write()-ten, it
@@ -348,30 +369,50 @@ class BLEServer:
     # _CTRL_LIST/_CTRL_SELECT) before reading FILE_CHUNK.
 
     def _file_entries(self):
-        """Ordered (path, name, kind, size) tuples — the single source of
-        truth for both the JSON listing (_build_file_list) and
-        select-by-index (_file_select_task), so the two always agree on
-        what index N means. list_sessions()/list_logs() are both already
-        sorted, so this order is stable as long as the underlying files
-        haven't changed between a listing and a later select."""
-        entries = []
-        for data_dir, kind in ((fw.DATA_DIR, 'data'), (logconfig.LOG_DIR, 'log')):
-            names = fw.list_sessions() if kind == 'data' else logconfig.list_logs()
-            for name in names:
-                path = data_dir + '/' + name
-                try:
-                    size = os.stat(path)[6]
-                except OSError:
-                    size = 0
-                entries.append((path, name, kind, size))
+        """Ordered (path, name, kind, size, catalog entry) tuples for the
+        JSON listing (_build_file_list): data files first, from
+        flash_writer's session catalog (sorted, sizes included — no
+        per-file stat), then the handful of syslog files, listed and
+        stat'd. _entry_at() resolves select-by-index in the same order, so
+        the two agree on what index N means as long as the underlying
+        files haven't changed between a listing and a later select."""
+        entries = [(fw.DATA_DIR + '/' + name, name, 'data', e['size'], e)
+                   for name, e in fw.catalog()]
+        for name in logconfig.list_logs():
+            path = logconfig.LOG_DIR + '/' + name
+            try:
+                size = os.stat(path)[6]
+            except OSError:
+                size = 0
+            entries.append((path, name, 'log', size, None))
         return entries
 
+    def _entry_at(self, index):
+        """(path, name, kind) of the index-th _file_entries() file, or
+        None, without building that list: a data file is one catalog
+        lookup, and only a log-file index lists /syslog."""
+        data = fw.catalog()
+        if 0 <= index < len(data):
+            name = data[index][0]
+            return fw.DATA_DIR + '/' + name, name, 'data'
+        logs = logconfig.list_logs()
+        index -= len(data)
+        if 0 <= index < len(logs):
+            return logconfig.LOG_DIR + '/' + logs[index], logs[index], 'log'
+        return None
+
     def _build_file_list(self) -> bytes:
         import json
-        return json.dumps([
-            {'name': name, 'kind': kind, 'size': size}
-            for _path, name, kind, size in self._file_entries()
-        ]).encode()
+        out = []
+        for _path, name, kind, size, e in self._file_entries():
+            entry = {'name': name, 'kind': kind, 'size': size}
+            if kind == 'data':
+                entry['records'] = e['records']
+                entry['duration_ms'] = e['duration_ms']
+                entry['summary'] = e['summary']
+                entry['lost'] = e.get('lost', 0)
+            out.append(entry)
+        return json.dumps(out).encode()
 
     def _close_xfer(self) -> None:
         if self._xfer_file is not None:
@@ -413,21 +454,24 @@ class BLEServer:
                 self._xfer_file = io.BytesIO(self._build_file_list())
                 self._prepare_chunk()
                 continue
-            if len(data) == 3 and data[0] == _CTRL_SELECT:
+            if len(data) == 3 and data[0] in (_CTRL_SELECT, _CTRL_LAPS):
                 index = data[1] | (data[2] << 8)
                 self._close_xfer()
-                entries = self._file_entries()
-                if 0 <= index < len(entries):
-                    path, name, _kind, _size = entries[index]
+                found = self._entry_at(index)
+                if found is not None:
+                    path, name, kind = found
                     try:
-                        self._xfer_file = open(path, 'rb')
+                        if data[0] == _CTRL_SELECT:
+                            self._xfer_file = open(path, 'rb')
+                            _log().info("BLE file transfer opened: %s", name)
+                        elif kind == 'data':
+                            import json
+                            self._xfer_file = io.BytesIO(json.dumps(fw.lap_table(path)).encode())
                         self._xfer_name = name
-                        _log().info("BLE file transfer opened: %s", name)
-                    except OSError as e:
+                    except (OSError, ValueError) as e:
                         _log().warning("BLE file select: cannot open %s: %s", name, e)
                 else:
-                    _log().warning("BLE file select: index %d out of range (%d files)",
-                                    index, len(entries))
+                    _log().warning("BLE file select: index %d out of range", index)
                 self._prepare_chunk()
                 continue
             _log().warning("BLE file select: unrecognized payload (%d bytes)", len(data))
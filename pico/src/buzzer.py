@@ -101,6 +101,7 @@ class Beeper:
     def capture_stop(self):   self.play([("G5", 70)])
     def lap_mark(self):       self.play([("C7", 40)])
     def flash_low(self):      self.play([("A4", 90), (None, 60), ("A4", 90)])
+    def time_low(self):       self.play([("E5", 60), (None, 40), ("E5", 60), (None, 40), ("E5", 60)])
     def flash_full(self):     self.play([("A4", 150), ("A4", 150), ("A4", 150)])
     def fatal_error(self):    self.play([("C4", 200), (None, 80), ("C4", 200),
                                           (None, 80), ("C4", 200)])
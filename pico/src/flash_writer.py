@@ -5,34 +5,81 @@
 # /data (created on first use) on the internal flash filesystem. There is no
 # SD card to fail over to on this board, so running low is handled by
 # stopping (the safe default) or, if CONFIG.FLASH_AUTO_ROTATE is explicitly
-# enabled, deleting the oldest session file(s) to make room.
+# enabled, deleting the oldest session file(s) to make room. A third policy,
+# CONFIG.FLASH_AUTO_COMPACT, keeps every session but rewrites the oldest at
+# reduced resolution (Compactor below) — run in the background by main.py
+# once flash is low, a chunk of rows per event-loop turn.
 #
-# time.ticks_us()/ticks_diff() are MicroPython-only; _ticks_diff() below
-# falls back to plain subtraction on CPython so this module (and its dt_ms
-# bookkeeping) is exercised directly by the host test suite instead of only
-# through hardware-dependent mocks.
+# Records are packed by a log_record.RecordEncoder (v1) or BlockEncoder (v2,
+# the compressed 'SCL2' format) into one preallocated buffer owned by the
+# writer and written out a batch at a time, so the
+# steady state allocates no bytes object and issues no file.write() per
+# sample. dt_ms bookkeeping lives in the encoder (see log_record.py for its
+# CPython ticks fallback, which keeps this module host-testable).
+#
+# The buffer is one 4 KB flash erase block, and the file is only flush()ed
+# (littlefs commits its metadata) once CONFIG.FLASH_SYNC_MS has passed since
+# the last one — not every N records — so a steady session costs one whole-
+# block write per 4 KB and one metadata commit per sync interval. io_stats()
+# counts both against the bytes written. (File offsets aren't padded to 4 KB:
+# littlefs stores its own skip-list pointers inside each data block, so file
+# offsets don't map onto erase blocks anyway — write SIZE is what matters.)
+#
+# On the device that sync isn't judged on the sample path at all: main.py
+# builds the writer with sync_ms=None and a FlushPolicy (below) decides, from
+# its own asyncio task, when pending bytes or their age call for a flush() —
+# and times every one, so littlefs stalls show up in a histogram.
 
 import os
 import time
+import array
+import json
 
 import log_record as lr
 from session_profile import PROFILE
 
 try:
-    from CONFIG import FLASH_MIN_FREE, FLASH_LOW_WARN, FLASH_AUTO_ROTATE
+    from CONFIG import (FLASH_MIN_FREE, FLASH_LOW_WARN, FLASH_AUTO_ROTATE, FLASH_SYNC_MS,
+                        FLASH_COMPACT_BUCKET_MS, FLASH_FLUSH_BYTES)
 except Exception:
     FLASH_MIN_FREE = 64 * 1024
     FLASH_LOW_WARN = 192 * 1024
     FLASH_AUTO_ROTATE = False
+    FLASH_SYNC_MS = 2000
+    FLASH_COMPACT_BUCKET_MS = 50
+    FLASH_FLUSH_BYTES = 8 * 1024
+
+try:
+    _ticks_us = time.ticks_us
+except AttributeError:           # CPython (host tests)
+    def _ticks_us():
+        return time.monotonic_ns() // 1000
 
 DATA_DIR = "/data"
 _EXT = ".bin"
-
-try:
-    _ticks_diff = time.ticks_diff
-except AttributeError:
-    def _ticks_diff(a, b):
-        return a - b
+# Session index/catalog: a small JSON file beside the sessions (not a _EXT
+# file, so listings and erase_all skip it), kept in RAM once read. 'open'
+# names the session a writer has started but not closed — after a reset
+# that's the one file recover() needs to look at — and 'sessions' maps each
+# session file to its catalog entry (see _entry), so listings and BLE
+# select-by-index are one in-memory lookup instead of an os.stat and a
+# trailer read per file; 'verified' marks an entry verify_new() has
+# already checked, 'laps' holds a v1 session's lap markers as flat
+# (record number, t_ms) pairs (a v2 session's are in its trailer), 'gaps'
+# its ring-overrun gaps as flat (record number, lost) pairs (v2 writes gap
+# records), 'lost' the samples those lost in all, and 'timing' the
+# session's Core 1 pacing counts (adc_device.timing_dict()).
+# start()/close(), recover(), erase_all() and rotation keep it in step; an
+# index that's missing (first boot on this firmware) is rebuilt once by
+# scanning /data.
+INDEX_NAME = "index.json"
+
+# Bytes buffered in RAM between file writes: one rp2 littlefs erase block.
+# Anything still pending is written by flush()/close() (and the FLASH_SYNC_MS
+# cap), so this bounds write granularity, not loss on an orderly stop.
+_BATCH_BYTES = 4096
+_BATCH_RECORDS = _BATCH_BYTES // lr.RECORD_SIZE
+_BATCH_BLOCKS = _BATCH_BYTES // lr.BLOCK_SIZE     # v2: whole compressed blocks
 
 
 def _free_bytes(path="/"):
@@ -41,6 +88,59 @@ def _free_bytes(path="/"):
     return st[0] * st[3]     # f_bsize * f_bfree
 
 
+def _total_bytes(path="/"):
+    st = os.statvfs(path)
+    return st[0] * st[2]     # f_bsize * f_blocks
+
+
+class FreeSpace:
+    """
+    Cached free-space figure for the status and quota paths. statvfs on
+    littlefs walks the block allocator — slow, and slower the fuller the
+    filesystem — so it runs once at boot (the first free()), after every
+    erase/rotation, and on the caller's reconciliation period (refresh());
+    in between, FlashWriter charges each write's byte count against the
+    cached figure. littlefs's own overhead (metadata commits, block
+    rounding) isn't charged, so the estimate runs slightly optimistic until
+    the next refresh() corrects it.
+    """
+
+    def __init__(self, path="/"):
+        self._path = path
+        self._free = None
+        self._total = 0
+
+    def refresh(self):
+        """Re-read statvfs. Returns the drift it corrected (estimate minus
+        actual bytes free; 0 on the first read)."""
+        est = self._free
+        self._free = _free_bytes(self._path)
+        if not self._total:
+            self._total = _total_bytes(self._path)
+        return 0 if est is None else est - self._free
+
+    def invalidate(self):
+        """Forget the cached figure; the next free() re-reads statvfs."""
+        self._free = None
+
+    def charge(self, n):
+        if self._free is not None:
+            self._free -= n
+
+    def free(self):
+        if self._free is None:
+            self.refresh()
+        return max(0, self._free)
+
+    def pct(self):
+        free = self.free()
+        return int(free * 100 / self._total) if self._total else 0
+
+
+# The one tracker for the flash filesystem — every status path reads it.
+space = FreeSpace()
+
+
 def ensure_data_dir(data_dir=DATA_DIR):
     try:
         os.mkdir(data_dir)
@@ -53,12 +153,259 @@ def list_sessions(data_dir=DATA_DIR):
     return sorted(f for f in os.listdir(data_dir) if f.endswith(_EXT))
 
 
-def erase_all(data_dir=DATA_DIR):
-    """Delete every session file. Returns the count removed."""
+def lap_table(path):
+    """[{'record', 't_ms'}, ...] for every lap marker in one session file —
+    from its catalog entry (a v1 session's laps are kept there at close),
+    else a single trailer read for a closed v2 session. Anything else needs
+    a full scan (see log_record.SessionReader.laps), which blocks the event
+    loop for as long as it takes: it's refused (None) while a session is
+    recording, and its result is kept in the catalog so it runs only once."""
+    data_dir, _, name = path.rpartition("/")
+    idx = load_index(data_dir)
+    entry = idx['sessions'].get(name)
+    if entry is not None and 'laps' in entry:
+        laps = entry['laps']
+        return [{'record': laps[k], 't_ms': laps[k + 1]} for k in range(0, len(laps), 2)]
+    with open(path, "rb") as f:
+        r = lr.SessionReader(f)
+        scan = r.section(lr.TAG_LAPS) is None
+        if scan and idx['open'] is not None:
+            return None
+        laps = r.laps()
+    if scan and entry is not None:
+        entry['laps'] = [v for pair in laps for v in pair]
+        _save_index(idx, data_dir)
+    return [{'record': n, 't_ms': t} for n, t in laps]
+
+
+def session_summary(path):
+    """The summary a closed v2 session carries in its trailer (see
+    log_record.SessionStats), or None — v1, still open, or unreadable.
+    Reads the header and trailer only, so it's cheap enough for listings."""
+    try:
+        with open(path, "rb") as f:
+            return lr.SessionReader(f).summary()
+    except (OSError, ValueError):
+        return None
+
+
+def verify(name, data_dir=DATA_DIR):
+    """Integrity report for one session file (log_record.verify): block
+    CRCs (or keyframe sanity without them) are checked, records aren't
+    decoded. good_end is the offset just past the last good block."""
+    with open(data_dir + "/" + name, "rb") as f:
+        return lr.verify(f)
+
+
+def verify_all(data_dir=DATA_DIR):
+    """{name: verify() report} for every session that isn't clean — an
+    empty dict means nothing needs attention. Reads every session file in
+    full, so boot runs it only if CONFIG.FLASH_VERIFY_ALL; see verify_new."""
+    bad = {}
+    for name in list_sessions(data_dir):
+        try:
+            report = verify(name, data_dir)
+        except OSError:
+            continue
+        if not report['ok']:
+            bad[name] = report
+    return bad
+
+
+def verify_new(data_dir=DATA_DIR):
+    """verify_all() for only the catalog entries not yet marked 'verified'
+    — sessions closed since the last boot, or ones already found damaged —
+    so the boot pass doesn't grow with /data. Clean ones are marked and
+    not read again. The open session is left to recover()."""
+    idx = load_index(data_dir)
+    bad = {}
+    changed = False
+    for name, e in idx['sessions'].items():
+        if e.get('verified') or name == idx['open']:
+            continue
+        try:
+            report = verify(name, data_dir)
+        except OSError:
+            continue
+        if report['ok']:
+            e['verified'] = True
+            changed = True
+        else:
+            bad[name] = report
+    if changed:
+        _save_index(idx, data_dir)
+    return bad
+
+
+_indexes = {}     # data_dir -> loaded index
+
+
+def _entry(size=0, start_epoch=0, summary=None):
+    """One catalog entry. summary is an unpack_summary() dict, kept whole
+    for every version — for v1, which has no trailer, the catalog is the
+    only place it's kept."""
+    summary = summary or {}
+    return {'size': size, 'start_epoch': start_epoch,
+            'records': summary.get('samples', 0) + summary.get('markers', 0),
+            'markers': summary.get('markers', 0),
+            'duration_ms': summary.get('duration_ms', 0),
+            'summary': summary or None}
+
+
+def _scan_entry(path):
+    """Catalog entry read from the file itself — the trailer for a closed
+    v2 session, a full scan otherwise."""
+    size = os.stat(path)[6]
+    with open(path, "rb") as f:
+        r = lr.SessionReader(f)
+        summary = r.summary()
+        trailer = summary is not None
+        if not trailer:
+            summary = r.summarize()
+        e = _entry(size, r.header['start_epoch'], summary)
+        if r.header['bucket_ms']:
+            e['bucket_ms'] = r.header['bucket_ms']
+        if not trailer:
+            e['laps'] = [v for pair in r.laps() for v in pair]
+        timing = r.timing()
+        if timing is not None:
+            e['timing'] = timing
+        return e
+
+
+def load_index(data_dir=DATA_DIR):
+    """The session index ({'open': name or None, 'sessions': {name:
+    entry}}). Read from flash once per boot, rebuilt by a scan if it's
+    missing or unreadable; the same dict is returned after that."""
+    idx = _indexes.get(data_dir)
+    if idx is not None:
+        return idx
+    try:
+        with open(data_dir + "/" + INDEX_NAME) as f:
+            idx = json.load(f)
+        idx.setdefault('open', None)
+        idx.setdefault('sessions', {})
+        _indexes[data_dir] = idx
+        return idx
+    except (OSError, ValueError):
+        pass
+    idx = {'open': None, 'sessions': {}}
+    for name in list_sessions(data_dir):
+        try:
+            idx['sessions'][name] = _scan_entry(data_dir + "/" + name)
+        except (OSError, ValueError):
+            idx['sessions'][name] = _entry()
+    _save_index(idx, data_dir)
+    return idx
+
+
+def _save_index(idx, data_dir=DATA_DIR):
+    """Write-then-rename, so a reset mid-write leaves the old index."""
+    _indexes[data_dir] = idx
+    path = data_dir + "/" + INDEX_NAME
+    with open(path + ".tmp", "w") as f:
+        json.dump(idx, f)
+    os.rename(path + ".tmp", path)
+
+
+def catalog(data_dir=DATA_DIR):
+    """[(name, entry), ...] sorted by name, like list_sessions(), from the
+    in-RAM index — no directory listing or per-file stat."""
+    sessions = load_index(data_dir)['sessions']
+    return [(name, sessions[name]) for name in sorted(sessions)]
+
+
+def _forget(names, data_dir=DATA_DIR):
+    idx = load_index(data_dir)
+    for name in names:
+        idx['sessions'].pop(name, None)
+        if idx['open'] == name:
+            idx['open'] = None
+    _save_index(idx, data_dir)
+
+
+def _copy_prefix(src, dst, n, buf):
+    """Copy the first n bytes of src to dst through buf."""
+    src.seek(0)
+    mv = memoryview(buf)
+    while n > 0:
+        got = src.readinto(buf)
+        if not got:
+            break
+        got = min(got, n)
+        dst.write(buf if got == len(buf) else mv[:got])
+        n -= got
+
+
+def recover(data_dir=DATA_DIR):
+    """
+    Boot-time pass: if the index says a session was still open when the
+    device last went down, trim that one file to its last whole record (v1)
+    or last good block (v2, which also gets a rebuilt trailer so laps and
+    the summary stay a header+trailer read) and mark it 'recovered' in the
+    index. Only that file is read, so boot cost doesn't grow with /data.
+
+    Returns {'name', 'size', 'kept'} for a trimmed file, or None when
+    nothing was open. MicroPython files can't be truncated, so the good
+    prefix is copied to a temp file that then replaces the original.
+    """
+    idx = load_index(data_dir)
+    name = idx['open']
+    if name is None:
+        return None
+    path = data_dir + "/" + name
+    result = None
+    try:
+        with open(path, "rb") as f:
+            report = lr.verify(f)
+    except OSError:
+        report = None            # never got created, or already deleted
+    if report is not None and not (report['ok'] and report['closed']):
+        tmp = path + ".tmp"
+        with open(path, "rb") as src, open(tmp, "wb") as dst:
+            _copy_prefix(src, dst, report['good_end'], bytearray(_BATCH_BYTES))
+        lost = 0
+        if report['version'] == lr.HEADER_VERSION_V2:
+            with open(tmp, "rb") as f:
+                rd = lr.SessionReader(f)
+                sections = rd.rebuild_sections()
+                lost = rd.lost
+            with open(tmp, "ab") as dst:
+                n = 0
+                for tag, payload in sections:
+                    sec = lr.pack_section(tag, payload)
+                    dst.write(sec)
+                    n += len(sec)
+                dst.write(lr.pack_trailer_end(n))
+        os.rename(tmp, path)
+        result = {'name': name, 'size': report['size'], 'kept': report['good_end']}
+        try:
+            entry = _scan_entry(path)
+        except (OSError, ValueError):
+            entry = _entry(report['good_end'])
+        entry['recovered'] = True
+        if lost:
+            entry['lost'] = lost
+        entry['verified'] = True     # trimmed to its good prefix just now
+        idx['sessions'][name] = entry
+    elif report is None:
+        idx['sessions'].pop(name, None)
+    idx['open'] = None
+    _save_index(idx, data_dir)
+    return result
+
+
+def erase_all(data_dir=DATA_DIR, refresh=True):
+    """Delete every session file. Returns the count removed. refresh=False
+    leaves the free-space figure to the caller, for one space.refresh()
+    after deleting other files too."""
     n = 0
     for f in list_sessions(data_dir):
         os.remove(data_dir + "/" + f)
         n += 1
+    _save_index({'open': None, 'sessions': {}}, data_dir)
+    if refresh:
+        space.refresh()
     return n
 
 
@@ -68,9 +415,270 @@ def _rotate_oldest(data_dir=DATA_DIR):
     if not sessions:
         return False
     os.remove(data_dir + "/" + sessions[0])
+    _forget(sessions[:1], data_dir)
+    space.refresh()
     return True
 
 
+def compact_candidate(data_dir=DATA_DIR):
+    """Oldest session worth compacting — closed, not already compacted (or
+    found not to shrink), and at least a couple of batches long — or None."""
+    idx = load_index(data_dir)
+    for name, e in catalog(data_dir):
+        if (name != idx['open'] and not e.get('bucket_ms') and not e.get('no_compact')
+                and e['size'] >= 2 * _BATCH_BYTES):
+            return name
+    return None
+
+
+class Compactor:
+    """
+    Rewrites one closed session at reduced resolution: per bucket_ms bucket
+    one (min, max, mean) triple of records, every lap marker kept, as a v2
+    FLAG_BUCKETS file (see log_record's BUCKETS notes) with a fresh trailer
+    — time index, renumbered laps, and the ORIGINAL session's summary.
+
+        c = Compactor(name)
+        while not c.step():          # a chunk of rows per call
+            await asyncio.sleep_ms(0)
+        c.commit()                   # atomic replace; abort() on error
+
+    The new file is written beside the old one and renamed over it only in
+    commit(), so a reset mid-compaction leaves the original intact (plus a
+    stray .tmp the next compaction of that session overwrites).
+    """
+
+    def __init__(self, name, data_dir=DATA_DIR, bucket_ms=FLASH_COMPACT_BUCKET_MS):
+        self._name = name
+        self._data_dir = data_dir
+        self._path = data_dir + "/" + name
+        self._tmp = self._path + ".tmp"
+        self._bucket_ms = bucket_ms
+        self._src = self._dst = None
+        try:
+            self._src = open(self._path, "rb")
+            reader = lr.SessionReader(self._src)
+            hdr = reader.header
+            if hdr['bucket_ms']:
+                raise ValueError("already compacted: {}".format(name))
+            unit = hdr['time_unit_us']
+            self._span = max(1, bucket_ms * 1000 // unit)
+            flags = hdr['flags'] & (lr.FLAG_BLOCK_CRC | lr.FLAG_RAW_ADC)
+            self._dst = open(self._tmp, "wb")
+            self._dst.write(lr.pack_header(
+                hdr['start_epoch'], hdr['sample_rate_hz'], json.dumps(hdr['profile']),
+                version=lr.HEADER_VERSION_V2, flags=flags, raw_cal=hdr['raw_cal'],
+                time_unit_us=unit, bucket_ms=bucket_ms, oversample=hdr['oversample']))
+        except Exception:
+            # Unreadable or already compacted: don't pick it again.
+            self.abort()
+            idx = load_index(data_dir)
+            entry = idx['sessions'].get(name)
+            if entry is not None:
+                entry['no_compact'] = True
+                _save_index(idx, data_dir)
+            raise
+        self._buf = bytearray(_BATCH_BLOCKS * lr.BLOCK_SIZE)
+        self._enc = lr.BlockEncoder(self._buf, lr.BLOCK_SIZE,
+                                    crc=bool(flags & lr.FLAG_BLOCK_CRC),
+                                    raw=bool(flags & lr.FLAG_RAW_ADC), unit_us=unit)
+        self._index = array.array('I')
+        self._laps = array.array('I')
+        self._enc.reset(self._index)
+        self._stats = lr.SessionStats()
+        self._stats.reset(hdr['scale'], unit)
+        self._rows = reader.rows()
+        self._prev = 0            # source time of the previous row, for stats
+        self._n = 0               # records written to the new file
+        self._b0 = None           # open bucket's start time, None = none open
+        self._count = 0           # samples in the open bucket
+        self._lo = [0, 0, 0]      # per-channel (i, vt, vs) min, max and sum
+        self._hi = [0, 0, 0]
+        self._sum = [0, 0, 0]
+        self._markers = []        # (t, vt, vs) of markers in the open bucket
+        self._done = False
+
+    def _put(self, t, i, vt, vs, marker=False):
+        if self._enc.put(t, i, vt, vs, marker):
+            self._drain()
+        self._n += 1
+
+    def _drain(self):
+        enc = self._enc
+        if enc.nbytes():
+            self._dst.write(memoryview(self._buf)[:enc.nbytes()])
+        enc.clear()
+
+    def _close_bucket(self):
+        b0, k = self._b0, self._count
+        if b0 is not None:
+            lo, hi, sm = self._lo, self._hi, self._sum
+            h = k // 2
+            self._put(b0, lo[0], lo[1], lo[2])
+            self._put(b0, hi[0], hi[1], hi[2])
+            self._put(b0, (sm[0] + h) // k, (sm[1] + h) // k, (sm[2] + h) // k)
+            self._b0 = None
+        for t, vt, vs in self._markers:
+            self._laps.append(self._n)
+            self._laps.append(t)
+            self._put(t, 0, vt, vs, marker=True)
+        self._markers = []
+
+    def step(self, max_rows=128):
+        """Compact up to max_rows source rows. Returns True once the whole
+        session is done (the new file complete and closed)."""
+        if self._done:
+            return True
+        stats = self._stats
+        for _ in range(max_rows):
+            try:
+                t, i, vt, vs = next(self._rows)
+            except StopIteration:
+                self._finish()
+                return True
+            if i == lr.GAP_SENTINEL:
+                # A gap ends the open bucket: min/max/mean never span a hole.
+                stats.gap(t - self._prev)
+                self._prev = t
+                self._close_bucket()
+                self._put(t, i, vt, vs)
+                continue
+            if i == lr.LAP_MARKER_SENTINEL:
+                stats.marker(t - self._prev)
+                self._prev = t
+                self._markers.append((t, vt, vs))
+                if self._b0 is None:
+                    self._close_bucket()     # no bucket open: write it now
+                continue
+            stats.sample(t - self._prev, i, vt, vs)
+            self._prev = t
+            if self._b0 is not None and t - self._b0 >= self._span:
+                self._close_bucket()
+            lo, hi, sm = self._lo, self._hi, self._sum
+            if self._b0 is None:
+                self._b0 = t
+                self._count = 0
+                lo[0] = hi[0] = i
+                lo[1] = hi[1] = vt
+                lo[2] = hi[2] = vs
+                sm[0] = sm[1] = sm[2] = 0
+            for c, v in ((0, i), (1, vt), (2, vs)):
+                if v < lo[c]:
+                    lo[c] = v
+                elif v > hi[c]:
+                    hi[c] = v
+                sm[c] += v
+            self._count += 1
+        return False
+
+    def _finish(self):
+        self._close_bucket()
+        self._enc.finish()
+        self._drain()
+        n = 0
+        for tag, payload in ((lr.TAG_TIME_INDEX, self._index),
+                             (lr.TAG_LAPS, self._laps),
+                             (lr.TAG_SUMMARY, self._stats.pack())):
+            sec = lr.pack_section(tag, payload)
+            self._dst.write(sec)
+            n += len(sec)
+        self._dst.write(lr.pack_trailer_end(n))
+        self._dst.close()
+        self._dst = None
+        self._src.close()
+        self._src = None
+        self._done = True
+
+    def commit(self):
+        """Replace the original with the compacted file, if it's smaller
+        (else keep the original and note the session as not worth trying
+        again). Updates the catalog and the free-space figure. Returns
+        (old size, new size) — (0, 0) if the session was erased meanwhile."""
+        idx = load_index(self._data_dir)
+        entry = idx['sessions'].get(self._name)
+        if entry is None:            # erased while we worked
+            self.abort()
+            return 0, 0
+        old = os.stat(self._path)[6]
+        new = os.stat(self._tmp)[6]
+        if new < old:
+            os.rename(self._tmp, self._path)
+            entry['size'] = new
+            entry['bucket_ms'] = self._bucket_ms
+            entry.pop('verified', None)   # a new file: check it next boot
+            entry.pop('laps', None)       # renumbered, in the new trailer
+            entry.pop('gaps', None)
+        else:
+            os.remove(self._tmp)
+            entry['no_compact'] = True
+            new = old
+        _save_index(idx, self._data_dir)
+        space.refresh()
+        return old, new
+
+    def abort(self):
+        """Drop the partial new file; the original is untouched."""
+        for f in (self._src, self._dst):
+            if f is not None:
+                f.close()
+        self._src = self._dst = None
+        try:
+            os.remove(self._tmp)
+        except OSError:
+            pass
+
+
+class FlushPolicy:
+    """
+    When an open FlashWriter should flush(): once max_pending_bytes are
+    unsynced (pending_bytes()), or the oldest of them has waited
+    max_latency_ms. Polled from its own task (main._flush_task), so neither
+    the check nor the flush sits on the sample path. flush() times each
+    call into a log2 histogram: counts[k] is flushes that took under
+    HIST_EDGES_MS[k] ms (and at least the edge before), the last count
+    everything slower.
+    """
+
+    HIST_EDGES_MS = (1, 2, 4, 8, 16, 32, 64, 128, 256)
+
+    def __init__(self, max_latency_ms=FLASH_SYNC_MS, max_pending_bytes=FLASH_FLUSH_BYTES):
+        self._max_us = max_latency_ms * 1000
+        self._max_bytes = max_pending_bytes
+        self._since = None        # _ticks_us() when data first went pending
+        self._counts = [0] * (len(self.HIST_EDGES_MS) + 1)
+        self._max_flush_us = 0
+
+    def due(self, writer):
+        pending = writer.pending_bytes()
+        if not pending:
+            self._since = None
+            return False
+        now = _ticks_us()
+        if self._since is None:
+            self._since = now
+        return (pending >= self._max_bytes
+                or lr._ticks_diff(now, self._since) >= self._max_us)
+
+    def flush(self, writer):
+        """writer.flush(), timed. Returns how long it took, in us."""
+        t0 = _ticks_us()
+        writer.flush()
+        us = lr._ticks_diff(_ticks_us(), t0)
+        self._since = None
+        if us > self._max_flush_us:
+            self._max_flush_us = us
+        k = 0
+        edges = self.HIST_EDGES_MS
+        while k < len(edges) and us >= edges[k] * 1000:
+            k += 1
+        self._counts[k] += 1
+        return us
+
+    def histogram(self):
+        return {'edges_ms': self.HIST_EDGES_MS, 'counts': list(self._counts),
+                'max_ms': self._max_flush_us / 1000}
+
+
 class FlashQuotaError(Exception):
     pass
 
@@ -80,15 +688,62 @@ class FlashWriter:
     One instance manages ONE session file's lifecycle:
         start() -> write_sample()/write_marker() (any number, interleaved)
         -> close()
+
+    raw_adc=True (v2 only) stores read_u16() counts: write_sample()/
+    write_marker() then take counts instead of amps/volts, and start() needs
+    raw_cal — (amps/count, volts/count, zero-current count) — for the header.
+    time_unit_us (v2 only: 10, 100 or the default 1000) is the timebase for
+    sample rates where whole-ms dt would be 0 or 1. sync_ms caps how long
+    written records can sit unsynced (judged by the sample ticks, so no
+    clock read per sample); None leaves syncing to flush()/close() — or a
+    FlushPolicy, as main.py does. oversample is the ADC reads averaged per
+    sample (adc_device) — recorded in the header, nothing more.
     """
 
-    def __init__(self, data_dir=DATA_DIR, sample_rate_hz=200):
+    def __init__(self, data_dir=DATA_DIR, sample_rate_hz=200,
+                 version=lr.HEADER_VERSION, block_crc=False, raw_adc=False,
+                 time_unit_us=1000, sync_ms=FLASH_SYNC_MS, oversample=1):
+        if version not in (lr.HEADER_VERSION, lr.HEADER_VERSION_V2):
+            raise ValueError("unknown session format version: {}".format(version))
+        if raw_adc and version != lr.HEADER_VERSION_V2:
+            raise ValueError("raw ADC storage needs the v2 session format")
+        if time_unit_us not in lr.TIME_UNITS_US or (
+                time_unit_us != 1000 and version != lr.HEADER_VERSION_V2):
+            raise ValueError("unsupported time unit: {} us".format(time_unit_us))
+        self._unit = time_unit_us
+        self._oversample = oversample
         self._data_dir = data_dir
         self._sample_rate_hz = sample_rate_hz
+        self._version = version
+        # v2 only — v1 records have nowhere to put a CRC.
+        self._flags = lr.FLAG_BLOCK_CRC if block_crc and version == lr.HEADER_VERSION_V2 else 0
+        if raw_adc:
+            self._flags |= lr.FLAG_RAW_ADC
         self._file = None
         self._fname = None
-        self._last_t = None
         self._n_records = 0
+        self._lost = 0
+        self._gaps = None         # v1: (record number, lost) per gap
+        self._sync_us = None if sync_ms is None else sync_ms * 1000
+        self._sync_t = None       # sample tick of the last sync
+        self._bytes_written = 0
+        self._synced_at = 0       # _bytes_written at the last sync
+        self._session_at = 0      # _bytes_written when this session started
+        self._bpr = None          # measured bytes/record, see seconds_left()
+        self._start_epoch = 0
+        self._writes = 0
+        self._flushes = 0
+        self._index = None
+        self._laps = None         # (record number, t) per marker
+        self._stats = lr.SessionStats()
+        if version == lr.HEADER_VERSION_V2:
+            self._buf = bytearray(_BATCH_BLOCKS * lr.BLOCK_SIZE)
+            self._enc = lr.BlockEncoder(self._buf, lr.BLOCK_SIZE,
+                                        crc=bool(self._flags & lr.FLAG_BLOCK_CRC),
+                                        raw=raw_adc, unit_us=time_unit_us)
+        else:
+            self._buf = bytearray(_BATCH_RECORDS * lr.RECORD_SIZE)
+            self._enc = lr.RecordEncoder(self._buf)
 
     def is_open(self):
         return self._file is not None
@@ -99,15 +754,51 @@ class FlashWriter:
     def record_count(self):
         return self._n_records
 
+    def io_stats(self):
+        """Lifetime file I/O counters: bytes written, file.write() calls and
+        file.flush() (littlefs metadata commit) calls."""
+        return {'bytes_written': self._bytes_written, 'writes': self._writes,
+                'flushes': self._flushes}
+
+    def _bytes_per_record(self):
+        """Bytes each record costs on flash: measured from the open session
+        once it has written a couple of batches (so v2's compression ratio
+        is in it), else the last session's; before any session, the newest
+        catalog entry's for v2 (skipping compacted ones, whose size no longer
+        goes with their record count) and the fixed RECORD_SIZE for v1."""
+        n = self._n_records
+        if self._file is not None and n:
+            written = self._bytes_written - self._session_at
+            if written >= 2 * _BATCH_BYTES:
+                self._bpr = (written + self._enc.nbytes()) / n
+        if self._bpr is None:
+            self._bpr = lr.RECORD_SIZE
+            if self._version == lr.HEADER_VERSION_V2:
+                for _name, e in reversed(catalog(self._data_dir)):
+                    if e['records'] and not e.get('bucket_ms'):
+                        self._bpr = e['size'] / e['records']
+                        break
+        return self._bpr
+
+    def seconds_left(self):
+        """Estimated seconds of capture left at this writer's sample rate and
+        format before free flash reaches FLASH_MIN_FREE (where recording
+        stops) — cached free bytes over measured bytes/s."""
+        room = space.free() - FLASH_MIN_FREE
+        if room <= 0:
+            return 0
+        return int(room / (self._bytes_per_record() * self._sample_rate_hz))
+
     # ── quota ──────────────────────────────────────────────────────────────
     @staticmethod
-    def free_bytes(path="/"):
-        return _free_bytes(path)
+    def free_bytes():
+        return space.free()
 
     @staticmethod
-    def quota_state(path="/"):
-        """'ok' | 'low' | 'full' against the CONFIG floors."""
-        free = _free_bytes(path)
+    def quota_state():
+        """'ok' | 'low' | 'full' against the CONFIG floors, from the cached
+        free-space figure (see FreeSpace)."""
+        free = space.free()
         if free < FLASH_MIN_FREE:
             return "full"
         if free < FLASH_LOW_WARN:
@@ -115,9 +806,12 @@ class FlashWriter:
         return "ok"
 
     # ── session lifecycle ─────────────────────────────────────────────────
-    def start(self, start_epoch=None):
+    def start(self, start_epoch=None, raw_cal=None):
         if self._file is not None:
             raise RuntimeError("session already open")
+        raw = self._flags & lr.FLAG_RAW_ADC
+        if raw and raw_cal is None:
+            raise ValueError("raw ADC session needs raw_cal")
 
         state = self.quota_state()
         if state == "full":
@@ -134,47 +828,169 @@ class FlashWriter:
         fname = "{}/session_{:04d}{:02d}{:02d}_{:02d}{:02d}{:02d}{}".format(
             self._data_dir, t[0], t[1], t[2], t[3], t[4], t[5], _EXT)
 
-        f = open(fname, "wb")
-        f.write(lr.pack_header(start_epoch, self._sample_rate_hz, PROFILE.as_json()))
-        f.flush()
-
-        self._file = f
+        name = fname[len(self._data_dir) + 1:]
+        idx = load_index(self._data_dir)
+        idx['open'] = name
+        idx['sessions'][name] = _entry(start_epoch=start_epoch)
+        _save_index(idx, self._data_dir)
+        self._start_epoch = start_epoch
+        self._session_at = self._bytes_written
+        self._file = open(fname, "wb")
         self._fname = fname
-        self._last_t = None
-        self._n_records = 0
-        return fname
+        self._write(lr.pack_header(start_epoch, self._sample_rate_hz, PROFILE.as_json(),
+                                    version=self._version, flags=self._flags,
+                                    raw_cal=raw_cal, time_unit_us=self._unit,
+                                    oversample=self._oversample))
+        self._sync()
 
-    def _dt_ms(self, t):
-        """t is a monotonic tick value (time.ticks_us() on-device, any
-        strictly-increasing int in tests). Returns ms since the previous
-        record, 0 for the first one."""
-        if self._last_t is None:
-            dt_ms = 0
+        self._n_records = 0
+        self._lost = 0
+        self._sync_t = None
+        # v2 writes these to its trailer, v1 keeps them in the catalog.
+        self._laps = array.array('I')
+        self._gaps = array.array('I')
+        if self._version == lr.HEADER_VERSION_V2:
+            # One (record number, t) pair per block — see log_record's
+            # trailer notes. Grows once per block, not per sample.
+            self._index = array.array('I')
+            self._stats.reset(lr.raw_scale(raw_cal) if raw else None, self._unit)
+            self._enc.reset(self._index, self._stats)
         else:
-            dt_ms = _ticks_diff(t, self._last_t) // 1000
-        self._last_t = t
-        return dt_ms
+            self._stats.reset()      # for the catalog only — v1 has no trailer
+            self._enc.reset(self._stats)
+        return fname
 
+    def _write(self, data):
+        self._file.write(data)
+        n = len(data)
+        self._bytes_written += n
+        self._writes += 1
+        space.charge(n)
+
+    def _sync(self):
+        self._file.flush()
+        self._flushes += 1
+        self._synced_at = self._bytes_written
+
+    def pending_bytes(self):
+        """Bytes a power cut could lose right now: written since the last
+        sync plus encoded and waiting in the buffer (a v2 block still being
+        filled isn't counted — flush() can't write it yet either)."""
+        if self._file is None:
+            return 0
+        return self._bytes_written - self._synced_at + self._enc.nbytes()
+
+    def _drain(self):
+        """Write whatever the encoder has ready. A full buffer goes out
+        as-is (no slice); only a partial flush pays for a memoryview slice.
+        A v2 block still being filled stays in the buffer (see
+        BlockEncoder.clear) until it closes or the session does."""
+        enc = self._enc
+        if enc.full():
+            self._write(self._buf)
+        elif enc.nbytes():
+            self._write(memoryview(self._buf)[:enc.nbytes()])
+        enc.clear()
+
+    def _sync_due(self, t):
+        """Time cap: sync once sync_ms of sample time has passed."""
+        last = self._sync_t
+        if last is None:
+            self._sync_t = t
+        elif lr._ticks_diff(t, last) >= self._sync_us:
+            self._sync_t = t
+            self.flush()
+
+    # t is a monotonic tick value (time.ticks_us() on-device, any
+    # strictly-increasing int in tests) — see RecordEncoder.
     def write_sample(self, t, current_A, track_V, supply_V):
         if self._file is None:
             return
-        dt_ms = self._dt_ms(t)
-        self._file.write(lr.pack_record(dt_ms, current_A, track_V, supply_V))
+        if self._enc.sample(t, current_A, track_V, supply_V):
+            self._drain()
         self._n_records += 1
+        if self._sync_us is not None:
+            self._sync_due(t)
 
     def write_marker(self, t, track_V=0.0, supply_V=0.0):
         if self._file is None:
             return
-        dt_ms = self._dt_ms(t)
-        self._file.write(lr.pack_marker(dt_ms, track_V, supply_V))
+        full = self._enc.marker(t, track_V, supply_V)
+        self._laps.append(self._n_records)
+        self._laps.append(self._enc.elapsed())
+        if full:
+            self._drain()
         self._n_records += 1
+        if self._sync_us is not None:
+            self._sync_due(t)
+
+    def write_gap(self, t, lost):
+        """`lost` samples never reached the writer (the sample ring
+        overran) before the one at tick t, which comes next. v2 records it
+        as a gap record (log_record GAPS); v1 has no record kinds, so its
+        gaps go in the catalog entry at close instead."""
+        if self._file is None:
+            return
+        self._lost += lost
+        if self._version != lr.HEADER_VERSION_V2:
+            self._gaps.append(self._n_records)
+            self._gaps.append(lost)
+            return
+        if self._enc.gap(t, lost):
+            self._drain()
+        self._n_records += 1
+
+    def lost_samples(self):
+        """Samples lost to ring overruns this session (see write_gap)."""
+        return self._lost
 
     def flush(self):
         if self._file is not None:
-            self._file.flush()
-
-    def close(self):
+            self._drain()
+            self._sync()
+
+    def _trailer_sections(self, timing=None):
+        """(tag, payload) pairs appended after the last v2 block."""
+        sections = [(lr.TAG_TIME_INDEX, self._index),
+                    (lr.TAG_LAPS, self._laps),
+                    (lr.TAG_SUMMARY, self._stats.pack())]
+        if timing is not None:
+            sections.append((lr.TAG_TIMING, lr.pack_timing(timing)))
+        return sections
+
+    def _write_trailer(self, timing=None):
+        n = 0
+        for tag, payload in self._trailer_sections(timing):
+            sec = lr.pack_section(tag, payload)
+            self._write(sec)
+            n += len(sec)
+        self._write(lr.pack_trailer_end(n))
+
+    def close(self, timing=None):
+        """Finish the session. timing, an adc_device.timing_dict() covering
+        the session, goes in its catalog entry — and a v2 trailer's
+        TAG_TIMING section."""
         if self._file is not None:
-            self._file.flush()
+            self._enc.finish()
+            self._drain()
+            if self._version == lr.HEADER_VERSION_V2:
+                self._write_trailer(timing)
+            self._sync()
             self._file.close()
             self._file = None
+            size = self._bytes_written - self._session_at
+            if size >= 2 * _BATCH_BYTES:     # header/trailer don't dominate
+                self._bpr = size / self._n_records
+            idx = load_index(self._data_dir)
+            idx['open'] = None
+            entry = _entry(size, self._start_epoch, lr.unpack_summary(self._stats.pack()))
+            if self._lost:
+                entry['lost'] = self._lost
+            if self._version != lr.HEADER_VERSION_V2:
+                entry['laps'] = list(self._laps)
+                if self._gaps:
+                    entry['gaps'] = list(self._gaps)
+            if timing is not None:
+                entry['timing'] = timing
+            idx['sessions'][self._fname[len(self._data_dir) + 1:]] = entry
+            _save_index(idx, self._data_dir)
@@ -0,0 +1,191 @@
+# Copyright @ 2026 Adrian Blakey. All rights reserved
+# live_frames.py — the publisher's frame and its fan-out.
+#
+# The publisher used to struct.pack a fresh 16-byte bytes object per sample
+# and put_nowait it on every subscriber queue; each subscriber then unpacked
+# it again. Now it copies samples straight out of the sample ring into a
+# Frame — a preallocated int array of up to `cap` samples — and hands its
+# rows to every consumer in one call, so a frame costs one queue operation
+# per subscriber however many samples it carries, and nothing is allocated
+# per sample on either side.
+#
+# A frame row is WIDTH ints, the same as a sample_ring slot: (t_us, raw
+# current, raw track V, raw supply V). A row whose current is GAP (-1, which
+# read_u16() can't return) isn't a sample: it says (t_us of the next sample,
+# GAP, samples lost, 0) — the ring overran just before that sample (see
+# sample_ring.py).
+#
+# No frame outlives _publish(), so Fanout has just the one, refilled on
+# every pass. Its rows go to:
+#
+#   taps         objects that see every frame's rows and keep no reference
+#                (live_view.py, which reduces them to lines for /ws).
+#   subscribers  LOSSLESS queues (the flash writer): a
+#                record_queue.RecordQueue that gets a copy of the rows. The
+#                publisher takes no more from the ring than it has room
+#                for, so when it's full samples wait in the ring (another
+#                1.28 s) instead of being dropped; only a ring overrun can
+#                lose them, and that's logged as a GAP.
+#
+# Subscriber is also the queue live_view.py puts its lines on, under the
+# DECIMATE policy: once a viewer's queue is half full it gets only every
+# other line, and a full one gives up its oldest. Every subscriber counts
+# the items it missed (dropped) and the most ever waiting in its queue
+# (high_water), for /api/status.
+
+import array
+
+WIDTH = 4
+GAP = -1
+
+LOSSLESS = 'lossless'
+DECIMATE = 'decimate'
+
+
+class Frame:
+
+    def __init__(self, cap: int):
+        self.data = array.array('i', (0 for _ in range(cap * WIDTH)))
+        self.cap = cap
+        self.n = 0                # rows in use
+
+    def fill(self, get, limit: int = None) -> int:
+        """Copy samples in with get (a SampleRing.get) until the frame is
+        full, `limit` rows have been added, or the ring is empty; returns
+        the number of samples copied. A sample that follows an overrun gets
+        a GAP row ahead of it."""
+        d = self.data
+        n = self.n
+        stop = self.cap if limit is None else min(self.cap, n + limit)
+        got = 0
+        while stop - n >= 2:      # room for a sample and a GAP row
+            k = n << 2
+            lost = get(d, k)
+            if lost < 0:
+                break
+            if lost:
+                d[k + 4] = d[k]
+                d[k + 5] = d[k + 1]
+                d[k + 6] = d[k + 2]
+                d[k + 7] = d[k + 3]
+                d[k + 1] = GAP
+                d[k + 2] = lost
+                d[k + 3] = 0
+                n += 1
+            n += 1
+            got += 1
+        self.n = n
+        return got
+
+    def full(self) -> bool:
+        return self.cap - self.n < 2
+
+
+class Subscriber:
+
+    def __init__(self, queue, capacity: int, policy: str, name: str):
+        self.queue = queue
+        self.capacity = capacity  # items (lines, or records if LOSSLESS)
+        self.policy = policy
+        self.name = name
+        self.dropped = 0          # rows (or lines) it never got
+        self.high_water = 0       # most items ever waiting in its queue
+        self._skip = False        # DECIMATE: skip the next item
+
+    def offer(self, item) -> None:
+        """Put item (a shared object such as a live_view line) on a
+        DECIMATE queue."""
+        q = self.queue
+        if q.qsize() * 2 >= self.capacity:
+            self._skip = not self._skip
+            if self._skip:
+                self.dropped += 1
+                return
+        if q.full():
+            try:
+                q.get_nowait()
+                self.dropped += 1
+            except IndexError:
+                pass
+        q.put_nowait(item)
+        depth = q.qsize()
+        if depth > self.high_water:
+            self.high_water = depth
+
+    def stats(self) -> dict:
+        return {
+            'name': self.name,
+            'policy': self.policy,
+            'depth': self.queue.qsize(),
+            'capacity': self.capacity,
+            'high_water': self.high_water,
+            'dropped': self.dropped,
+        }
+
+
+class Fanout:
+    """The publisher's frame plus the taps and subscribers it feeds."""
+
+    def __init__(self, cap: int):
+        self.frame = Frame(cap)
+        self.subscribers = []
+        self.taps = []            # see tap()
+        self.held = 0             # pumps cut short by a full LOSSLESS queue
+
+    def tap(self, obj) -> None:
+        """obj.feed(data, n) sees every frame's rows and must not keep a
+        reference to data (live_view.py)."""
+        self.taps.append(obj)
+
+    def subscribe(self, queue, capacity: int, name: str = '') -> Subscriber:
+        """queue is a record_queue.RecordQueue holding at least `capacity`
+        records; it's served LOSSLESS."""
+        sub = Subscriber(queue, capacity, LOSSLESS, name)
+        self.subscribers.append(sub)
+        return sub
+
+    def unsubscribe(self, sub) -> None:
+        try:
+            self.subscribers.remove(sub)
+        except ValueError:
+            pass
+
+    def stats(self) -> list:
+        return [s.stats() for s in self.subscribers]
+
+    def pump(self, get, limit: int) -> int:
+        """Move up to about `limit` samples from the ring (get is its
+        SampleRing.get) out to the taps and subscribers, a frame at a time.
+        Returns the number of samples moved."""
+        frame = self.frame
+        count = 0
+        while count < limit:
+            room = self._lossless_room()
+            if room < 2:
+                self.held += 1
+                break             # leave the rest in the ring
+            frame.n = 0
+            count += frame.fill(get, room)
+            if frame.n:
+                self._publish(frame)
+            if not frame.full():
+                break             # ring drained, or LOSSLESS room used up
+        return count
+
+    def _lossless_room(self) -> int:
+        room = 1 << 30
+        for s in self.subscribers:
+            free = s.capacity - s.queue.qsize()
+            if free < room:
+                room = free
+        return room
+
+    def _publish(self, frame) -> None:
+        for t in self.taps:
+            t.feed(frame.data, frame.n)
+        for s in self.subscribers:
+            q = s.queue
+            s.dropped += q.put_many(frame.data, frame.n)
+            depth = q.qsize()
+            if depth > s.high_water:
+                s.high_water = depth
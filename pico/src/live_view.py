@@ -0,0 +1,139 @@
+# Copyright @ 2026 Adrian Blakey. All rights reserved
+# live_view.py — the decimated live-view stream behind /ws, computed once
+# for every viewer.
+#
+# A /ws client used to subscribe to the full-rate frame fan-out and format
+# every sample itself, so each extra browser tab cost another 200 lines a
+# second of float formatting on Core 0 and another 200 sends on Wi-Fi.
+# Instead LiveView is a Fanout tap (live_frames.py): it sees every frame
+# once, reduces the samples to buckets at each rate in RATES that has a
+# viewer, formats a bucket ONCE as a text line, and puts that same str on
+# every viewer's queue at that rate. Core 0's cost depends on which rates
+# are being watched, not on how many viewers there are, and each viewer's
+# link carries `rate` lines a second.
+#
+# A bucket line is nine comma-separated figures, mean then min then max of
+# current (A), track V and supply V:
+#
+#   i,vt,vs,i_min,vt_min,vs_min,i_max,vt_max,vs_max
+#
+# Min and max are taken over the raw counts and converted afterwards, which
+# is the same thing since to_units is linear with positive scales. GAP rows
+# are skipped; a bucket that straddles a gap just has fewer samples in it.
+#
+# Viewer queues are live_frames.Subscriber objects under the DECIMATE
+# policy, so a viewer that falls behind gets every other line rather than
+# stale ones; `dropped` counts lines.
+
+import time
+
+from live_frames import GAP, DECIMATE, Subscriber
+
+RATES = (10, 20, 50)       # Hz
+DEFAULT_RATE = 20
+
+try:
+    _ticks_diff = time.ticks_diff
+except AttributeError:
+    def _ticks_diff(a, b):
+        return a - b
+
+
+class _Bucket:
+
+    def __init__(self, rate: int):
+        self.period_us = 1_000_000 // rate
+        self.t0 = 0
+        self.n = 0
+        self.acc = [0] * 9        # sum, min, max for each channel
+
+    def add(self, t: int, r0: int, r1: int, r2: int) -> bool:
+        """Accumulate one sample; True if it belongs to a NEW bucket, in
+        which case the caller should take() the old one first."""
+        if self.n and _ticks_diff(t, self.t0) >= self.period_us:
+            return True
+        a = self.acc
+        if not self.n:
+            self.t0 = t
+            a[0] = a[3] = a[6] = 0
+            a[1] = a[2] = r0
+            a[4] = a[5] = r1
+            a[7] = a[8] = r2
+        else:
+            if r0 < a[1]:
+                a[1] = r0
+            elif r0 > a[2]:
+                a[2] = r0
+            if r1 < a[4]:
+                a[4] = r1
+            elif r1 > a[5]:
+                a[5] = r1
+            if r2 < a[7]:
+                a[7] = r2
+            elif r2 > a[8]:
+                a[8] = r2
+        a[0] += r0
+        a[3] += r1
+        a[6] += r2
+        self.n += 1
+        return False
+
+
+class LiveView:
+
+    def __init__(self, to_units, rates=RATES):
+        self._to_units = to_units
+        self._buckets = {r: _Bucket(r) for r in rates}
+        self.viewers = {r: [] for r in rates}
+        self.lines = 0            # bucket lines formatted, all rates
+
+    def rate(self, requested) -> int:
+        """A supported rate for a /ws ?rate= value, DEFAULT_RATE if it isn't
+        one."""
+        try:
+            r = int(requested)
+        except (TypeError, ValueError):
+            return DEFAULT_RATE
+        return r if r in self.viewers else DEFAULT_RATE
+
+    def subscribe(self, rate: int, queue, capacity: int,
+                  name: str = 'ws') -> Subscriber:
+        """queue is a primitives.RingbufQueue holding at least `capacity`
+        lines."""
+        sub = Subscriber(queue, capacity, DECIMATE, '%s@%dHz' % (name, rate))
+        subs = self.viewers[rate]
+        if not subs:
+            self._buckets[rate].n = 0     # start fresh, not from stale samples
+        subs.append(sub)
+        return sub
+
+    def unsubscribe(self, sub) -> None:
+        for subs in self.viewers.values():
+            if sub in subs:
+                subs.remove(sub)
+
+    def stats(self) -> list:
+        return [s.stats() for subs in self.viewers.values() for s in subs]
+
+    def feed(self, d, n: int) -> None:
+        """Fanout tap: n rows of d (live_frames layout)."""
+        for rate, subs in self.viewers.items():
+            if not subs:
+                continue          # nobody watching: no work
+            b = self._buckets[rate]
+            for k in range(0, n << 2, 4):
+                if d[k + 1] == GAP:
+                    continue
+                if b.add(d[k], d[k + 1], d[k + 2], d[k + 3]):
+                    line = self._line(b)
+                    for s in subs:
+                        s.offer(line)
+                    b.n = 0
+                    b.add(d[k], d[k + 1], d[k + 2], d[k + 3])
+
+    def _line(self, b) -> str:
+        a, n, conv = b.acc, b.n, self._to_units
+        self.lines += 1
+        return '{:.2f},{:.2f},{:.2f},{:.2f},{:.2f},{:.2f},{:.2f},{:.2f},{:.2f}\n'.format(
+            *(conv(a[0] / n, a[3] / n, a[6] / n) + conv(a[1], a[4], a[7])
+              + conv(a[2], a[5], a[8])))
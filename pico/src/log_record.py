@@ -23,11 +23,94 @@
 # so profile provenance travels WITH the data, like the reference's CSV
 # comment-header convention — just packed instead of text.
 #
+# ── v2 ('SCL2'): delta/varint blocks ─────────────────────────────────────────
+# ~468 KB free at 8 bytes x 200 Hz is under 5 minutes of capture, yet current
+# and voltage barely move between 5 ms samples. v2 keeps the same logical
+# record stream (dt_ms, i_cA, vt_cV, vs_cV, lap markers) but stores it in
+# fixed-size blocks (BLOCK_SIZE bytes, recorded in the header):
+#
+#   block header  BLOCK_HDR_FMT = '<HIhHH'  (12 bytes) — the KEYFRAME:
+#     n_records u16, t u32 (absolute time since session start, ms or the
+#     header's timebase — see TIMEBASE below), i_cA,
+#     vt_cV, vs_cV — the absolute values of the block's first record.
+#   n_records delta records, each:
+#     varint head = zigzag(dt - previous dt) << 5 | mask << 2 | kind
+#       kind  KIND_DATA (0), KIND_MARKER (1) or KIND_GAP (2)
+#       mask  bit0 i_cA, bit1 vt_cV, bit2 vs_cV changed — only changed
+#             channels follow, each as a zigzag varint delta. A marker
+#             never changes i_cA (it carries no current reading); a gap's
+#             i_cA field holds the number of samples lost (see GAPS below).
+#   zero padding to BLOCK_SIZE.
+#
+# A steady 200 Hz sample is typically 2-3 bytes instead of 8, and because
+# every block restarts from an absolute keyframe a reader can start at any
+# block boundary, and a damaged block can't corrupt the ones after it.
+# iter_rows() decodes either version transparently.
+#
+# TIMEBASE: v2 times (dt, keyframe t, trailer t) are in ms unless the header
+# carries FLAG_TIMEBASE, whose extension field gives the unit in us — 100 or
+# 10 for sample rates where whole ms would quantize every dt to 0 or 1. The
+# encoders never floor a per-record tick difference on its own: the sub-unit
+# remainder carries into the next record, so the reconstructed time of record
+# N is exactly floor(ticks since the first record / unit) however long the
+# session runs, and every block keyframe re-anchors readers at an absolute
+# time. Readers get the unit as header['time_unit_us'] (1000 for v1) and
+# SessionReader.rows() yields times in it; units_to_ms() converts.
+#
+# BUCKETS: flash_writer's compactor rewrites an old session at reduced
+# resolution as a v2 file with FLAG_BUCKETS, whose extension field gives the
+# bucket length in ms. Its data records then come in (min, max, mean)
+# triples, one triple per bucket, all three at the time of the bucket's first
+# sample and each channel's min/max taken independently; lap markers keep
+# their own time and follow the triple of the bucket they fell in. The
+# trailer's summary is the original full-resolution session's.
+#
+# GAPS: when the device's publisher falls so far behind that Core 1 laps
+# the sample ring, the overwritten samples are gone. The writer then puts a
+# KIND_GAP record in the stream, at the time of the first sample after the
+# hole, saying how many samples were lost, so the hole is explicit rather
+# than one long dt. Readers yield it as (t, GAP_SENTINEL, lost, 0) — see
+# is_gap() and row_dict()'s 'gap'. v1 has no record kinds and keeps no
+# gaps.
+#
+# OVERSAMPLE: a v2 header with FLAG_OVERSAMPLE records how many ADC reads
+# adc_device averaged into every stored sample (CONFIG.ADC_OVERSAMPLE); the
+# records themselves are unchanged. Absent means 1. A v1 header has no
+# extension, so there the factor goes in the profile JSON as 'oversample'
+# (older readers just show it as one more profile key); read_header() takes
+# it back out, so callers see it as header['oversample'] either way.
+#
+# With FLAG_BLOCK_CRC set in the header, the last 4 bytes of every block
+# are a CRC32 of the rest of it (records stop short of them). That turns a
+# torn tail or flash bit-rot into a detectable bad block: verify() checks a
+# whole file block by block without decoding a record, and iter_rows()
+# skips a block whose CRC doesn't match instead of decoding garbage.
+#
 # Values enter/leave this module as physical units (amps, volts); everything
 # below the boundary between adc_device.py's float scaling and flash_writer's
 # file I/O is bytes.
+#
+# The exception is v2's RAW mode (FLAG_RAW_ADC): the encoder takes the
+# machine.ADC.read_u16() counts as-is — i_cA holds raw current - 32768, vt/vs
+# the raw voltage counts — and the header extension carries the scaling
+# constants and calibrated zero (RAW_CAL_FMT). The device then does no float
+# maths per sample at all; readers convert with the header's 'scale' (see
+# row_dict), which is None for centi-unit files.
+#
+# pack_record()/pack_marker() return a fresh 8-byte bytes object per call —
+# fine for tests and host tools, but at the device's sample rates that's
+# steady allocation churn (and GC pauses) on Core 0. RecordEncoder below is
+# the hot-path alternative: struct.pack_into() straight into a caller-owned,
+# preallocated buffer, so the writer allocates nothing per record.
+#
+# time.ticks_diff() is MicroPython-only; _ticks_diff() below falls back to
+# plain subtraction on CPython so the encoders' dt bookkeeping is
+# exercised directly by the host test suite.
 
+import binascii
+from array import array
 import struct
+import time
 
 # ── Session header ───────────────────────────────────────────────────────────
 HEADER_MAGIC   = b'SCL1'          # "Slot Car Logger" v1
@@ -35,32 +118,132 @@ HEADER_VERSION = 1
 HEADER_FMT     = '<4sBIHH'        # magic, version, start_epoch(u32), sample_rate_hz(u16), profile_json_len(u16)
 HEADER_FIXED_SIZE = struct.calcsize(HEADER_FMT)
 
+HEADER_MAGIC_V2   = b'SCL2'
+HEADER_VERSION_V2 = 2
+# v2 only: u16 extension length, then the extension itself, between the
+# fixed header and the profile JSON. Readers ignore extension bytes past the
+# fields they know, so later fields can be appended without a new magic.
+HEADER_EXT_FMT  = '<HB'           # block_size(u16), flags(u8)
+HEADER_EXT_SIZE = struct.calcsize(HEADER_EXT_FMT)
+FLAG_BLOCK_CRC  = 0x01            # every block ends in a CRC32 of the rest
+FLAG_RAW_ADC    = 0x02            # records hold raw ADC counts, see RAW_CAL_FMT
+FLAG_TIMEBASE   = 0x04            # times are in TIMEBASE_FMT us units, not ms
+FLAG_BUCKETS    = 0x08            # (min, max, mean) triples per BUCKET_FMT ms
+FLAG_OVERSAMPLE = 0x10            # each sample averages OVERSAMPLE_FMT reads
+# Optional extension fields follow HEADER_EXT_FMT in flag-bit order, each
+# present only when its flag is set.
+RAW_CAL_FMT     = '<ffH'          # amps/count, volts/count, zero-current count
+RAW_CAL_SIZE    = struct.calcsize(RAW_CAL_FMT)
+_RAW_I_BIAS     = 32768           # raw current count - this = stored i_cA field
+TIMEBASE_FMT    = '<H'            # time unit, us
+TIMEBASE_SIZE   = struct.calcsize(TIMEBASE_FMT)
+TIME_UNITS_US   = (10, 100, 1000)
+BUCKET_FMT      = '<H'            # bucket length, ms
+BUCKET_SIZE     = struct.calcsize(BUCKET_FMT)
+BUCKET_STATS    = ('min', 'max', 'mean')   # order of a bucket's data records
+OVERSAMPLE_FMT  = '<B'            # ADC reads averaged per stored sample
+OVERSAMPLE_SIZE = struct.calcsize(OVERSAMPLE_FMT)
+
 # ── Data / marker records ────────────────────────────────────────────────────
 RECORD_FMT   = '<HhHH'            # dt_ms, i_cA, vt_cV, vs_cV
 RECORD_SIZE  = struct.calcsize(RECORD_FMT)
 
 LAP_MARKER_SENTINEL = -32768      # i_cA value that means "this is a lap marker"
+GAP_SENTINEL = -32769             # decoded i_cA of a gap row (v2 only, never stored)
+_GAP_MAX = 32767                  # most lost samples one gap record carries
 
 _I16_MIN, _I16_MAX = -32767, 32767   # -32768 reserved for the sentinel
 _U16_MAX = 65535
 _DT_MAX  = 65535                     # max representable dt_ms in one record
 
+# ── v2 blocks ─────────────────────────────────────────────────────────────
+BLOCK_SIZE     = 512
+BLOCK_HDR_FMT  = '<HIhHH'         # n_records, t, i_cA, vt_cV, vs_cV (keyframe)
+BLOCK_HDR_SIZE = struct.calcsize(BLOCK_HDR_FMT)
+KIND_DATA   = 0
+KIND_MARKER = 1
+KIND_GAP    = 2
+_MASK_I, _MASK_VT, _MASK_VS = 1, 2, 4
+_V2_MAX_RECORD = 16               # worst-case encoded record: 6-byte head + 3 x 3
+BLOCK_CRC_FMT  = '<I'
+BLOCK_CRC_SIZE = struct.calcsize(BLOCK_CRC_FMT)
+
+# ── v2 trailer ──────────────────────────────────────────────────────────────
+TRAILER_MAGIC    = b'SCLT'
+TRAILER_END_FMT  = '<I4s'         # section bytes, magic
+TRAILER_END_SIZE = struct.calcsize(TRAILER_END_FMT)
+SECTION_HDR_FMT  = '<4sI'         # tag, payload length
+SECTION_HDR_SIZE = struct.calcsize(SECTION_HDR_FMT)
+TAG_TIME_INDEX   = b'TIDX'        # '<II' (record number, t) per block
+TAG_LAPS         = b'LAPS'        # '<II' (record number, t) per lap marker
+INDEX_ENTRY_FMT  = '<II'          # both TAG_TIME_INDEX and TAG_LAPS entries
+INDEX_ENTRY_SIZE = struct.calcsize(INDEX_ENTRY_FMT)
+TAG_SUMMARY      = b'SUMM'        # SUMMARY_FMT, see SessionStats
+# samples, markers, duration_ms, i_min_cA, i_max_cA, vs_min_cV, vs_max_cV,
+# i_mean_A, charge_Ah, energy_Wh
+SUMMARY_FMT      = '<IIIhhHHfff'
+SUMMARY_SIZE     = struct.calcsize(SUMMARY_FMT)
+TAG_TIMING       = b'TIMG'        # Core 1 pacing over the session, see pack_timing
+TIMING_HDR_FMT   = '<HII'         # n_edges, missed slots, max lateness us
+TIMING_HDR_SIZE  = struct.calcsize(TIMING_HDR_FMT)
+
+try:
+    _ticks_diff = time.ticks_diff
+except AttributeError:
+    def _ticks_diff(a, b):
+        return a - b
+
 
 # ── Header ────────────────────────────────────────────────────────────────────
 
-def pack_header(start_epoch: int, sample_rate_hz: int, profile_json: str) -> bytes:
-    """Build the fixed header + variable-length profile JSON blob."""
+def pack_header(start_epoch: int, sample_rate_hz: int, profile_json: str,
+                version: int = HEADER_VERSION, block_size: int = BLOCK_SIZE,
+                flags: int = 0, raw_cal=None, time_unit_us: int = 1000,
+                bucket_ms: int = 0, oversample: int = 1) -> bytes:
+    """Build the fixed header (+ v2 extension) + variable-length profile JSON
+    blob. raw_cal, (amps/count, volts/count, zero-current count), is required
+    with FLAG_RAW_ADC. A time_unit_us other than 1000 sets FLAG_TIMEBASE,
+    a non-zero bucket_ms FLAG_BUCKETS, an oversample over 1
+    FLAG_OVERSAMPLE (v1: an 'oversample' key in the profile JSON)."""
+    if oversample > 1 and version != HEADER_VERSION_V2:
+        import json
+        profile = json.loads(profile_json) if profile_json else {}
+        profile['oversample'] = oversample
+        profile_json = json.dumps(profile)
     blob = profile_json.encode('utf-8')
-    fixed = struct.pack(HEADER_FMT, HEADER_MAGIC, HEADER_VERSION,
+    magic = HEADER_MAGIC_V2 if version == HEADER_VERSION_V2 else HEADER_MAGIC
+    fixed = struct.pack(HEADER_FMT, magic, version,
                          start_epoch & 0xFFFFFFFF, sample_rate_hz & 0xFFFF,
                          len(blob) & 0xFFFF)
-    return fixed + blob
+    if version != HEADER_VERSION_V2:
+        return fixed + blob
+    if time_unit_us != 1000:
+        flags |= FLAG_TIMEBASE
+    if bucket_ms:
+        flags |= FLAG_BUCKETS
+    if oversample > 1:
+        flags |= FLAG_OVERSAMPLE
+    ext = struct.pack(HEADER_EXT_FMT, block_size, flags)
+    if flags & FLAG_RAW_ADC:
+        ext += struct.pack(RAW_CAL_FMT, *raw_cal)
+    if flags & FLAG_TIMEBASE:
+        ext += struct.pack(TIMEBASE_FMT, time_unit_us)
+    if flags & FLAG_BUCKETS:
+        ext += struct.pack(BUCKET_FMT, bucket_ms)
+    if flags & FLAG_OVERSAMPLE:
+        ext += struct.pack(OVERSAMPLE_FMT, oversample)
+    return fixed + struct.pack('<H', len(ext)) + ext + blob
 
 
 def read_header(f) -> dict:
     """
-    Read a header from an open binary file positioned at offset 0.
-    Returns {'version', 'start_epoch', 'sample_rate_hz', 'profile': dict}.
+    Read a header from an open binary file positioned at offset 0, leaving
+    it positioned at the first record/block. Returns {'version',
+    'start_epoch', 'sample_rate_hz', 'profile': dict, 'block_size' (0 for
+    v1), 'flags', 'header_size', 'raw_cal' (None unless FLAG_RAW_ADC),
+    'scale' (raw_scale(raw_cal), or None for centi-units), 'time_unit_us'
+    (1000 unless FLAG_TIMEBASE), 'bucket_ms' (0 unless FLAG_BUCKETS),
+    'oversample' (1 unless FLAG_OVERSAMPLE)}.
     Raises ValueError if the magic doesn't match.
     """
     import json
@@ -68,21 +251,96 @@ def read_header(f) -> dict:
     if len(fixed) != HEADER_FIXED_SIZE:
         raise ValueError('short header read')
     magic, version, start_epoch, sample_rate_hz, json_len = struct.unpack(HEADER_FMT, fixed)
-    if magic != HEADER_MAGIC:
+    if magic not in (HEADER_MAGIC, HEADER_MAGIC_V2):
         raise ValueError('bad magic: {}'.format(magic))
+    size = HEADER_FIXED_SIZE + json_len
+    block_size = flags = 0
+    raw_cal = None
+    unit = 1000
+    bucket_ms = 0
+    oversample = 1
+    if magic == HEADER_MAGIC_V2:
+        raw = f.read(2)
+        if len(raw) != 2:
+            raise ValueError('short header read')
+        ext_len = struct.unpack('<H', raw)[0]
+        ext = f.read(ext_len)
+        if len(ext) != ext_len or ext_len < HEADER_EXT_SIZE:
+            raise ValueError('short header extension')
+        block_size, flags = struct.unpack_from(HEADER_EXT_FMT, ext, 0)
+        pos = HEADER_EXT_SIZE
+        if flags & FLAG_RAW_ADC:
+            if ext_len < pos + RAW_CAL_SIZE:
+                raise ValueError('short header extension')
+            raw_cal = struct.unpack_from(RAW_CAL_FMT, ext, pos)
+            pos += RAW_CAL_SIZE
+        if flags & FLAG_TIMEBASE:
+            if ext_len < pos + TIMEBASE_SIZE:
+                raise ValueError('short header extension')
+            unit = struct.unpack_from(TIMEBASE_FMT, ext, pos)[0]
+            if not unit:
+                raise ValueError('bad time unit: 0')
+            pos += TIMEBASE_SIZE
+        if flags & FLAG_BUCKETS:
+            if ext_len < pos + BUCKET_SIZE:
+                raise ValueError('short header extension')
+            bucket_ms = struct.unpack_from(BUCKET_FMT, ext, pos)[0]
+            pos += BUCKET_SIZE
+        if flags & FLAG_OVERSAMPLE:
+            if ext_len < pos + OVERSAMPLE_SIZE:
+                raise ValueError('short header extension')
+            oversample = struct.unpack_from(OVERSAMPLE_FMT, ext, pos)[0] or 1
+        if block_size < BLOCK_HDR_SIZE + _V2_MAX_RECORD:
+            raise ValueError('bad block size: {}'.format(block_size))
+        size += 2 + ext_len
     blob = f.read(json_len)
     try:
         profile = json.loads(blob.decode('utf-8')) if blob else {}
     except Exception:
         profile = {}
+    if magic == HEADER_MAGIC and isinstance(profile, dict):
+        n = profile.pop('oversample', 1)
+        oversample = n if isinstance(n, int) and n > 1 else 1
     return {
         'version': version,
         'start_epoch': start_epoch,
         'sample_rate_hz': sample_rate_hz,
         'profile': profile,
+        'block_size': block_size,
+        'flags': flags,
+        'header_size': size,
+        'raw_cal': raw_cal,
+        'scale': None if raw_cal is None else raw_scale(raw_cal),
+        'time_unit_us': unit,
+        'bucket_ms': bucket_ms,
+        'oversample': oversample,
     }
 
 
+def units_to_ms(t: int, unit_us: int):
+    """A time in a session's units -> ms: the int itself for ms files, a
+    float for sub-ms timebases."""
+    if unit_us == 1000:
+        return t
+    return t * unit_us / 1000
+
+
+def format_ms(t: int, unit_us: int) -> str:
+    """A time in a session's units as ms text, to the timebase's resolution
+    ('12', '12.3' or '12.34') — for CSV output."""
+    if unit_us == 1000:
+        return str(t)
+    return '{:.{}f}'.format(t * unit_us / 1000, 1 if unit_us >= 100 else 2)
+
+
+def raw_scale(raw_cal):
+    """(amps/count, volts/count, zero count) -> (i_zero, amps/unit,
+    volts/unit) over the stored fields: current = (i_cA - i_zero) x amps/unit,
+    voltage = field x volts/unit."""
+    a_per_count, v_per_count, zero = raw_cal
+    return (zero - _RAW_I_BIAS, a_per_count, v_per_count)
+
+
 # ── Records ───────────────────────────────────────────────────────────────────
 
 def _clip_i16(v: int) -> int:
@@ -123,6 +381,10 @@ def is_marker(i_cA: int) -> bool:
     return i_cA == LAP_MARKER_SENTINEL
 
 
+def is_gap(i_cA: int) -> bool:
+    return i_cA == GAP_SENTINEL
+
+
 def _clip_dt(dt_ms: int) -> int:
     """
     Clip a delta to what one record can carry. A gap this long (>65.535 s)
@@ -157,12 +419,865 @@ def pack_marker(dt_ms: int, track_v: float = 0.0, supply_v: float = 0.0) -> byte
 
 def unpack_record(buf: bytes) -> dict:
     """Unpack one 8-byte record into physical units + a `marker` flag."""
-    dt_ms, i_cA, vt_cV, vs_cV = struct.unpack(RECORD_FMT, buf)
+    return row_dict(*struct.unpack(RECORD_FMT, buf))
+
+
+def row_dict(dt_ms: int, i_cA: int, vt_cV: int, vs_cV: int, scale=None) -> dict:
+    """Raw record fields -> physical units + a `marker` flag and a `gap`
+    count (samples lost before this row; 0 on every other row). scale is
+    the header's 'scale' (None for centi-unit files)."""
+    if i_cA == GAP_SENTINEL:
+        return {'dt_ms': dt_ms, 'marker': False, 'gap': vt_cV,
+                'current_A': None, 'track_V': None, 'supply_V': None}
     marker = is_marker(i_cA)
+    if scale is None:
+        return {
+            'dt_ms': dt_ms,
+            'marker': marker,
+            'gap': 0,
+            'current_A': None if marker else decode_current(i_cA),
+            'track_V': decode_voltage(vt_cV),
+            'supply_V': decode_voltage(vs_cV),
+        }
+    i_zero, a, v = scale
     return {
         'dt_ms': dt_ms,
         'marker': marker,
-        'current_A': None if marker else decode_current(i_cA),
-        'track_V': decode_voltage(vt_cV),
-        'supply_V': decode_voltage(vs_cV),
+        'gap': 0,
+        'current_A': None if marker else (i_cA - i_zero) * a,
+        'track_V': vt_cV * v,
+        'supply_V': vs_cV * v,
+    }
+
+
+# ── Batch encoder ───────────────────────────────────────────────────────────
+
+class RecordEncoder:
+    """
+    Packs consecutive records into a caller-owned bytearray/memoryview with
+    struct.pack_into — no per-record bytes object. Tracks the dt_ms state
+    itself: feed it monotonic tick values (time.ticks_us() on-device, any
+    strictly-increasing int in tests) and it writes ms since the previous
+    record, 0 for the first one.
+
+        enc = RecordEncoder(bytearray(32 * RECORD_SIZE))
+        if enc.sample(t, amps, track_v, supply_v):   # True once full
+            f.write(enc.buffer()); enc.clear()
+
+    The buffer must hold a whole number of records; any tail bytes past the
+    last whole record are never touched.
+    """
+
+    def __init__(self, buf):
+        self._buf = buf
+        self._cap = len(buf) // RECORD_SIZE
+        if self._cap < 1:
+            raise ValueError('buffer smaller than one record')
+        self._off = 0
+        self._end = self._cap * RECORD_SIZE
+        self._last_t = None
+        self._rem = 0
+        self._t = 0
+        self._stats = None
+
+    def buffer(self):
+        """The caller-owned buffer this encoder packs into."""
+        return self._buf
+
+    def capacity(self) -> int:
+        return self._cap
+
+    def count(self) -> int:
+        """Records packed since the last clear()."""
+        return self._off // RECORD_SIZE
+
+    def nbytes(self) -> int:
+        return self._off
+
+    def full(self) -> bool:
+        return self._off >= self._end
+
+    def elapsed(self) -> int:
+        """ms since session start of the last record packed — the t a
+        reader reconstructs for it."""
+        return self._t
+
+    def clear(self) -> None:
+        """Mark the buffer drained. dt state carries over — the next record's
+        dt_ms is still relative to the last one packed."""
+        self._off = 0
+
+    def reset(self, stats=None) -> None:
+        """Start a new session: drain the buffer AND forget dt state.
+        stats, if given, is a SessionStats every record is folded into."""
+        self._off = 0
+        self._last_t = None
+        self._rem = 0
+        self._t = 0
+        self._stats = stats
+
+    def finish(self) -> None:
+        """No-op: fixed-size records are always ready to write (see
+        BlockEncoder.finish)."""
+
+    def _dt_ms(self, t) -> int:
+        # The sub-ms remainder carries over (see TIMEBASE above), so dt_ms
+        # never drifts from the ticks however many records are written.
+        last = self._last_t
+        self._last_t = t
+        if last is None:
+            return 0
+        rem = self._rem + _ticks_diff(t, last)
+        dt = rem // 1000
+        self._rem = rem - dt * 1000
+        dt = _clip_dt(dt)
+        self._t += dt
+        return dt
+
+    def sample(self, t, current_amps: float, track_v: float, supply_v: float) -> bool:
+        """Pack one data row. Returns True once the buffer is full."""
+        if self._off >= self._end:
+            raise IndexError('encoder buffer full')
+        dt = self._dt_ms(t)
+        i = encode_current(current_amps)
+        vt = encode_voltage(track_v)
+        vs = encode_voltage(supply_v)
+        struct.pack_into(RECORD_FMT, self._buf, self._off, dt, i, vt, vs)
+        if self._stats is not None:
+            self._stats.sample(dt, i, vt, vs)
+        self._off += RECORD_SIZE
+        return self._off >= self._end
+
+    def marker(self, t, track_v: float = 0.0, supply_v: float = 0.0) -> bool:
+        """Pack one lap-marker row. Returns True once the buffer is full."""
+        if self._off >= self._end:
+            raise IndexError('encoder buffer full')
+        dt = self._dt_ms(t)
+        struct.pack_into(RECORD_FMT, self._buf, self._off, dt,
+                          LAP_MARKER_SENTINEL,
+                          encode_voltage(track_v),
+                          encode_voltage(supply_v))
+        if self._stats is not None:
+            self._stats.marker(dt)
+        self._off += RECORD_SIZE
+        return self._off >= self._end
+
+
+# ── Session summary ─────────────────────────────────────────────────────────
+
+_FOLD = 1 << 29   # keep the hot-path sums well inside MicroPython's small-int range
+
+
+class SessionStats:
+    """
+    Running summary of one session, fed the same quantized integers the
+    encoders write (hand one to RecordEncoder/BlockEncoder.reset()). Fixed
+    size, and the per-sample path is small-int arithmetic only: the three
+    sums are folded into float totals whenever they near the small-int
+    limit, so a float is allocated every few thousand samples, not every
+    sample.
+
+    Charge integrates current over each record's dt (Ah); energy integrates
+    current x TRACK voltage — the power actually delivered to the car (Wh).
+    Supply sag is the session's highest supply reading minus its lowest.
+
+    For a raw-ADC session pass reset() the header's 'scale': samples are
+    brought to centi-units with a rounded 16.16 fixed-point multiply, so the
+    summary format (and the small-int budget) is the same for both.
+    """
+
+    def __init__(self):
+        self.reset()
+
+    def reset(self, scale=None, unit_us: int = 1000) -> None:
+        self._unit = unit_us    # dt units fed to sample()/marker()
+        if scale is None:
+            self._k_i = 0
+        else:
+            self._i_zero = scale[0]
+            self._k_i = int(scale[1] * 100 * 65536 + 0.5)
+            self._k_v = int(scale[2] * 100 * 65536 + 0.5)
+        self._n = 0
+        self._markers = 0
+        self._t = 0
+        self._i_min = _I16_MAX
+        self._i_max = _I16_MIN
+        self._vs_min = _U16_MAX
+        self._vs_max = 0
+        self._i_sum = 0         # cA
+        self._q = 0             # cA x ms
+        self._e = 0             # cA x cV x ms
+        self._i_sum_hi = 0.0
+        self._q_hi = 0.0
+        self._e_hi = 0.0
+
+    def sample(self, dt_ms: int, i_cA: int, vt_cV: int, vs_cV: int) -> None:
+        if self._k_i:
+            i_cA = ((i_cA - self._i_zero) * self._k_i + 0x8000) >> 16
+            vt_cV = (vt_cV * self._k_v + 0x8000) >> 16
+            vs_cV = (vs_cV * self._k_v + 0x8000) >> 16
+        self._n += 1
+        self._t += dt_ms
+        if i_cA < self._i_min:
+            self._i_min = i_cA
+        if i_cA > self._i_max:
+            self._i_max = i_cA
+        if vs_cV < self._vs_min:
+            self._vs_min = vs_cV
+        if vs_cV > self._vs_max:
+            self._vs_max = vs_cV
+        v = self._i_sum + i_cA
+        if -_FOLD < v < _FOLD:
+            self._i_sum = v
+        else:
+            self._i_sum_hi += v
+            self._i_sum = 0
+        q = i_cA * dt_ms
+        v = self._q + q
+        if -_FOLD < v < _FOLD:
+            self._q = v
+        else:
+            self._q_hi += v
+            self._q = 0
+        v = self._e + q * vt_cV
+        if -_FOLD < v < _FOLD:
+            self._e = v
+        else:
+            self._e_hi += v
+            self._e = 0
+
+    def marker(self, dt_ms: int) -> None:
+        self._markers += 1
+        self._t += dt_ms
+
+    def gap(self, dt_ms: int) -> None:
+        self._t += dt_ms
+
+    def pack(self) -> bytes:
+        """TAG_SUMMARY section payload."""
+        n = self._n
+        unit = self._unit
+        ms = (self._t * unit // 1000) & 0xFFFFFFFF
+        if not n:
+            return struct.pack(SUMMARY_FMT, 0, self._markers, ms,
+                                0, 0, 0, 0, 0.0, 0.0, 0.0)
+        return struct.pack(SUMMARY_FMT, n, self._markers, ms,
+                            self._i_min, self._i_max, self._vs_min, self._vs_max,
+                            (self._i_sum_hi + self._i_sum) / n / 100.0,
+                            (self._q_hi + self._q) * unit / 3.6e11,
+                            (self._e_hi + self._e) * unit / 3.6e13)
+
+
+def unpack_summary(buf) -> dict:
+    """TAG_SUMMARY payload -> dict in physical units."""
+    (n, markers, duration_ms, i_min, i_max, vs_min, vs_max,
+     i_mean, charge_ah, energy_wh) = struct.unpack_from(SUMMARY_FMT, buf, 0)
+    return {
+        'samples': n,
+        'markers': markers,
+        'duration_ms': duration_ms,
+        'current_min_A': decode_current(i_min),
+        'current_max_A': decode_current(i_max),
+        'current_mean_A': round(i_mean, 3),
+        'supply_min_V': decode_voltage(vs_min),
+        'supply_max_V': decode_voltage(vs_max),
+        'supply_sag_V': decode_voltage(vs_max - vs_min),
+        'charge_Ah': round(charge_ah, 6),
+        'energy_Wh': round(energy_wh, 5),
     }
+
+
+def pack_timing(timing: dict) -> bytes:
+    """TAG_TIMING payload from an adc_device.timing_dict(): TIMING_HDR_FMT,
+    then n_edges u32 bin edges (us) and n_edges + 1 u32 bin counts."""
+    edges = timing['edges_us']
+    return (struct.pack(TIMING_HDR_FMT, len(edges), timing['missed'],
+                        timing['max_late_us'])
+            + bytes(array('I', edges)) + bytes(array('I', timing['counts'])))
+
+
+def unpack_timing(buf) -> dict:
+    """TAG_TIMING payload -> the dict pack_timing() took."""
+    n, missed, max_us = struct.unpack_from(TIMING_HDR_FMT, buf, 0)
+    vals = struct.unpack_from('<{}I'.format(2 * n + 1), buf, TIMING_HDR_SIZE)
+    return {'edges_us': vals[:n], 'counts': list(vals[n:]),
+            'missed': missed, 'max_late_us': max_us}
+
+
+# ── v2 varint helpers ───────────────────────────────────────────────────────
+
+def _zigzag(n: int) -> int:
+    return (n << 1) if n >= 0 else ((-n) << 1) - 1
+
+
+def _unzigzag(z: int) -> int:
+    return (z >> 1) if not z & 1 else -((z + 1) >> 1)
+
+
+class BlockEncoder:
+    """
+    v2 counterpart of RecordEncoder, with the same driving interface:
+    packs delta/varint records into fixed-size blocks inside a caller-owned
+    buffer holding a whole number of blocks, allocation-free per record.
+
+    nbytes() counts COMPLETED blocks only — the block being filled isn't
+    ready to write until it closes (it closes itself once another
+    worst-case record might not fit, or on finish()). clear() drains the
+    completed blocks and slides any partly filled one to the front, so a
+    mid-block flush loses nothing.
+
+    crc=True reserves each block's last BLOCK_CRC_SIZE bytes for a CRC32,
+    filled in as the block closes (the header must carry FLAG_BLOCK_CRC).
+    raw=True makes sample()/marker() take read_u16() counts instead of amps
+    and volts (FLAG_RAW_ADC) — no float maths on the way in. unit_us is the
+    header's timebase.
+    """
+
+    def __init__(self, buf, block_size: int = BLOCK_SIZE, crc: bool = False,
+                 raw: bool = False, unit_us: int = 1000):
+        if block_size < BLOCK_HDR_SIZE + _V2_MAX_RECORD + (BLOCK_CRC_SIZE if crc else 0):
+            raise ValueError('block_size too small')
+        self._buf = buf
+        self._mv = memoryview(buf)
+        self._bs = block_size
+        self._crc = crc
+        self._raw = raw
+        self._unit = unit_us
+        self._room = block_size - BLOCK_CRC_SIZE if crc else block_size
+        self._end = (len(buf) // block_size) * block_size
+        if self._end == 0:
+            raise ValueError('buffer smaller than one block')
+        self.reset()
+
+    def buffer(self):
+        return self._buf
+
+    def block_size(self) -> int:
+        return self._bs
+
+    def count(self) -> int:
+        """Records packed since the last clear() (including the open block)."""
+        return self._count
+
+    def nbytes(self) -> int:
+        return self._blk
+
+    def elapsed(self) -> int:
+        """Time since session start of the last record packed, in the
+        encoder's units."""
+        return self._t
+
+    def full(self) -> bool:
+        return self._blk >= self._end
+
+    def reset(self, index=None, stats=None) -> None:
+        """Start a new session. index, if given, is an array('I') the
+        encoder appends (record number, keyframe t) to for every block it
+        opens — the payload of a TAG_TIME_INDEX trailer section. stats, if
+        given, is a SessionStats every record is folded into."""
+        self._index = index
+        self._stats = stats
+        self._total = 0         # records packed this session
+        self._blk = 0           # start of the open (or next) block
+        self._pos = -1          # write position in the open block; -1 = none open
+        self._n = 0             # records in the open block
+        self._count = 0
+        self._last_tick = None
+        self._rem = 0           # us not yet counted into a whole unit
+        self._t = 0             # absolute time (units) of the last record
+        self._pdt = 0
+        self._i = 0
+        self._vt = 0
+        self._vs = 0
+
+    def clear(self) -> None:
+        blk, pos = self._blk, self._pos
+        if pos >= 0 and blk:
+            k = pos - blk
+            self._mv[0:k] = self._mv[blk:pos]
+            self._pos = k
+        self._blk = 0
+        self._count = self._n
+
+    def finish(self) -> None:
+        """Close the open block, if any, so nbytes() includes it."""
+        if self._pos >= 0:
+            self._close_block()
+
+    def _close_block(self) -> None:
+        buf, blk = self._buf, self._blk
+        struct.pack_into('<H', buf, blk, self._n)
+        room = blk + self._room
+        for k in range(self._pos, room):
+            buf[k] = 0
+        if self._crc:
+            struct.pack_into(BLOCK_CRC_FMT, buf, room,
+                              binascii.crc32(self._mv[blk:room]) & 0xFFFFFFFF)
+        self._blk = blk + self._bs
+        self._pos = -1
+        self._n = 0
+
+    def _varint(self, v: int) -> None:
+        buf, pos = self._buf, self._pos
+        while v >= 0x80:
+            buf[pos] = (v & 0x7F) | 0x80
+            v >>= 7
+            pos += 1
+        buf[pos] = v
+        self._pos = pos + 1
+
+    def _put(self, kind: int, tick, i: int, vt: int, vs: int, dt=None) -> bool:
+        if self._blk >= self._end:
+            raise IndexError('encoder buffer full')
+        if dt is None:           # put() passes dt already in units
+            last = self._last_tick
+            self._last_tick = tick
+            if last is None:
+                dt = 0
+            else:
+                unit = self._unit
+                rem = self._rem + _ticks_diff(tick, last)
+                dt = rem // unit
+                self._rem = rem - dt * unit
+                if dt < 0:
+                    dt = 0
+        t = self._t + dt
+        self._t = t
+        if self._stats is not None:
+            if kind == KIND_MARKER:
+                self._stats.marker(dt)
+            elif kind == KIND_GAP:
+                self._stats.gap(dt)
+            else:
+                self._stats.sample(dt, i, vt, vs)
+        if kind == KIND_MARKER:
+            i = self._i
+        if self._pos < 0:
+            # Open a block: the keyframe is this record's absolute state, so
+            # its own delta record is all zeros.
+            struct.pack_into(BLOCK_HDR_FMT, self._buf, self._blk, 0,
+                              t & 0xFFFFFFFF, i, vt, vs)
+            self._pos = self._blk + BLOCK_HDR_SIZE
+            self._pdt = dt = 0
+            self._i, self._vt, self._vs = i, vt, vs
+            if self._index is not None:
+                self._index.append(self._total)
+                self._index.append(t & 0xFFFFFFFF)
+        mask = 0
+        if i != self._i:
+            mask |= _MASK_I
+        if vt != self._vt:
+            mask |= _MASK_VT
+        if vs != self._vs:
+            mask |= _MASK_VS
+        self._varint((_zigzag(dt - self._pdt) << 5) | (mask << 2) | kind)
+        if mask & _MASK_I:
+            self._varint(_zigzag(i - self._i))
+        if mask & _MASK_VT:
+            self._varint(_zigzag(vt - self._vt))
+        if mask & _MASK_VS:
+            self._varint(_zigzag(vs - self._vs))
+        self._pdt = dt
+        self._i, self._vt, self._vs = i, vt, vs
+        self._n += 1
+        self._count += 1
+        self._total += 1
+        if self._pos + _V2_MAX_RECORD > self._blk + self._room:
+            self._close_block()
+        return self._blk >= self._end
+
+    def sample(self, t, current_amps: float, track_v: float, supply_v: float) -> bool:
+        """Pack one data row. Returns True once the buffer is full."""
+        if self._raw:
+            return self._put(KIND_DATA, t, _clip_i16(current_amps - _RAW_I_BIAS),
+                              track_v, supply_v)
+        return self._put(KIND_DATA, t, encode_current(current_amps),
+                          encode_voltage(track_v), encode_voltage(supply_v))
+
+    def put(self, t: int, i: int, vt: int, vs: int, marker: bool = False) -> bool:
+        """Pack one row already in stored form — t absolute in the encoder's
+        units, i/vt/vs as a reader yields them — for rewriting a session
+        (see flash_writer.Compactor). Don't mix with sample()/marker() in
+        one session. Returns True once the buffer is full."""
+        dt = t - self._t if self._total else t
+        if i == GAP_SENTINEL:
+            return self._put(KIND_GAP, None, vt, self._vt, self._vs, dt if dt > 0 else 0)
+        return self._put(KIND_MARKER if marker else KIND_DATA, None, i, vt, vs,
+                          dt if dt > 0 else 0)
+
+    def marker(self, t, track_v: float = 0.0, supply_v: float = 0.0) -> bool:
+        """Pack one lap-marker row. Returns True once the buffer is full."""
+        if self._raw:
+            return self._put(KIND_MARKER, t, 0, track_v, supply_v)
+        return self._put(KIND_MARKER, t, 0,
+                          encode_voltage(track_v), encode_voltage(supply_v))
+
+    def gap(self, t, lost: int) -> bool:
+        """Pack a gap record: `lost` samples went missing before the one at
+        tick t (which is packed next). Returns True once the buffer is
+        full."""
+        if lost > _GAP_MAX:
+            lost = _GAP_MAX
+        return self._put(KIND_GAP, t, lost, self._vt, self._vs)
+
+
+def _read_varint(buf, pos: int):
+    v = shift = 0
+    while True:
+        b = buf[pos]
+        pos += 1
+        v |= (b & 0x7F) << shift
+        if b < 0x80:
+            return v, pos
+        shift += 7
+
+
+def iter_block(block):
+    """
+    Yield (t, i_cA, vt_cV, vs_cV) for every record in one v2 block, t
+    absolute from the keyframe. Marker rows carry LAP_MARKER_SENTINEL as
+    i_cA, exactly like a v1 record; gap rows are (t, GAP_SENTINEL, lost
+    samples, 0). Stops quietly at a torn block's end.
+    """
+    if len(block) < BLOCK_HDR_SIZE:
+        return
+    n, t, i, vt, vs = struct.unpack_from(BLOCK_HDR_FMT, block, 0)
+    pos = BLOCK_HDR_SIZE
+    dt = 0
+    try:
+        for _ in range(n):
+            head, pos = _read_varint(block, pos)
+            kind = head & 3
+            mask = (head >> 2) & 7
+            dt += _unzigzag(head >> 5)
+            t += dt
+            if mask & _MASK_I:
+                d, pos = _read_varint(block, pos)
+                i += _unzigzag(d)
+            if mask & _MASK_VT:
+                d, pos = _read_varint(block, pos)
+                vt += _unzigzag(d)
+            if mask & _MASK_VS:
+                d, pos = _read_varint(block, pos)
+                vs += _unzigzag(d)
+            if kind == KIND_GAP:
+                yield (t, GAP_SENTINEL, i, 0)
+            else:
+                yield (t, LAP_MARKER_SENTINEL if kind == KIND_MARKER else i, vt, vs)
+    except IndexError:
+        return
+
+
+def iter_rows(f, header: dict, end: int = None):
+    """
+    Yield (t, i_cA, vt_cV, vs_cV) for every record of a v1 or v2 session,
+    t cumulative from session start in header['time_unit_us'] units. f must be positioned right after
+    the header (as read_header leaves it) or, for v2, at any block
+    boundary. end, if given, is the absolute
+    offset the record region stops at (a v2 trailer's start — see
+    read_trailer); otherwise it runs to EOF. A torn trailing record/block
+    is ignored.
+    """
+    if header['version'] != HEADER_VERSION_V2:
+        t = 0
+        while True:
+            buf = f.read(RECORD_SIZE)
+            if len(buf) < RECORD_SIZE:
+                return
+            dt, i, vt, vs = struct.unpack(RECORD_FMT, buf)
+            t += dt
+            yield (t, i, vt, vs)
+    bs = header['block_size']
+    crc = header['flags'] & FLAG_BLOCK_CRC
+    left = -1 if end is None else (end - f.tell()) // bs
+    while left:
+        block = f.read(bs)
+        if not block:
+            return
+        left -= 1
+        if crc and not block_ok(block, bs, True):
+            continue
+        for row in iter_block(block):
+            yield row
+
+
+def block_ok(block, bs: int, crc: bool) -> bool:
+    """
+    Cheap integrity check of one v2 block, without decoding it: a whole
+    block whose CRC32 matches (crc=True), or whose keyframe record count is
+    plausible (crc=False — all a CRC-less block allows).
+    """
+    if len(block) < bs:
+        return False
+    if crc:
+        room = bs - BLOCK_CRC_SIZE
+        return (binascii.crc32(memoryview(block)[:room]) & 0xFFFFFFFF ==
+                struct.unpack_from(BLOCK_CRC_FMT, block, room)[0])
+    n = struct.unpack_from('<H', block, 0)[0]
+    return 0 < n <= bs - BLOCK_HDR_SIZE
+
+
+def verify(f) -> dict:
+    """
+    Check a session file's integrity without decoding records. Returns
+    {'version', 'crc' (blocks carry CRCs), 'size', 'blocks' (good blocks
+    from the start; 0 for v1), 'good_end' (offset just past the last good
+    block/whole record), 'closed' (v2 trailer present), 'ok' (everything
+    up to the trailer, or EOF, is good)}. A file whose header doesn't parse
+    reports good_end 0.
+    """
+    f.seek(0, 2)
+    size = f.tell()
+    f.seek(0)
+    try:
+        header = read_header(f)
+    except ValueError:
+        return {'version': 0, 'crc': False, 'size': size, 'blocks': 0,
+                'good_end': 0, 'closed': False, 'ok': False}
+    data_end, sections = read_trailer(f, header)
+    hsize = header['header_size']
+    crc = bool(header['flags'] & FLAG_BLOCK_CRC)
+    blocks = 0
+    if header['version'] != HEADER_VERSION_V2:
+        good_end = hsize + (data_end - hsize) // RECORD_SIZE * RECORD_SIZE
+    else:
+        bs = header['block_size']
+        buf = bytearray(bs)
+        good_end = hsize
+        f.seek(hsize)
+        while good_end + bs <= data_end:
+            if f.readinto(buf) != bs or not block_ok(buf, bs, crc):
+                break
+            good_end += bs
+            blocks += 1
+    return {'version': header['version'], 'crc': crc, 'size': size,
+            'blocks': blocks, 'good_end': good_end, 'closed': bool(sections),
+            'ok': good_end == data_end}
+
+
+# ── v2 trailer ──────────────────────────────────────────────────────────────
+
+def pack_section(tag: bytes, payload) -> bytes:
+    """One trailer section. payload is anything with the buffer protocol
+    (bytes, bytearray, array) — its byte length is what gets recorded."""
+    payload = bytes(payload)
+    return struct.pack(SECTION_HDR_FMT, tag, len(payload)) + payload
+
+
+def pack_trailer_end(sections_len: int) -> bytes:
+    return struct.pack(TRAILER_END_FMT, sections_len, TRAILER_MAGIC)
+
+
+def read_trailer(f, header: dict):
+    """
+    Locate a v2 trailer from the end of the file. Returns (data_end,
+    sections): data_end is the absolute offset the block region stops at,
+    sections maps tag -> (payload offset, payload length). A v1 file, or a
+    v2 file with no (or a malformed) trailer, gives (file size, {}).
+    Leaves f's position undefined — seek before reading on.
+    """
+    f.seek(0, 2)
+    size = f.tell()
+    hsize = header['header_size']
+    if header['version'] != HEADER_VERSION_V2 or size < hsize + TRAILER_END_SIZE:
+        return size, {}
+    f.seek(size - TRAILER_END_SIZE)
+    sections_len, magic = struct.unpack(TRAILER_END_FMT, f.read(TRAILER_END_SIZE))
+    start = size - TRAILER_END_SIZE - sections_len
+    if magic != TRAILER_MAGIC or start < hsize or (start - hsize) % header['block_size']:
+        return size, {}
+    sections = {}
+    pos = start
+    f.seek(pos)
+    while pos < size - TRAILER_END_SIZE:
+        raw = f.read(SECTION_HDR_SIZE)
+        if len(raw) != SECTION_HDR_SIZE:
+            return size, {}
+        tag, length = struct.unpack(SECTION_HDR_FMT, raw)
+        sections[tag] = (pos + SECTION_HDR_SIZE, length)
+        pos += SECTION_HDR_SIZE + length
+        f.seek(pos)
+    if pos != size - TRAILER_END_SIZE:
+        return size, {}
+    return start, sections
+
+
+class SessionReader:
+    """
+    Random access to one open session file (v1 or v2):
+
+        r = SessionReader(open(path, 'rb'))
+        r.header                    # read_header() dict
+        for t, i_cA, vt_cV, vs_cV in r.rows(180_000, 240_000): ...
+
+    v2 time ranges cost O(log n): a bisect over the trailer's time index
+    if there is one, else over the on-disk block keyframes. v1 has neither
+    and is scanned from the start.
+    """
+
+    def __init__(self, f):
+        self.f = f
+        self.header = read_header(f)
+        self.data_end, self._sections = read_trailer(f, self.header)
+        self._index = None
+        f.seek(self.header['header_size'])
+
+    def section(self, tag: bytes):
+        """Raw payload of a trailer section, or None if absent."""
+        loc = self._sections.get(tag)
+        if loc is None:
+            return None
+        self.f.seek(loc[0])
+        return self.f.read(loc[1])
+
+    def n_blocks(self) -> int:
+        if self.header['version'] != HEADER_VERSION_V2:
+            return 0
+        return (self.data_end - self.header['header_size']) // self.header['block_size']
+
+    def _pairs(self, tag: bytes):
+        raw = self.section(tag)
+        if raw is None:
+            return None
+        return [struct.unpack_from(INDEX_ENTRY_FMT, raw, k)
+                for k in range(0, len(raw) - INDEX_ENTRY_SIZE + 1, INDEX_ENTRY_SIZE)]
+
+    def index(self):
+        """(record number, t) per block from the trailer, or None."""
+        if self._index is None:
+            self._index = self._pairs(TAG_TIME_INDEX)
+        return self._index
+
+    def summary(self):
+        """unpack_summary() dict from the trailer, or None — never reads
+        records (see summarize() for a scan)."""
+        raw = self.section(TAG_SUMMARY)
+        if raw is None or len(raw) < SUMMARY_SIZE:
+            return None
+        return unpack_summary(raw)
+
+    def summarize(self) -> dict:
+        """The same dict as summary(), computed by scanning every record —
+        for sessions without one in a trailer."""
+        stats = SessionStats()
+        stats.reset(self.header['scale'], self.header['time_unit_us'])
+        prev = 0
+        for t, i, vt, vs in self.rows():
+            if i == LAP_MARKER_SENTINEL:
+                stats.marker(t - prev)
+            elif i == GAP_SENTINEL:
+                stats.gap(t - prev)
+            else:
+                stats.sample(t - prev, i, vt, vs)
+            prev = t
+        return unpack_summary(stats.pack())
+
+    def rebuild_sections(self):
+        """The (tag, payload) trailer sections a v2 writer would have
+        appended — time index, laps and summary — rebuilt by scanning every
+        block. For recovering a session whose trailer a reset cut off; run
+        it on a file already trimmed to its good blocks (see verify()).
+        Leaves the samples its gap records account for in self.lost."""
+        hdr = self.header
+        f = self.f
+        bs = hdr['block_size']
+        index = array('I')
+        laps = array('I')
+        stats = SessionStats()
+        stats.reset(hdr['scale'], hdr['time_unit_us'])
+        n = 0
+        prev = 0
+        lost = 0
+        f.seek(hdr['header_size'])
+        for _ in range(self.n_blocks()):
+            block = f.read(bs)
+            index.append(n)
+            index.append(struct.unpack_from(BLOCK_HDR_FMT, block, 0)[1])
+            for t, i, vt, vs in iter_block(block):
+                if i == LAP_MARKER_SENTINEL:
+                    laps.append(n)
+                    laps.append(t)
+                    stats.marker(t - prev)
+                elif i == GAP_SENTINEL:
+                    stats.gap(t - prev)
+                    lost += vt
+                else:
+                    stats.sample(t - prev, i, vt, vs)
+                prev = t
+                n += 1
+        self.lost = lost
+        return [(TAG_TIME_INDEX, index), (TAG_LAPS, laps),
+                (TAG_SUMMARY, stats.pack())]
+
+    def timing(self):
+        """unpack_timing() dict of Core 1's pacing while the session was
+        recorded, or None (v1, older files, or a recovered session)."""
+        raw = self.section(TAG_TIMING)
+        if raw is None or len(raw) < TIMING_HDR_SIZE:
+            return None
+        return unpack_timing(raw)
+
+    def laps(self):
+        """(record number, t_ms) per lap marker — from the trailer when
+        there is one, else by scanning every record (v1, or a v2 session
+        whose trailer a reset cut off). t_ms is whole ms whatever the
+        session's timebase."""
+        unit = self.header['time_unit_us']
+        laps = self._pairs(TAG_LAPS)
+        if laps is None:
+            laps = []
+            n = 0
+            for t, i, _vt, _vs in self.rows():
+                if i == LAP_MARKER_SENTINEL:
+                    laps.append((n, t))
+                n += 1
+        if unit == 1000:
+            return laps
+        return [(n, t * unit // 1000) for n, t in laps]
+
+    def _block_t(self, k: int) -> int:
+        self.f.seek(self.header['header_size'] + k * self.header['block_size'])
+        return struct.unpack(BLOCK_HDR_FMT, self.f.read(BLOCK_HDR_SIZE))[1]
+
+    def find_block(self, t: int) -> int:
+        """Last block whose keyframe is at or before t, in the session's
+        time units (0 if none)."""
+        idx = self.index()
+        lo, hi = 0, self.n_blocks()
+        if idx is not None and len(idx) == hi:
+            while lo < hi:
+                mid = (lo + hi) // 2
+                if idx[mid][1] <= t:
+                    lo = mid + 1
+                else:
+                    hi = mid
+        else:
+            while lo < hi:
+                mid = (lo + hi) // 2
+                if self._block_t(mid) <= t:
+                    lo = mid + 1
+                else:
+                    hi = mid
+        return lo - 1 if lo else 0
+
+    def rows(self, t_from: int = 0, t_to: int = None):
+        """Yield (t, i_cA, vt_cV, vs_cV) for records with t_from <= t_ms <
+        t_to (t_to None = to the end). The window is in ms; t is in the
+        session's units (header['time_unit_us'], see units_to_ms)."""
+        hdr = self.header
+        f = self.f
+        unit = hdr['time_unit_us']
+        if unit != 1000:
+            t_from = -(-t_from * 1000 // unit)
+            if t_to is not None:
+                t_to = -(-t_to * 1000 // unit)
+        if hdr['version'] == HEADER_VERSION_V2 and t_from > 0:
+            f.seek(hdr['header_size'] + self.find_block(t_from) * hdr['block_size'])
+        else:
+            f.seek(hdr['header_size'])
+        for row in iter_rows(f, hdr, self.data_end):
+            if row[0] < t_from:
+                continue
+            if t_to is not None and row[0] >= t_to:
+                return
+            yield row
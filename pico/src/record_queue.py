@@ -0,0 +1,100 @@
+# Copyright @ 2026 Adrian Blakey. All rights reserved
+# record_queue.py — a fixed-record-width variant of primitives.RingbufQueue.
+#
+# RingbufQueue keeps one Python object per slot in a list and does an
+# Event.set()/clear() — scheduling every waiting task — on every put and
+# every get. RecordQueue keeps `slots` records of `width` ints each in ONE
+# preallocated int array (an array rather than a bytearray so records are
+# plain ints in and out, with no struct packing on either side), and moves
+# records in batches: put_many() copies a run of records in and wakes the
+# getter once; get_many() copies out everything waiting, up to the caller's
+# buffer, so a consumer drains the queue in one step. There's no async put:
+# the only producer is the publisher, which never waits.
+#
+# Same overwrite semantics as RingbufQueue.put_nowait: a full queue drops
+# its OLDEST records to make room; put_many() returns how many it dropped
+# instead of raising. Not thread safe, same as RingbufQueue — Core 0 only.
+
+import array
+import asyncio
+
+
+class RecordQueue:
+
+    def __init__(self, slots: int, width: int = 4):
+        self._buf = array.array('i', (0 for _ in range(slots * width)))
+        self._slots = slots
+        self._width = width
+        self._ri = 0              # oldest record
+        self._n = 0               # records waiting
+        self.dropped = 0          # records overwritten before they were read
+        self._evput = asyncio.Event()  # Triggered by put, tested by get
+
+    def full(self):
+        return self._n == self._slots
+
+    def empty(self):
+        return self._n == 0
+
+    def qsize(self):
+        return self._n
+
+    def put_many(self, src, n: int, off: int = 0) -> int:
+        """Copy n records from src (ints, record-major) starting at record
+        off; wake the getter once. Returns the number of old records
+        dropped to make room (0 normally)."""
+        w, slots, buf = self._width, self._slots, self._buf
+        skip = 0
+        if n > slots:             # only the newest `slots` can fit
+            skip = n - slots
+            off += skip
+            n = slots
+        drop = self._n + n - slots
+        if drop > 0:
+            self._ri = (self._ri + drop) % slots
+            self._n -= drop
+        else:
+            drop = 0
+        drop += skip
+        self.dropped += drop
+        wi = (self._ri + self._n) % slots
+        s = off * w
+        for _ in range(n):
+            d = wi * w
+            for j in range(w):
+                buf[d + j] = src[s + j]
+            s += w
+            wi += 1
+            if wi == slots:
+                wi = 0
+        self._n += n
+        self._evput.set()         # Schedule any tasks waiting on get
+        self._evput.clear()
+        return drop
+
+    def get_many_nowait(self, dst) -> int:
+        """Copy up to len(dst) // width waiting records into dst, oldest
+        first. Returns the number copied (0 if empty)."""
+        w, slots, buf = self._width, self._slots, self._buf
+        n = min(self._n, len(dst) // w)
+        if not n:
+            return 0
+        ri = self._ri
+        d = 0
+        for _ in range(n):
+            s = ri * w
+            for j in range(w):
+                dst[d + j] = buf[s + j]
+            d += w
+            ri += 1
+            if ri == slots:
+                ri = 0
+        self._ri = ri
+        self._n -= n
+        return n
+
+    async def get_many(self, dst) -> int:
+        """Wait for at least one record, then get_many_nowait(dst)."""
+        while self.empty():
+            await self._evput.wait()
+        return self.get_many_nowait(dst)
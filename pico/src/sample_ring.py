@@ -0,0 +1,89 @@
+# Copyright @ 2026 Adrian Blakey. All rights reserved
+# sample_ring.py — lock-free single-producer/single-consumer sample ring
+# between Core 1 (adc_device's capture loop, the only writer of `head`) and
+# Core 0 (main.py's publisher, the only writer of `tail`).
+#
+# No lock on either side. Each slot is WIDTH ints (t_us, raw0, raw1, raw2)
+# in one preallocated array; head and tail are free-running sequence
+# numbers (masked to SEQ_MASK so they stay small ints) in one-element int
+# arrays, so publishing either is a single aligned word store — atomic on
+# the RP2040, which also doesn't reorder memory accesses:
+#
+#   producer  write slot (head & mask), THEN store head + 1
+#   consumer  read head; copy slot (tail & mask); read head AGAIN; store tail
+#
+# The producer never waits for the consumer. If the consumer falls `slots`
+# behind, the producer is writing into the oldest unread slot, so get()
+# skips ahead to the oldest slot that's still intact. The re-read of head
+# after the copy catches the producer overwriting the slot during the copy
+# itself: once head reaches tail + slots that slot may be half rewritten,
+# so it's dropped and counted as lost instead of returned torn. Both cases
+# are reported to the caller and counted (overruns, lost).
+#
+# put() allocates nothing, so it's safe on Core 1; construct the ring on
+# Core 0.
+
+import array
+
+SEQ_MASK = 0x3FFFFFFF
+WIDTH = 4                 # ints per slot: t_us, raw0, raw1, raw2
+
+
+class SampleRing:
+
+    def __init__(self, slots: int):
+        if slots < 2 or slots & (slots - 1):
+            raise ValueError("slots must be a power of 2")
+        self.slots = slots
+        self._mask = slots - 1
+        self.buf = array.array('i', (0 for _ in range(slots * WIDTH)))
+        self.head = array.array('i', [0])    # written by the producer only
+        self.tail = array.array('i', [0])    # written by the consumer only
+        self.overruns = 0         # get() calls that found samples lost
+        self.lost = 0             # samples lost in total
+
+    def put(self, t: int, r0: int, r1: int, r2: int) -> None:
+        """Producer (Core 1) only. Never blocks, never allocates."""
+        h = self.head[0]
+        i = (h & self._mask) << 2
+        buf = self.buf
+        buf[i]     = t
+        buf[i + 1] = r0
+        buf[i + 2] = r1
+        buf[i + 3] = r2
+        self.head[0] = (h + 1) & SEQ_MASK
+
+    def available(self) -> int:
+        """Consumer side: slots waiting (may exceed `slots` if lapped)."""
+        return (self.head[0] - self.tail[0]) & SEQ_MASK
+
+    def get(self, out, off: int = 0) -> int:
+        """Consumer (Core 0) only. Copy the oldest intact slot into
+        out[off:off + WIDTH] and return how many samples were lost just before it
+        — 0 normally — or -1 if the ring is empty."""
+        head, buf, slots = self.head, self.buf, self.slots
+        t = self.tail[0]
+        lost = 0
+        while True:
+            behind = (head[0] - t) & SEQ_MASK
+            if behind == 0:
+                return -1
+            if behind >= slots:
+                # Lapped: slot `head` (== head - slots) is the producer's next.
+                skip = behind - slots + 1
+                lost += skip
+                t = (t + skip) & SEQ_MASK
+            i = (t & self._mask) << 2
+            out[off]     = buf[i]
+            out[off + 1] = buf[i + 1]
+            out[off + 2] = buf[i + 2]
+            out[off + 3] = buf[i + 3]
+            if ((head[0] - t) & SEQ_MASK) < slots:
+                break             # the producer didn't reach this slot meanwhile
+            lost += 1
+            t = (t + 1) & SEQ_MASK
+        self.tail[0] = (t + 1) & SEQ_MASK
+        if lost:
+            self.overruns += 1
+            self.lost += lost
+        return lost
@@ -5,13 +5,13 @@
 # needs a display-class budget of RAM/CPU this board doesn't have to spare
 # alongside Wi-Fi+BLE) — status text, start/stop/mark, a session list with
 # download (raw or CSV), erase, and a profile form. An optional /ws feed
-# pushes plain numeric text lines for a live readout.
+# pushes plain numeric text lines — 10-50 Hz min/max/mean buckets — for a
+# live readout.
 #
 # main.py owns all real state; this module is wired to it via configure()
 # rather than importing main (same pattern as buzzer/ble_server), so it can
 # be exercised independently.
 
-import struct
 import asyncio
 
 from microdot import Microdot, Response, send_file
@@ -32,11 +32,11 @@ def _log():
     return log
 
 
-# Wire format used by main.py's publisher when it fans samples out to
-# subscriber queues (flash writer, this module's /ws feed). Kept here as the
-# single source of truth for the constant; main.py packs with the same
-# format string.
-LIVE_FMT = '<ifff'   # t_us(i32), current_A, track_V, supply_V
+# /ws viewers get main.py's shared live_view.LiveView stream: one text line
+# per min/max/mean bucket at the ?rate= they ask for (10, 20 or 50 Hz),
+# formatted once however many viewers there are. A viewer that can't keep
+# up gets every other line (DECIMATE), and never holds back the flash writer.
+_WS_LINES = 8
 
 app = Microdot()
 Response.default_content_type = 'text/html'
@@ -45,16 +45,16 @@ _status_fn  = None    # () -> dict
 _start_fn   = None    # () -> None
 _stop_fn    = None    # () -> None
 _mark_fn    = None    # () -> None
-_subscribers = None   # shared list[RingbufQueue] from main.py's publisher
+_view = None          # main.py's live_view.LiveView
 
 
-def configure(status_fn, start_fn, stop_fn, mark_fn, subscribers=None) -> None:
-    global _status_fn, _start_fn, _stop_fn, _mark_fn, _subscribers
+def configure(status_fn, start_fn, stop_fn, mark_fn, view=None) -> None:
+    global _status_fn, _start_fn, _stop_fn, _mark_fn, _view
     _status_fn = status_fn
     _start_fn = start_fn
     _stop_fn = stop_fn
     _mark_fn = mark_fn
-    _subscribers = subscribers
+    _view = view
 
 
 # ── static / index ────────────────────────────────────────────────────────────
@@ -119,14 +119,14 @@ async def api_profile_post(request):
 
 @app.get('/api/sessions')
 async def api_sessions(request):
-    import os
+    # From flash_writer's session catalog — no per-file stat or trailer read.
     out = []
-    for name in fw.list_sessions():
-        try:
-            size = os.stat(fw.DATA_DIR + '/' + name)[6]
-        except OSError:
-            size = 0
-        out.append({'name': name, 'size': size})
+    for name, e in fw.catalog():
+        out.append({'name': name, 'size': e['size'], 'records': e['records'],
+                    'markers': e['markers'], 'duration_ms': e['duration_ms'],
+                    'start_epoch': e['start_epoch'], 'summary': e['summary'],
+                    'lost': e.get('lost', 0),
+                    'core1_timing': e.get('timing')})
     return Response(body=out)
 
 
@@ -154,6 +154,23 @@ async def api_session_download(request, name):
         return 'Not found', 404
 
 
+@app.get('/api/sessions/<name>/laps')
+async def api_session_laps(request, name):
+    """Lap table only — from the session catalog or the session's trailer,
+    without pulling the whole file. One that would need a full scan is
+    refused while a session is recording (see flash_writer.lap_table)."""
+    path = _session_path(name)
+    if path is None:
+        return 'Not found', 404
+    try:
+        laps = fw.lap_table(path)
+    except (OSError, ValueError):
+        return 'Not found', 404
+    if laps is None:
+        return 'Busy recording — try again once stopped', 503
+    return Response(body=laps)
+
+
 @app.get('/api/sessions/<name>/csv')
 async def api_session_csv(request, name):
     """
@@ -164,15 +181,37 @@ async def api_session_csv(request, name):
     fails with a silent 500 under the combined memory pressure of Wi-Fi +
     BLE + the ADC pipeline all live at once; streaming uses ~constant memory
     regardless of session length.
+
+    Optional ?from_ms=&to_ms= query args limit the rows to that elapsed-time
+    window; on a v2 session that seeks straight to it (SessionReader)
+    rather than decoding everything before it.
     """
     path = _session_path(name)
     if path is None:
         return 'Not found', 404
+    try:
+        t_from = int(request.args.get('from_ms', 0))
+        t_to = request.args.get('to_ms')
+        t_to = None if t_to is None else int(t_to)
+    except ValueError:
+        return 'Bad time range', 400
     try:
         f = open(path, 'rb')
-        hdr = lr.read_header(f)
+        reader = lr.SessionReader(f)
     except (OSError, ValueError) as e:
         return 'Read error: {}'.format(e), 500
+    hdr = reader.header
+    # Only a session the catalog counts lost samples for has gaps: gap
+    # records in a v2 file, (record number, lost) pairs in a v1 session's
+    # catalog entry (see flash_writer).
+    entry = fw.load_index()['sessions'].get(name) or {}
+    lost = entry.get('lost', 0)
+    v1_gaps = None if hdr['version'] == lr.HEADER_VERSION_V2 else entry.get('gaps')
+    gaps = bool(lost) and (v1_gaps is None or bool(v1_gaps))
+    if v1_gaps:
+        src = _v1_gap_rows(reader.rows(0, t_to), v1_gaps, t_from)
+    else:
+        src = reader.rows(t_from, t_to)
 
     async def rows():
         try:
@@ -180,44 +219,87 @@ async def api_session_csv(request, name):
                 yield '# {}={}\n'.format(k, v)
             yield '# start_epoch={}\n'.format(hdr['start_epoch'])
             yield '# sample_rate_hz={}\n'.format(hdr['sample_rate_hz'])
-            yield 'dt_ms,current_A,track_V,supply_V,marker\n'
-            while True:
-                buf = f.read(lr.RECORD_SIZE)
-                if len(buf) < lr.RECORD_SIZE:
-                    break
-                row = lr.unpack_record(buf)
-                yield '{},{},{:.2f},{:.2f},{}\n'.format(
-                    row['dt_ms'],
+            if hdr['oversample'] > 1:
+                yield '# oversample={}\n'.format(hdr['oversample'])
+            if t_from:
+                yield '# from_ms={}\n'.format(t_from)
+            if lost:
+                yield '# lost={}\n'.format(lost)
+            # A compacted session's data rows are (min, max, mean) triples
+            # per bucket (see log_record's BUCKETS notes): label each one.
+            # A session with gaps gets a last column, `gap`, counting the
+            # samples lost just before a gap row. (A session the catalog has
+            # no count for, e.g. one still recording, gets `# gap=` lines.)
+            bucketed = hdr['bucket_ms']
+            cols = 'dt_ms,current_A,track_V,supply_V,marker'
+            if bucketed:
+                yield '# bucket_ms={}\n'.format(bucketed)
+                cols += ',stat'
+            yield cols + (',gap\n' if gaps else '\n')
+            unit = hdr['time_unit_us']
+            prev_t = t_from * 1000 // unit
+            k = 0
+            for t, i, vt, vs in src:          # v1 or v2 alike
+                row = lr.row_dict(t - prev_t, i, vt, vs, hdr['scale'])
+                if row['gap'] and not gaps:
+                    yield '# gap={}\n'.format(row['gap'])
+                    continue      # the next row's dt_ms spans it
+                prev_t = t
+                if row['gap']:
+                    yield '{},,,,0,{}{}\n'.format(lr.format_ms(row['dt_ms'], unit),
+                                                ',' if bucketed else '', row['gap'])
+                    continue
+                line = '{},{},{:.2f},{:.2f},{}'.format(
+                    lr.format_ms(row['dt_ms'], unit),
                     '' if row['marker'] else '{:.2f}'.format(row['current_A']),
                     row['track_V'], row['supply_V'],
                     1 if row['marker'] else 0)
+                if bucketed:
+                    if row['marker']:
+                        line += ','
+                    else:
+                        line += ',' + lr.BUCKET_STATS[k % 3]
+                        k += 1
+                yield line + (',0\n' if gaps else '\n')
         finally:
             f.close()
 
     return Response(body=rows(), headers={'Content-Type': 'text/csv'})
 
 
+def _v1_gap_rows(rows, gaps, t_from):
+    """A v1 session's rows from t_from (ms) on, with the catalog's gaps —
+    flat (record number, lost) pairs — put back as gap rows, at the time of
+    the record each one came just before, as a v2 file has them."""
+    g = 0
+    for n, row in enumerate(rows):
+        while g < len(gaps) and gaps[g] <= n:
+            if row[0] >= t_from:
+                yield (row[0], lr.GAP_SENTINEL, gaps[g + 1], 0)
+            g += 2
+        if row[0] >= t_from:
+            yield row
+
+
 # ── live numeric feed (optional, abbreviated — no graph) ────────────────────
 
 @app.route('/ws')
 @with_websocket
 async def ws_live(request, ws):
-    if _subscribers is None:
+    if _view is None:
         return
     from primitives import RingbufQueue
-    q = RingbufQueue(20)
-    _subscribers.append(q)
+    q = RingbufQueue(_WS_LINES + 1)
+    sub = _view.subscribe(_view.rate(request.args.get('rate')), q, _WS_LINES)
     try:
         while True:
-            packed = await q.get()
-            _t, current_A, track_V, supply_V = struct.unpack(LIVE_FMT, packed)
+            # Every line waiting, in one message.
+            lines = [await q.get()]
+            while not q.empty():
+                lines.append(q.get_nowait())
             try:
-                await ws.send('{:.2f},{:.2f},{:.2f}\n'.format(
-                    current_A, track_V, supply_V))
+                await ws.send(''.join(lines))
             except OSError:
                 break
     finally:
-        try:
-            _subscribers.remove(q)
-        except ValueError:
-            pass
+        _view.unsubscribe(sub)
@@ -19,6 +19,13 @@ async function refreshStatus() {
   document.getElementById('st-count').textContent = st.record_count ?? '-';
   document.getElementById('st-flash').textContent =
     st.flash_free_pct != null ? st.flash_free_pct + '%' : '-';
+  document.getElementById('st-left').textContent =
+    st.time_left_s != null
+      ? Math.floor(st.time_left_s / 60) + ' min ' + (st.time_left_s % 60) + ' s'
+      : '-';
+  const tm = st.core1_timing;
+  document.getElementById('st-missed').textContent =
+    tm ? tm.missed + ' (worst ' + (tm.max_late_us / 1000).toFixed(1) + ' ms late)' : '-';
   if (st.profile) {
     document.getElementById('p-track').value = st.profile.track ?? '';
     document.getElementById('p-race').value = st.profile.race ?? '';
@@ -34,8 +41,13 @@ async function refreshSessions() {
   tbody.innerHTML = '';
   (Array.isArray(sessions) ? sessions : []).forEach((s) => {
     const tr = document.createElement('tr');
+    const sum = s.summary
+      ? '<br>' + (s.summary.duration_ms / 1000).toFixed(1) + ' s, ' +
+        s.summary.current_mean_A.toFixed(2) + ' A mean, ' +
+        s.summary.energy_Wh.toFixed(3) + ' Wh'
+      : s.duration_ms ? '<br>' + (s.duration_ms / 1000).toFixed(1) + ' s' : '';
     tr.innerHTML =
-      '<td>' + s.name + ' (' + fmtBytes(s.size) + ')</td>' +
+      '<td>' + s.name + ' (' + fmtBytes(s.size) + ')' + sum + '</td>' +
       '<td><a href="/api/sessions/' + s.name + '">raw</a>' +
       '<a href="/api/sessions/' + s.name + '/csv">csv</a></td>';
     tbody.appendChild(tr);
@@ -76,9 +88,12 @@ document.getElementById('profile-form').onsubmit = async (ev) => {
 
 function connectLive() {
   const proto = location.protocol === 'https:' ? 'wss:' : 'ws:';
-  const ws = new WebSocket(proto + '//' + location.host + '/ws');
+  // 10 Hz is plenty for a text readout; live_view.RATES lists the others.
+  const ws = new WebSocket(proto + '//' + location.host + '/ws?rate=10');
   ws.onmessage = (ev) => {
-    const [i, vt, vs] = ev.data.trim().split(',');
+    // One line per bucket, mean then min then max; show the newest mean.
+    const lines = ev.data.trim().split('\n');
+    const [i, vt, vs] = lines[lines.length - 1].split(',');
     document.getElementById('live-i').textContent = i;
     document.getElementById('live-vt').textContent = vt;
     document.getElementById('live-vs').textContent = vs;
@@ -171,9 +171,23 @@ _CONFIG.CRASH_PERSIST_JSON   = True
 _CONFIG.CRASH_AUTO_REBOOT_MS = 120_000
 _CONFIG.REBOOT_BUTTON_PIN    = 16
 _CONFIG.SAMPLE_RATE_HZ       = 200
+_CONFIG.SESSION_FORMAT       = 1
+_CONFIG.SESSION_BLOCK_CRC    = True
+_CONFIG.SESSION_RAW_ADC      = False
+_CONFIG.ADC_OVERSAMPLE       = 4
+_CONFIG.CORE1_WAKE_EVERY     = 4
+_CONFIG.CORE1_WAKE_MS        = 20
+_CONFIG.SESSION_TIME_UNIT_US = 1000
 _CONFIG.FLASH_MIN_FREE       = 32 * 1024
 _CONFIG.FLASH_LOW_WARN       = 96 * 1024
 _CONFIG.FLASH_AUTO_ROTATE    = False
+_CONFIG.FLASH_AUTO_COMPACT   = False
+_CONFIG.FLASH_COMPACT_BUCKET_MS = 50
+_CONFIG.FLASH_VERIFY_ALL     = False
+_CONFIG.FLASH_SYNC_MS        = 2000
+_CONFIG.FLASH_FLUSH_BYTES    = 8 * 1024
+_CONFIG.FLASH_RECONCILE_S    = 60
+_CONFIG.FLASH_TIME_WARN_S    = (300, 120, 60)
 _CONFIG.WIFI_MIN_FREE_BYTES  = 40 * 1024
 _CONFIG.BLE_FILE_CHUNK_SIZE  = 180
 sys.modules['CONFIG'] = _CONFIG
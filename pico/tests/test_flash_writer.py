@@ -57,6 +57,290 @@ class TestSessionLifecycle(FlashWriterTestBase):
         self.assertFalse(r1['marker'])
         self.assertTrue(r3['marker'])
 
+    def test_records_batch_until_flush(self):
+        w = fw.FlashWriter(data_dir=self.data_dir)
+        fname = w.start(start_epoch=0)
+        header_size = os.path.getsize(fname)
+        for k in range(fw._BATCH_RECORDS - 1):
+            w.write_sample(k * 1000, 1.0, 12.0, 12.0)
+        self.assertEqual(os.path.getsize(fname), header_size)   # still buffered
+        w.write_sample(fw._BATCH_RECORDS * 1000, 1.0, 12.0, 12.0)  # fills batch
+        w._file.flush()
+        self.assertEqual(os.path.getsize(fname),
+                          header_size + fw._BATCH_RECORDS * lr.RECORD_SIZE)
+        w.write_marker(fw._BATCH_RECORDS * 1000 + 1000)
+        w.flush()
+        self.assertEqual(os.path.getsize(fname),
+                          header_size + (fw._BATCH_RECORDS + 1) * lr.RECORD_SIZE)
+        self.assertEqual(w.record_count(), fw._BATCH_RECORDS + 1)
+        w.close()
+
+    def test_sync_time_cap_and_io_counters(self):
+        w = fw.FlashWriter(data_dir=self.data_dir, sync_ms=1000)
+        fname = w.start(start_epoch=0)
+        base = w.io_stats()
+        header_size = os.path.getsize(fname)
+        for k in range(200):                  # 995 ms of samples
+            w.write_sample(k * 5000, 1.0, 12.0, 12.0)
+        self.assertEqual(os.path.getsize(fname), header_size)
+        w.write_sample(200 * 5000, 1.0, 12.0, 12.0)    # 1000 ms: due
+        self.assertEqual(os.path.getsize(fname), header_size + 201 * lr.RECORD_SIZE)
+        st = w.io_stats()
+        self.assertEqual(st['flushes'], base['flushes'] + 1)
+        self.assertEqual(st['writes'], base['writes'] + 1)
+        self.assertEqual(st['bytes_written'], header_size + 201 * lr.RECORD_SIZE)
+        w.close()
+
+    def test_v2_session_round_trips(self):
+        w = fw.FlashWriter(data_dir=self.data_dir, version=lr.HEADER_VERSION_V2)
+        fname = w.start(start_epoch=0)
+        for k in range(500):
+            if k == 250:
+                w.write_marker(k * 5000, 12.0, 12.0)
+            w.write_sample(k * 5000, 1.0 + (k % 5) / 100.0, 12.0, 12.0)
+            if k % 100 == 99:
+                w.flush()
+        self.assertEqual(w.record_count(), 501)
+        w.close()
+
+        with open(fname, 'rb') as f:
+            r = lr.SessionReader(f)
+            hdr = r.header
+            rows = list(r.rows())
+        self.assertEqual(hdr['version'], lr.HEADER_VERSION_V2)
+        self.assertEqual(len(rows), 501)
+        self.assertEqual(rows[-1][0], 499 * 5)
+        self.assertEqual(sum(1 for r in rows if lr.is_marker(r[1])), 1)
+        self.assertLess(os.path.getsize(fname), 501 * lr.RECORD_SIZE)
+
+    def test_v2_close_writes_time_index(self):
+        w = fw.FlashWriter(data_dir=self.data_dir, version=lr.HEADER_VERSION_V2)
+        fname = w.start(start_epoch=0)
+        for k in range(3000):
+            w.write_sample(k * 5000, (k % 50) / 10.0, 12.0 - (k % 7) / 10.0, 12.0)
+        w.close()
+
+        with open(fname, 'rb') as f:
+            r = lr.SessionReader(f)
+            idx = r.index()
+            self.assertIsNotNone(idx)
+            self.assertEqual(len(idx), r.n_blocks())
+            self.assertGreater(len(idx), 2)
+            self.assertEqual(idx[0], (0, 0))
+            for rec_no, t_ms in idx:
+                self.assertEqual(t_ms, rec_no * 5)
+            rows = list(r.rows(3000, 4000))
+        self.assertEqual([row[0] for row in rows], list(range(3000, 4000, 5)))
+
+    def _lapped_session(self, version):
+        w = fw.FlashWriter(data_dir=self.data_dir, version=version)
+        fname = w.start(start_epoch=0)
+        for k in range(2000):
+            if k and k % 500 == 0:
+                w.write_marker(k * 5000, 12.0, 12.0)
+            w.write_sample(k * 5000, 1.0, 12.0, 12.0)
+        w.close()
+        return fname
+
+    def test_v2_lap_table_from_trailer(self):
+        fname = self._lapped_session(lr.HEADER_VERSION_V2)
+        with open(fname, 'rb') as f:
+            self.assertIsNotNone(lr.SessionReader(f).section(lr.TAG_LAPS))
+        self.assertEqual(fw.lap_table(fname), [
+            {'record': 500, 't_ms': 2500},
+            {'record': 1001, 't_ms': 5000},
+            {'record': 1502, 't_ms': 7500},
+        ])
+
+    def test_lap_table_falls_back_to_scan(self):
+        v2 = self._lapped_session(lr.HEADER_VERSION_V2)
+        expected = fw.lap_table(v2)
+        with open(v2, 'rb') as f:
+            data = f.read()
+        with open(v2, 'wb') as f:       # drop the trailer, as a reset would
+            f.write(data[:-lr.TRAILER_END_SIZE])
+        self.assertEqual(fw.lap_table(v2), expected)
+        os.remove(v2)
+
+        v1 = self._lapped_session(lr.HEADER_VERSION)
+        self.assertEqual(fw.lap_table(v1), expected)
+
+    def test_v1_lap_table_from_catalog(self):
+        v1 = self._lapped_session(lr.HEADER_VERSION)
+        name = os.path.basename(v1)
+        entry = fw.load_index(self.data_dir)['sessions'][name]
+        self.assertEqual(entry['laps'], [500, 2500, 1001, 5000, 1502, 7500])
+        with open(v1, 'wb') as f:       # the file isn't read for it
+            f.write(b'')
+        self.assertEqual(fw.lap_table(v1)[-1], {'record': 1502, 't_ms': 7500})
+
+    def test_lap_scan_refused_while_recording_then_kept(self):
+        v1 = self._lapped_session(lr.HEADER_VERSION)
+        name = os.path.basename(v1)
+        del fw.load_index(self.data_dir)['sessions'][name]['laps']  # older firmware's entry
+        w = fw.FlashWriter(data_dir=self.data_dir)
+        w.start(start_epoch=100)
+        self.assertIsNone(fw.lap_table(v1))
+        w.close()
+        self.assertEqual(len(fw.lap_table(v1)), 3)
+        self.assertEqual(len(fw.load_index(self.data_dir)['sessions'][name]['laps']), 6)
+
+    def test_v2_summary_in_trailer_matches_scan(self):
+        fname = self._lapped_session(lr.HEADER_VERSION_V2)
+        got = fw.session_summary(fname)
+        self.assertIsNotNone(got)
+        self.assertEqual(got['samples'], 2000)
+        self.assertEqual(got['markers'], 3)
+        with open(fname, 'rb') as f:
+            self.assertEqual(got, lr.SessionReader(f).summarize())
+
+    def test_v1_has_no_trailer_summary(self):
+        fname = self._lapped_session(lr.HEADER_VERSION)
+        self.assertIsNone(fw.session_summary(fname))
+
+    def test_verify_crc_session(self):
+        w = fw.FlashWriter(data_dir=self.data_dir, version=lr.HEADER_VERSION_V2, block_crc=True)
+        fname = w.start(start_epoch=0)
+        for k in range(3000):
+            w.write_sample(k * 5000, (k % 50) / 10.0, 12.0, 12.0)
+        w.close()
+        name = os.path.basename(fname)
+        r = fw.verify(name, self.data_dir)
+        self.assertTrue(r['ok'] and r['crc'] and r['closed'])
+        self.assertEqual(fw.verify_all(self.data_dir), {})
+
+        with open(fname, 'rb') as f:
+            data = f.read()
+        with open(fname, 'wb') as f:          # power cut mid-block
+            f.write(data[:r['good_end'] - 100])
+        bad = fw.verify_all(self.data_dir)
+        self.assertEqual(list(bad), [name])
+        self.assertEqual(bad[name]['good_end'], r['good_end'] - lr.BLOCK_SIZE)
+        self.assertFalse(bad[name]['closed'])
+
+    def test_verify_new_checks_each_session_once(self):
+        w = fw.FlashWriter(data_dir=self.data_dir, version=lr.HEADER_VERSION_V2, block_crc=True)
+        names = []
+        for n in range(2):
+            fname = w.start(start_epoch=1_700_000_000 + 60 * n)
+            for k in range(3000):
+                w.write_sample(k * 5000, 1.0, 12.0, 12.0)
+            w.close()
+            names.append(os.path.basename(fname))
+        self.assertNotEqual(names[0], names[1])
+        self.assertEqual(fw.verify_new(self.data_dir), {})
+        sessions = fw.load_index(self.data_dir)['sessions']
+        self.assertTrue(all(sessions[n]['verified'] for n in names))
+
+        # Damage to an already-verified file isn't re-read at boot; only
+        # verify_all (CONFIG.FLASH_VERIFY_ALL) finds it.
+        path = os.path.join(self.data_dir, names[0])
+        with open(path, 'rb') as f:
+            data = f.read()
+        with open(path, 'wb') as f:
+            f.write(data[:len(data) // 2])
+        self.assertEqual(fw.verify_new(self.data_dir), {})
+        self.assertEqual(list(fw.verify_all(self.data_dir)), [names[0]])
+
+        # A damaged new one stays unverified and is reported every boot.
+        del sessions[names[1]]['verified']
+        path = os.path.join(self.data_dir, names[1])
+        with open(path, 'rb') as f:
+            data = f.read()
+        with open(path, 'wb') as f:
+            f.write(data[:len(data) // 2])
+        self.assertEqual(list(fw.verify_new(self.data_dir)), [names[1]])
+        self.assertEqual(list(fw.verify_new(self.data_dir)), [names[1]])
+
+    def test_raw_adc_session_converts_on_read(self):
+        cal = (0.002, 0.0003, 32000)          # A/count, V/count, zero count
+        w = fw.FlashWriter(data_dir=self.data_dir, version=lr.HEADER_VERSION_V2,
+                           block_crc=True, raw_adc=True)
+        fname = w.start(start_epoch=0, raw_cal=cal)
+        for k in range(1000):
+            w.write_sample(k * 5000, 32000 + 1000 + k % 7, 40000, 41000)
+        w.write_marker(1000 * 5000, 40000, 41000)
+        w.close()
+
+        with open(fname, 'rb') as f:
+            r = lr.SessionReader(f)
+            self.assertTrue(r.header['flags'] & lr.FLAG_RAW_ADC)
+            self.assertEqual(r.header['raw_cal'][2], 32000)
+            rows = [lr.row_dict(0, i, vt, vs, r.header['scale']) for _t, i, vt, vs in r.rows()]
+            summary = r.summary()
+        self.assertAlmostEqual(rows[3]['current_A'], 1003 * 0.002, places=5)
+        self.assertAlmostEqual(rows[3]['track_V'], 40000 * 0.0003, places=4)
+        self.assertTrue(rows[-1]['marker'])
+        self.assertAlmostEqual(summary['current_mean_A'], 1003 * 0.002, delta=0.01)
+        self.assertAlmostEqual(summary['supply_max_V'], 41000 * 0.0003, places=1)
+        self.assertEqual(summary['markers'], 1)
+
+    def test_raw_adc_needs_v2_and_calibration(self):
+        with self.assertRaises(ValueError):
+            fw.FlashWriter(data_dir=self.data_dir, raw_adc=True)
+        w = fw.FlashWriter(data_dir=self.data_dir, version=lr.HEADER_VERSION_V2, raw_adc=True)
+        with self.assertRaises(ValueError):
+            w.start(start_epoch=0)
+
+    def test_sub_ms_timebase_needs_v2(self):
+        with self.assertRaises(ValueError):
+            fw.FlashWriter(data_dir=self.data_dir, time_unit_us=10)
+        with self.assertRaises(ValueError):
+            fw.FlashWriter(data_dir=self.data_dir, version=lr.HEADER_VERSION_V2, time_unit_us=7)
+
+    def test_sub_ms_laps_and_summary_are_in_ms(self):
+        w = fw.FlashWriter(data_dir=self.data_dir, version=lr.HEADER_VERSION_V2, time_unit_us=10)
+        fname = w.start(start_epoch=0)
+        for k in range(4000):                 # 2 kHz, 2 s
+            if k == 3000:
+                w.write_marker(k * 500, 12.0, 12.0)
+            w.write_sample(k * 500, 2.0, 12.0, 12.0)
+        w.close()
+        self.assertEqual(fw.lap_table(fname), [{'record': 3000, 't_ms': 1500}])
+        summary = fw.session_summary(fname)
+        self.assertEqual(summary['duration_ms'], 1999)
+        self.assertAlmostEqual(summary['charge_Ah'], 2.0 * 1.9995 / 3600, places=6)
+
+    def test_oversample_factor_in_header(self):
+        w = fw.FlashWriter(data_dir=self.data_dir, version=lr.HEADER_VERSION_V2, oversample=4)
+        fname = w.start(start_epoch=0)
+        w.write_sample(0, 1.0, 12.0, 12.0)
+        w.close()
+        with open(fname, 'rb') as f:
+            self.assertEqual(lr.read_header(f)['oversample'], 4)
+
+    def test_core1_timing_in_trailer(self):
+        timing = {'edges_us': (50, 100), 'counts': [990, 8, 2], 'missed': 3,
+                  'max_late_us': 7400}
+        w = fw.FlashWriter(data_dir=self.data_dir, version=lr.HEADER_VERSION_V2)
+        fname = w.start(start_epoch=0)
+        w.write_sample(0, 1.0, 12.0, 12.0)
+        w.close(timing=timing)
+        with open(fname, 'rb') as f:
+            got = lr.SessionReader(f).timing()
+        self.assertEqual(got, timing)
+        fname = w.start(start_epoch=1)
+        w.close()
+        with open(fname, 'rb') as f:
+            self.assertIsNone(lr.SessionReader(f).timing())
+
+    def test_core1_timing_in_catalog(self):
+        timing = {'edges_us': [50, 100], 'counts': [990, 8, 2], 'missed': 3,
+                  'max_late_us': 7400}
+        w = fw.FlashWriter(data_dir=self.data_dir)
+        fname = w.start(start_epoch=0)
+        w.write_sample(0, 1.0, 12.0, 12.0)
+        w.close(timing=timing)
+        sessions = fw.load_index(self.data_dir)['sessions']
+        self.assertEqual(sessions[os.path.basename(fname)]['timing'], timing)
+        fname = w.start(start_epoch=1)
+        w.close()
+        self.assertNotIn('timing', sessions[os.path.basename(fname)])
+
+    def test_unknown_version_rejected(self):
+        with self.assertRaises(ValueError):
+            fw.FlashWriter(data_dir=self.data_dir, version=9)
+
     def test_cannot_start_twice(self):
         w = fw.FlashWriter(data_dir=self.data_dir)
         w.start()
@@ -79,6 +363,327 @@ class TestSessionLifecycle(FlashWriterTestBase):
         self.assertEqual(len(fw.list_sessions(self.data_dir)), 2)
 
 
+class TestFlushPolicy(FlashWriterTestBase):
+    def setUp(self):
+        super().setUp()
+        self._orig_ticks = fw._ticks_us
+        self.now = [0]
+        fw._ticks_us = lambda: self.now[0]
+
+    def tearDown(self):
+        fw._ticks_us = self._orig_ticks
+        super().tearDown()
+
+    def _writer(self):
+        w = fw.FlashWriter(data_dir=self.data_dir, sync_ms=None)
+        w.start(start_epoch=0)
+        return w
+
+    def test_due_on_pending_bytes(self):
+        w = self._writer()
+        p = fw.FlushPolicy(max_latency_ms=10_000, max_pending_bytes=1024)
+        self.assertFalse(p.due(w))            # header synced at start
+        for k in range(127):
+            w.write_sample(k * 5000, 1.0, 12.0, 12.0)
+        self.assertEqual(w.pending_bytes(), 127 * lr.RECORD_SIZE)
+        self.assertFalse(p.due(w))
+        w.write_sample(127 * 5000, 1.0, 12.0, 12.0)
+        self.assertTrue(p.due(w))
+        p.flush(w)
+        self.assertEqual(w.pending_bytes(), 0)
+        self.assertFalse(p.due(w))
+        w.close()
+        self.assertEqual(w.pending_bytes(), 0)
+
+    def test_due_on_latency_of_oldest_pending(self):
+        w = self._writer()
+        p = fw.FlushPolicy(max_latency_ms=500, max_pending_bytes=1 << 20)
+        self.now[0] = 1_000_000
+        self.assertFalse(p.due(w))            # nothing pending: no clock starts
+        w.write_sample(0, 1.0, 12.0, 12.0)
+        self.now[0] = 1_200_000
+        self.assertFalse(p.due(w))            # pending since 1.2 s
+        self.now[0] = 1_650_000
+        self.assertFalse(p.due(w))
+        self.now[0] = 1_700_000
+        self.assertTrue(p.due(w))
+        w.close()
+
+    def test_flush_latency_histogram(self):
+        w = self._writer()
+        p = fw.FlushPolicy()
+        orig_flush = w.flush
+
+        def slow_flush(ms):
+            def f():
+                orig_flush()
+                self.now[0] += ms * 1000
+            return f
+        for ms in (0, 3, 3, 40, 900):
+            w.flush = slow_flush(ms)
+            p.flush(w)
+        h = p.histogram()
+        self.assertEqual(len(h['counts']), len(h['edges_ms']) + 1)
+        self.assertEqual(h['counts'][0], 1)                       # < 1 ms
+        self.assertEqual(h['counts'][h['edges_ms'].index(4)], 2)  # 2-4 ms
+        self.assertEqual(h['counts'][h['edges_ms'].index(64)], 1) # 32-64 ms
+        self.assertEqual(h['counts'][-1], 1)                      # >= 256 ms
+        self.assertEqual(h['max_ms'], 900)
+        w.flush = orig_flush
+        w.close()
+
+
+class TestBootRecovery(FlashWriterTestBase):
+    def _crashed_session(self, version, gap_at=None, **kw):
+        """A session flushed mid-write and never closed, with a torn
+        partial write past the flushed data — what a reset leaves."""
+        w = fw.FlashWriter(data_dir=self.data_dir, version=version, **kw)
+        fname = w.start(start_epoch=0)
+        for k in range(3000):
+            if k == gap_at:
+                w.write_gap(k * 5000, 25)
+            if k % 700 == 699:
+                w.write_marker(k * 5000, 12.0, 12.0)
+            else:
+                w.write_sample(k * 5000, (k % 50) / 10.0, 12.0, 12.0)
+        w.flush()
+        w._file.close()
+        with open(fname, 'ab') as f:
+            f.write(b'\x5a' * 5)
+        return fname
+
+    def test_clean_close_leaves_nothing_to_recover(self):
+        w = fw.FlashWriter(data_dir=self.data_dir)
+        w.start(start_epoch=0)
+        self.assertIsNotNone(fw.load_index(self.data_dir)['open'])
+        w.close()
+        self.assertIsNone(fw.load_index(self.data_dir)['open'])
+        self.assertIsNone(fw.recover(self.data_dir))
+
+    def test_v1_trimmed_to_whole_records(self):
+        fname = self._crashed_session(lr.HEADER_VERSION)
+        name = os.path.basename(fname)
+        rec = fw.recover(self.data_dir)
+        self.assertEqual(rec['name'], name)
+        self.assertEqual(rec['size'] - rec['kept'], 5)
+        self.assertEqual(os.path.getsize(fname), rec['kept'])
+        with open(fname, 'rb') as f:
+            self.assertEqual(len(list(lr.SessionReader(f).rows())), 3000)
+        idx = fw.load_index(self.data_dir)
+        self.assertIsNone(idx['open'])
+        self.assertTrue(idx['sessions'][name]['recovered'])
+        self.assertIsNone(fw.recover(self.data_dir))     # only once
+
+    def test_v2_trimmed_to_good_blocks_with_rebuilt_trailer(self):
+        fname = self._crashed_session(lr.HEADER_VERSION_V2, block_crc=True)
+        name = os.path.basename(fname)
+        self.assertEqual(list(fw.verify_all(self.data_dir)), [name])
+        rec = fw.recover(self.data_dir)
+        self.assertEqual(rec['name'], name)
+
+        r = fw.verify(name, self.data_dir)
+        self.assertTrue(r['ok'] and r['closed'])
+        self.assertEqual(fw.verify_all(self.data_dir), {})
+        with open(fname, 'rb') as f:
+            reader = lr.SessionReader(f)
+            self.assertEqual(len(reader.index()), reader.n_blocks())
+            summary = reader.summary()
+            self.assertEqual(summary, reader.summarize())
+        self.assertEqual(summary['markers'], 4)
+        self.assertEqual([lap['t_ms'] for lap in fw.lap_table(fname)],
+                         [3495, 6995, 10495, 13995])
+        self.assertTrue(fw.load_index(self.data_dir)['sessions'][name]['recovered'])
+        self.assertNotIn('lost', fw.load_index(self.data_dir)['sessions'][name])
+
+    def test_v2_recovery_counts_lost_samples(self):
+        fname = self._crashed_session(lr.HEADER_VERSION_V2, gap_at=1000, block_crc=True)
+        fw.recover(self.data_dir)
+        entry = fw.load_index(self.data_dir)['sessions'][os.path.basename(fname)]
+        self.assertEqual(entry['lost'], 25)
+
+    def test_missing_open_file_just_clears_the_index(self):
+        fname = self._crashed_session(lr.HEADER_VERSION)
+        os.remove(fname)
+        self.assertIsNone(fw.recover(self.data_dir))
+        self.assertIsNone(fw.load_index(self.data_dir)['open'])
+
+
+class TestSessionCatalog(FlashWriterTestBase):
+    def _session(self, version, epoch):
+        w = fw.FlashWriter(data_dir=self.data_dir, version=version)
+        fname = w.start(start_epoch=epoch)
+        for k in range(1500):
+            if k % 500 == 499:
+                w.write_marker(k * 5000, 12.0, 12.0)
+            else:
+                w.write_sample(k * 5000, 1.0, 12.0, 12.0)
+        w.close()
+        return os.path.basename(fname)
+
+    def test_close_records_entry(self):
+        v1 = self._session(lr.HEADER_VERSION, 1_700_000_000)
+        v2 = self._session(lr.HEADER_VERSION_V2, 1_700_000_100)
+        cat = dict(fw.catalog(self.data_dir))
+        self.assertEqual(list(cat), [v1, v2])
+        for name in (v1, v2):
+            e = cat[name]
+            self.assertEqual(e['size'], os.path.getsize(os.path.join(self.data_dir, name)))
+            self.assertEqual(e['records'], 1500)
+            self.assertEqual(e['markers'], 3)
+            self.assertEqual(e['duration_ms'], 1499 * 5)
+        self.assertEqual(cat[v1]['start_epoch'], 1_700_000_000)
+        with open(os.path.join(self.data_dir, v1), 'rb') as f:
+            self.assertEqual(cat[v1]['summary'], lr.SessionReader(f).summarize())
+        self.assertEqual(cat[v2]['summary'],
+                         fw.session_summary(os.path.join(self.data_dir, v2)))
+
+    def test_gap_records_and_lost_count(self):
+        w = fw.FlashWriter(data_dir=self.data_dir, version=lr.HEADER_VERSION_V2)
+        fname = w.start(start_epoch=0)
+        for k in range(100):
+            w.write_sample(k * 5000, 1.0, 12.0, 12.0)
+        w.write_gap(400 * 5000, 300)
+        for k in range(400, 500):
+            if k == 450:
+                w.write_marker(k * 5000, 12.0, 12.0)
+            w.write_sample(k * 5000, 1.0, 12.0, 12.0)
+        w.close()
+        with open(fname, 'rb') as f:
+            rows = list(lr.SessionReader(f).rows())
+        self.assertEqual(rows[100], (2000, lr.GAP_SENTINEL, 300, 0))
+        self.assertEqual(fw.lap_table(fname), [{'record': 151, 't_ms': 2250}])
+        self.assertEqual(dict(fw.catalog(self.data_dir))[os.path.basename(fname)]['lost'], 300)
+        v1 = fw.FlashWriter(data_dir=self.data_dir)
+        fname = v1.start(start_epoch=1)
+        v1.write_sample(0, 1.0, 12.0, 12.0)
+        v1.write_gap(5000, 7)
+        self.assertEqual((v1.lost_samples(), v1.record_count()), (7, 1))
+        v1.write_sample(5000, 1.0, 12.0, 12.0)
+        v1.close()
+        e = dict(fw.catalog(self.data_dir))[os.path.basename(fname)]
+        self.assertEqual((e['lost'], e['gaps']), (7, [1, 7]))
+
+    def test_missing_index_is_rebuilt_by_scan(self):
+        self._session(lr.HEADER_VERSION, 0)
+        self._session(lr.HEADER_VERSION_V2, 100)
+        expected = fw.catalog(self.data_dir)
+        os.remove(os.path.join(self.data_dir, fw.INDEX_NAME))
+        fw._indexes.clear()                 # as after a reboot
+        self.assertEqual(fw.catalog(self.data_dir), expected)
+        self.assertTrue(os.path.exists(os.path.join(self.data_dir, fw.INDEX_NAME)))
+
+    def test_index_survives_reboot(self):
+        name = self._session(lr.HEADER_VERSION_V2, 0)
+        expected = fw.catalog(self.data_dir)
+        fw._indexes.clear()
+        self.assertEqual(fw.catalog(self.data_dir), expected)
+        self.assertEqual(expected[0][0], name)
+
+    def test_erase_and_rotate_update_catalog(self):
+        self._session(lr.HEADER_VERSION, 0)
+        newest = self._session(lr.HEADER_VERSION, 100)
+        self.assertTrue(fw._rotate_oldest(self.data_dir))
+        self.assertEqual([n for n, _e in fw.catalog(self.data_dir)], [newest])
+        fw.erase_all(self.data_dir)
+        self.assertEqual(fw.catalog(self.data_dir), [])
+
+
+class TestCompactor(FlashWriterTestBase):
+    def _session(self, version=lr.HEADER_VERSION_V2):
+        w = fw.FlashWriter(data_dir=self.data_dir, version=version)
+        fname = w.start(start_epoch=0)
+        for k in range(6000):                      # 30 s at 200 Hz
+            if k % 1500 == 1499:
+                w.write_marker(k * 5000 + 1000, 12.0, 12.0)
+            w.write_sample(k * 5000, (k * 7 % 23) / 2.0, 12.0 - (k % 9) / 10.0, 12.5)
+        w.close()
+        return os.path.basename(fname)
+
+    def _compact(self, name):
+        c = fw.Compactor(name, self.data_dir, bucket_ms=50)
+        steps = 0
+        while not c.step(256):
+            steps += 1
+        self.assertGreater(steps, 10)              # really chunked
+        return c.commit()
+
+    def _rows(self, name):
+        with open(os.path.join(self.data_dir, name), 'rb') as f:
+            r = lr.SessionReader(f)
+            return r.header, list(r.rows()), r.summary()
+
+    def test_buckets_markers_and_summary(self):
+        name = self._session()
+        _hdr, orig, orig_summary = self._rows(name)
+        orig_laps = fw.lap_table(os.path.join(self.data_dir, name))
+        old, new = self._compact(name)
+        self.assertLess(new, old / 2)
+
+        hdr, rows, summary = self._rows(name)
+        self.assertEqual(hdr['bucket_ms'], 50)
+        self.assertEqual(summary, orig_summary)
+        self.assertTrue(fw.verify(name, self.data_dir)['ok'])
+        data = [r for r in rows if r[1] != lr.LAP_MARKER_SENTINEL]
+        self.assertEqual(len(data), 3 * 600)       # 6000 samples / 10 per bucket
+        samples = [r for r in orig if r[1] != lr.LAP_MARKER_SENTINEL]
+        for b in (0, 1, 337, 599):
+            chunk = samples[b * 10:(b + 1) * 10]
+            lo, hi, mean = data[3 * b:3 * b + 3]
+            self.assertEqual(lo[0], chunk[0][0])
+            for c in (1, 2, 3):
+                vals = [r[c] for r in chunk]
+                self.assertEqual(lo[c], min(vals))
+                self.assertEqual(hi[c], max(vals))
+                self.assertEqual(mean[c], (sum(vals) + 5) // 10)
+        self.assertEqual([lap['t_ms'] for lap in fw.lap_table(os.path.join(self.data_dir, name))],
+                         [lap['t_ms'] for lap in orig_laps])
+        e = dict(fw.catalog(self.data_dir))[name]
+        self.assertEqual((e['size'], e['bucket_ms']), (new, 50))
+        self.assertIsNone(fw.compact_candidate(self.data_dir))
+
+    def test_v1_session_compacts_to_v2(self):
+        name = self._session(lr.HEADER_VERSION)
+        old, new = self._compact(name)
+        self.assertLess(new, old)
+        hdr, rows, summary = self._rows(name)
+        self.assertEqual(hdr['version'], lr.HEADER_VERSION_V2)
+        self.assertEqual(summary['samples'], 6000)
+        self.assertEqual(summary['markers'], 4)
+
+    def test_erased_meanwhile_is_abandoned(self):
+        name = self._session()
+        c = fw.Compactor(name, self.data_dir, bucket_ms=50)
+        while not c.step(4096):
+            pass
+        fw.erase_all(self.data_dir)
+        self.assertEqual(c.commit(), (0, 0))
+        self.assertEqual(os.listdir(self.data_dir), [fw.INDEX_NAME])
+
+    def test_abort_keeps_original(self):
+        name = self._session()
+        with open(os.path.join(self.data_dir, name), 'rb') as f:
+            before = f.read()
+        c = fw.Compactor(name, self.data_dir)
+        c.step(100)
+        c.abort()
+        with open(os.path.join(self.data_dir, name), 'rb') as f:
+            self.assertEqual(f.read(), before)
+        self.assertEqual(fw.list_sessions(self.data_dir), [name])
+        self.assertEqual(sorted(os.listdir(self.data_dir)), sorted([name, fw.INDEX_NAME]))
+
+    def test_candidate_skips_open_session(self):
+        self._session()
+        w = fw.FlashWriter(data_dir=self.data_dir)
+        w.start(start_epoch=10**9)
+        for k in range(2000):
+            w.write_sample(k * 5000, 1.0, 12.0, 12.0)
+        w.flush()
+        self.assertEqual(fw.compact_candidate(self.data_dir),
+                         fw.catalog(self.data_dir)[0][0])
+        self.assertNotEqual(fw.compact_candidate(self.data_dir), os.path.basename(w.filename()))
+        w.close()
+
+
 class TestSessionListingAndErase(FlashWriterTestBase):
     def test_list_sessions_sorted_and_filtered(self):
         fw.ensure_data_dir(self.data_dir)
@@ -103,12 +708,69 @@ class TestQuotaGuard(FlashWriterTestBase):
         super().setUp()
         self._orig_free_bytes = fw._free_bytes
         self._orig_auto_rotate = fw.FLASH_AUTO_ROTATE
+        fw.space.invalidate()
 
     def tearDown(self):
         fw._free_bytes = self._orig_free_bytes
         fw.FLASH_AUTO_ROTATE = self._orig_auto_rotate
+        fw.space.invalidate()
         super().tearDown()
 
+    def test_free_space_is_cached_and_charged_for_writes(self):
+        calls = {'n': 0}
+
+        def fake_free_bytes(path='/'):
+            calls['n'] += 1
+            return 1_000_000
+
+        fw._free_bytes = fake_free_bytes
+        w = fw.FlashWriter(data_dir=self.data_dir)
+        w.start(start_epoch=0)
+        for k in range(2000):
+            w.write_sample(k * 1000, 1.0, 12.0, 12.0)
+        w.close()
+        fw.FlashWriter.quota_state()
+        fw.space.pct()
+        self.assertEqual(calls['n'], 1)       # one statvfs, at the first read
+        written = w.io_stats()['bytes_written']
+        self.assertEqual(fw.space.free(), 1_000_000 - written)
+        self.assertEqual(fw.space.refresh(), -written)    # reconciled
+        self.assertEqual(calls['n'], 2)
+
+    def test_seconds_left_from_measured_record_cost(self):
+        fw._free_bytes = lambda path='/': fw.FLASH_MIN_FREE + 80_000
+        w = fw.FlashWriter(data_dir=self.data_dir, sample_rate_hz=100)
+        self.assertEqual(w.seconds_left(), 100)      # v1: 8 B/record prior
+        fw.space.invalidate()
+        v2 = fw.FlashWriter(data_dir=self.data_dir, sample_rate_hz=100,
+                            version=lr.HEADER_VERSION_V2)
+        v2.start(start_epoch=0)
+        for k in range(20000):
+            v2.write_sample(k * 10000, 1.0, 12.0, 12.0)
+        left = v2.seconds_left()
+        bpr = (v2.io_stats()['bytes_written'] + v2._enc.nbytes()) / 20000
+        self.assertLess(bpr, 2)                       # steady v2 compresses
+        self.assertEqual(left, int((fw.space.free() - fw.FLASH_MIN_FREE) / (bpr * 100)))
+        v2.close()
+        self.assertGreater(v2.seconds_left(), 0)
+        fw._free_bytes = lambda path='/': fw.FLASH_MIN_FREE - 1
+        fw.space.refresh()
+        self.assertEqual(v2.seconds_left(), 0)
+
+    def test_record_cost_prior_skips_compacted_entries(self):
+        idx = fw.load_index(self.data_dir)
+        idx['sessions']['session_a.bin'] = dict(fw._entry(3000), records=1000)
+        idx['sessions']['session_b.bin'] = dict(fw._entry(500), records=1000, bucket_ms=50)
+        v2 = fw.FlashWriter(data_dir=self.data_dir, version=lr.HEADER_VERSION_V2)
+        self.assertEqual(v2._bytes_per_record(), 3.0)
+
+    def test_erase_rereads_free_space(self):
+        fw._free_bytes = lambda path='/': 10
+        self.assertEqual(fw.space.free(), 10)
+        fw._free_bytes = lambda path='/': 500
+        fw.erase_all(self.data_dir)
+        self.assertEqual(fw.space.free(), 500)
+
     def test_quota_state_ok(self):
         fw._free_bytes = lambda path='/': fw.FLASH_LOW_WARN + 1
         self.assertEqual(fw.FlashWriter.quota_state(), 'ok')
@@ -0,0 +1,169 @@
+# Copyright @ 2026 Adrian Blakey. All rights reserved
+# test_live_frames.py — live_frames.py has no hardware imports, so frame
+# filling, the fan-out and the subscriber policies are tested directly, fed
+# from a real SampleRing, against a stand-in for primitives.RingbufQueue
+# (pico/lib shadows CPython's logging, so the real one can't be imported
+# here) with the same full/overwrite behaviour.
+
+import sys
+import os
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'src'))
+
+import array
+import unittest
+from live_frames import Frame, Fanout, Subscriber, GAP, DECIMATE
+from sample_ring import SampleRing
+from record_queue import RecordQueue
+
+
+class _Queue:
+    """RingbufQueue(size)'s non-async half: holds size - 1 items, and
+    put_nowait on a full queue overwrites the oldest and raises IndexError."""
+
+    def __init__(self, size):
+        self._q = [0] * size
+        self._size = size
+        self._wi = self._ri = 0
+
+    def full(self):
+        return (self._wi + 1) % self._size == self._ri
+
+    def empty(self):
+        return self._ri == self._wi
+
+    def qsize(self):
+        return (self._wi - self._ri) % self._size
+
+    def get_nowait(self):
+        if self.empty():
+            raise IndexError
+        r = self._q[self._ri]
+        self._ri = (self._ri + 1) % self._size
+        return r
+
+    def put_nowait(self, v):
+        self._q[self._wi] = v
+        self._wi = (self._wi + 1) % self._size
+        if self._wi == self._ri:
+            self._ri = (self._ri + 1) % self._size
+            raise IndexError
+
+
+def _ring(n, slots=256):
+    ring = SampleRing(slots)
+    for k in range(n):
+        ring.put(k, 100 + k, 200, 300)
+    return ring
+
+
+class _Tap:
+
+    def __init__(self):
+        self.ts = []
+
+    def feed(self, d, n):
+        self.ts += [d[k] for k in range(0, n * 4, 4) if d[k + 1] != GAP]
+
+
+class TestFanout(unittest.TestCase):
+
+    def test_no_subscribers_still_feeds_taps(self):
+        fo = Fanout(8)
+        tap = _Tap()
+        fo.tap(tap)
+        self.assertEqual(fo.pump(_ring(20).get, 256), 20)
+        self.assertEqual(tap.ts, list(range(20)))
+
+    def test_record_queue_gets_a_copy(self):
+        fo = Fanout(8)
+        rq = RecordQueue(8)
+        sub = fo.subscribe(rq, 8, 'flash')
+        fo.pump(_ring(1).get, 256)
+        fo.frame.data[1] = 0                      # the frame is reused
+        dst = array.array('i', [0] * 4)
+        self.assertEqual(rq.get_many_nowait(dst), 1)
+        self.assertEqual(list(dst), [0, 100, 200, 300])
+        self.assertEqual(sub.stats()['policy'], 'lossless')
+
+    def test_lossless_full_leaves_samples_in_ring(self):
+        fo = Fanout(8)
+        rq = RecordQueue(10)
+        sub = fo.subscribe(rq, 10, 'flash')
+        ring = _ring(30)
+        self.assertEqual(fo.pump(ring.get, 256), 9)   # a row kept for a gap
+        self.assertEqual(ring.available(), 21)
+        self.assertEqual(fo.pump(ring.get, 256), 0)
+        self.assertEqual(fo.held, 1)
+        dst = array.array('i', [0] * 40)
+        rq.get_many_nowait(dst)
+        self.assertEqual(fo.pump(ring.get, 256), 9)
+        self.assertEqual(sub.dropped, 0)
+
+    def test_unsubscribe(self):
+        fo = Fanout(8)
+        sub = fo.subscribe(RecordQueue(8), 8, 'flash')
+        fo.unsubscribe(sub)
+        fo.unsubscribe(sub)
+        self.assertEqual(fo.subscribers, [])
+        self.assertEqual(fo.pump(_ring(20).get, 256), 20)
+
+
+class TestDecimate(unittest.TestCase):
+
+    def test_skips_every_other_item_under_pressure(self):
+        q = _Queue(9)
+        sub = Subscriber(q, 8, DECIMATE, 'ws')
+        for k in range(12):
+            sub.offer(k)
+        # The first 4 fill it to half; from then on every other item is
+        # skipped, and it fills without dropping any it holds.
+        got = []
+        while not q.empty():
+            got.append(q.get_nowait())
+        self.assertEqual(got, [0, 1, 2, 3, 5, 7, 9, 11])
+        self.assertEqual(sub.dropped, 4)
+        self.assertEqual(sub.high_water, 8)
+
+    def test_full_drops_oldest(self):
+        q = _Queue(3)
+        sub = Subscriber(q, 2, DECIMATE, 'ws')
+        for k in range(6):
+            sub.offer(k)
+        self.assertEqual(sub.dropped, 4)
+        self.assertEqual(sub.high_water, 2)
+        self.assertEqual([q.get_nowait(), q.get_nowait()], [2, 4])
+
+
+class TestFrame(unittest.TestCase):
+
+    def test_fill_until_ring_empty(self):
+        ring = SampleRing(16)
+        for k in range(3):
+            ring.put(k, 100 + k, 200, 300)
+        f = Frame(8)
+        self.assertEqual(f.fill(ring.get), 3)
+        self.assertFalse(f.full())
+        self.assertEqual(list(f.data[0:12]),
+                         [0, 100, 200, 300, 1, 101, 200, 300, 2, 102, 200, 300])
+
+    def test_fill_until_frame_full(self):
+        ring = SampleRing(16)
+        for k in range(10):
+            ring.put(k, 0, 0, 0)
+        f = Frame(4)
+        self.assertEqual(f.fill(ring.get), 3)     # keeps a row spare for a gap
+        self.assertTrue(f.full())
+        self.assertEqual(ring.available(), 7)
+
+    def test_fill_puts_gap_row_before_sample(self):
+        ring = SampleRing(4)
+        for k in range(6):
+            ring.put(k, 100 + k, 200, 300)
+        f = Frame(8)
+        self.assertEqual(f.fill(ring.get), 3)
+        self.assertEqual(f.n, 4)
+        self.assertEqual(list(f.data[0:8]), [3, GAP, 3, 0, 3, 103, 200, 300])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,108 @@
+# Copyright @ 2026 Adrian Blakey. All rights reserved
+# test_live_view.py — live_view.py has no hardware imports; it's fed rows
+# directly and through a Fanout tap, with identity units so the figures in
+# each line are the raw counts.
+
+import sys
+import os
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'src'))
+
+import array
+import unittest
+from live_frames import Fanout, GAP
+from live_view import LiveView, DEFAULT_RATE
+from sample_ring import SampleRing
+from test_live_frames import _Queue
+
+
+def _units(i, vt, vs):
+    return (i, vt, vs)
+
+
+def _rows(samples):
+    return array.array('i', [v for s in samples for v in s])
+
+
+def _lines(q):
+    out = []
+    while not q.empty():
+        out.append([float(x) for x in q.get_nowait().split(',')])
+    return out
+
+
+class TestLiveView(unittest.TestCase):
+
+    def test_bucket_min_max_mean(self):
+        v = LiveView(_units)
+        q = _Queue(9)
+        v.subscribe(10, q, 8)
+        # 200 Hz for 0.25 s: two whole 100 ms buckets, the third still open.
+        samples = [(k * 5000, k, 1000 - k, 500) for k in range(50)]
+        v.feed(_rows(samples), len(samples))
+        lines = _lines(q)
+        self.assertEqual(len(lines), 2)
+        self.assertEqual(lines[0], [9.5, 990.5, 500, 0, 981, 500, 19, 1000, 500])
+        self.assertEqual(lines[1], [29.5, 970.5, 500, 20, 961, 500, 39, 980, 500])
+        self.assertEqual(v.lines, 2)
+
+    def test_gap_rows_skipped(self):
+        v = LiveView(_units)
+        q = _Queue(9)
+        v.subscribe(50, q, 8)
+        samples = [(0, 10, 10, 10), (5000, GAP, 99, 0), (5000, 20, 20, 20),
+                   (20000, 30, 30, 30)]
+        v.feed(_rows(samples), len(samples))
+        self.assertEqual(_lines(q), [[15, 15, 15, 10, 10, 10, 20, 20, 20]])
+
+    def test_one_line_shared_by_every_viewer(self):
+        v = LiveView(_units)
+        qs = [_Queue(9) for _ in range(3)]
+        for q in qs:
+            v.subscribe(20, q, 8)
+        samples = [(k * 5000, k, k, k) for k in range(11)]
+        v.feed(_rows(samples), len(samples))
+        items = [q.get_nowait() for q in qs]
+        self.assertIs(items[0], items[1])
+        self.assertIs(items[1], items[2])
+        self.assertEqual(v.lines, 1)
+
+    def test_no_viewers_no_work(self):
+        v = LiveView(_units)
+        samples = [(k * 5000, k, k, k) for k in range(100)]
+        v.feed(_rows(samples), len(samples))
+        self.assertEqual(v.lines, 0)
+
+    def test_slow_viewer_is_decimated(self):
+        v = LiveView(_units)
+        q = _Queue(5)
+        sub = v.subscribe(50, q, 4)
+        samples = [(k * 5000, k, k, k) for k in range(41)]
+        v.feed(_rows(samples), len(samples))       # 10 lines, never read
+        self.assertEqual(len(_lines(q)), 4)
+        self.assertEqual(sub.dropped, 6)
+        self.assertEqual(sub.high_water, 4)
+        v.unsubscribe(sub)
+        self.assertEqual(v.stats(), [])
+
+    def test_rate_query(self):
+        v = LiveView(_units)
+        self.assertEqual(v.rate('50'), 50)
+        self.assertEqual(v.rate(None), DEFAULT_RATE)
+        self.assertEqual(v.rate('13'), DEFAULT_RATE)
+        self.assertEqual(v.rate('fast'), DEFAULT_RATE)
+
+    def test_fed_by_fanout_tap(self):
+        fo = Fanout(8)
+        v = LiveView(_units)
+        fo.tap(v)
+        q = _Queue(9)
+        v.subscribe(10, q, 8)
+        ring = SampleRing(64)
+        for k in range(41):
+            ring.put(k * 5000, 100, 200, 300)
+        self.assertEqual(fo.pump(ring.get, 256), 41)
+        self.assertEqual(len(_lines(q)), 2)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -3,6 +3,7 @@
 # No hardware imports in log_record.py, so this runs on plain CPython.
 
 import io
+import struct
 import sys
 import os
 import unittest
@@ -131,5 +132,448 @@ class TestHeader(unittest.TestCase):
             lr.read_header(f)
 
 
+class TestRecordEncoder(unittest.TestCase):
+    def test_packs_same_bytes_as_pack_record(self):
+        buf = bytearray(3 * lr.RECORD_SIZE)
+        enc = lr.RecordEncoder(buf)
+        enc.sample(0, 12.34, 11.98, 12.05)
+        enc.sample(5000, -3.5, 12.0, 12.0)       # +5 ms
+        enc.marker(7000, 11.9, 12.1)             # +2 ms
+        expected = (lr.pack_record(0, 12.34, 11.98, 12.05)
+                    + lr.pack_record(5, -3.5, 12.0, 12.0)
+                    + lr.pack_marker(2, 11.9, 12.1))
+        self.assertEqual(bytes(buf), expected)
+
+    def test_full_flag_and_overflow(self):
+        enc = lr.RecordEncoder(bytearray(2 * lr.RECORD_SIZE + 3))
+        self.assertEqual(enc.capacity(), 2)
+        self.assertFalse(enc.sample(0, 1.0, 1.0, 1.0))
+        self.assertTrue(enc.sample(1000, 1.0, 1.0, 1.0))
+        self.assertTrue(enc.full())
+        with self.assertRaises(IndexError):
+            enc.sample(2000, 1.0, 1.0, 1.0)
+
+    def test_clear_keeps_dt_state_reset_drops_it(self):
+        buf = bytearray(lr.RECORD_SIZE)
+        enc = lr.RecordEncoder(buf)
+        enc.sample(0, 1.0, 1.0, 1.0)
+        enc.clear()
+        enc.sample(5000, 1.0, 1.0, 1.0)
+        self.assertEqual(lr.unpack_record(bytes(buf))['dt_ms'], 5)
+        enc.reset()
+        enc.sample(9000, 1.0, 1.0, 1.0)
+        self.assertEqual(lr.unpack_record(bytes(buf))['dt_ms'], 0)
+
+    def test_clips_values_and_delta(self):
+        buf = bytearray(2 * lr.RECORD_SIZE)
+        enc = lr.RecordEncoder(memoryview(buf))
+        enc.sample(0, -400.0, -5.0, 700.0)
+        enc.sample(200_000_000, 1.0, 1.0, 1.0)   # +200 s
+        row = lr.unpack_record(bytes(buf[:lr.RECORD_SIZE]))
+        self.assertFalse(row['marker'])
+        self.assertAlmostEqual(row['current_A'], -327.67, places=2)
+        self.assertEqual(row['track_V'], 0.0)
+        self.assertAlmostEqual(row['supply_V'], 655.35, places=2)
+        self.assertEqual(lr.unpack_record(bytes(buf[lr.RECORD_SIZE:]))['dt_ms'], 65535)
+
+    def test_rejects_buffer_smaller_than_a_record(self):
+        with self.assertRaises(ValueError):
+            lr.RecordEncoder(bytearray(lr.RECORD_SIZE - 1))
+
+
+def _encode_v2(rows, block_size=lr.BLOCK_SIZE, blocks=2, crc=False):
+    """rows: (t_us, kind, amps, track_v, supply_v) — amps is the lost-sample
+    count for KIND_GAP. Returns a whole v2 session (header + blocks) as
+    bytes, draining like FlashWriter does."""
+    buf = bytearray(blocks * block_size)
+    enc = lr.BlockEncoder(buf, block_size, crc=crc)
+    out = io.BytesIO()
+    out.write(lr.pack_header(0, 200, '{}', version=lr.HEADER_VERSION_V2,
+                              block_size=block_size,
+                              flags=lr.FLAG_BLOCK_CRC if crc else 0))
+    for t, kind, a, vt, vs in rows:
+        if kind == lr.KIND_MARKER:
+            full = enc.marker(t, vt, vs)
+        elif kind == lr.KIND_GAP:
+            full = enc.gap(t, a)
+        else:
+            full = enc.sample(t, a, vt, vs)
+        if full:
+            out.write(buf)
+            enc.clear()
+    enc.finish()
+    out.write(bytes(buf[:enc.nbytes()]))
+    return out.getvalue()
+
+
+def _decode(blob):
+    f = io.BytesIO(blob)
+    hdr = lr.read_header(f)
+    return hdr, list(lr.iter_rows(f, hdr))
+
+
+def _v2_rows(n):
+    """n (t_us, kind, amps, track_v, supply_v) rows, a marker every 97."""
+    rows = []
+    for k in range(n):
+        kind = lr.KIND_MARKER if k % 97 == 50 else lr.KIND_DATA
+        rows.append((k * 5000 + (k % 3) * 300, kind,
+                      3.0 + ((k * 7) % 11 - 5) / 100.0, 11.5 + (k % 4) / 100.0, 12.0))
+    return rows
+
+
+class TestV2Blocks(unittest.TestCase):
+    def _rows(self, n):
+        return _v2_rows(n)
+
+    def _v1_equivalent(self, rows):
+        blob = lr.pack_header(0, 200, '{}')
+        t0 = rows[0][0]
+        last = 0
+        for t, kind, a, vt, vs in rows:
+            ms = (t - t0) // 1000           # drift-free: floor of the absolute time
+            dt, last = ms - last, ms
+            if kind == lr.KIND_MARKER:
+                blob += lr.pack_marker(dt, vt, vs)
+            else:
+                blob += lr.pack_record(dt, a, vt, vs)
+        return blob
+
+    def test_header_round_trip(self):
+        hdr, rows = _decode(lr.pack_header(7, 500, '{"lane": 2}',
+                                            version=lr.HEADER_VERSION_V2, block_size=256))
+        self.assertEqual(hdr['version'], lr.HEADER_VERSION_V2)
+        self.assertEqual(hdr['block_size'], 256)
+        self.assertEqual(hdr['sample_rate_hz'], 500)
+        self.assertEqual(hdr['profile'], {'lane': 2})
+        self.assertEqual(rows, [])
+
+    def test_timing_section_round_trip(self):
+        timing = {'edges_us': (50, 100, 250), 'counts': [1000, 20, 3, 1],
+                  'missed': 1, 'max_late_us': 5200}
+        self.assertEqual(lr.unpack_timing(lr.pack_timing(timing)), timing)
+
+    def test_header_records_oversample_after_buckets(self):
+        blob = lr.pack_header(0, 200, '{}', version=lr.HEADER_VERSION_V2,
+                               bucket_ms=50, oversample=8)
+        hdr = lr.read_header(io.BytesIO(blob))
+        self.assertEqual((hdr['bucket_ms'], hdr['oversample']), (50, 8))
+        self.assertTrue(hdr['flags'] & lr.FLAG_OVERSAMPLE)
+        plain = lr.pack_header(0, 200, '{}', version=lr.HEADER_VERSION_V2, oversample=1)
+        self.assertEqual(lr.read_header(io.BytesIO(plain))['flags'], 0)
+        self.assertEqual(lr.read_header(io.BytesIO(plain))['oversample'], 1)
+
+    def test_v1_header_keeps_oversample_in_profile(self):
+        blob = lr.pack_header(0, 200, '{"lane": 2}', oversample=4)
+        self.assertIn(b'"oversample": 4', blob)
+        hdr = lr.read_header(io.BytesIO(blob))
+        self.assertEqual((hdr['oversample'], hdr['profile']), (4, {'lane': 2}))
+        plain = lr.read_header(io.BytesIO(lr.pack_header(0, 200, '{"lane": 2}')))
+        self.assertEqual((plain['oversample'], plain['profile']), (1, {'lane': 2}))
+
+    def test_decodes_identically_to_v1(self):
+        rows = self._rows(2000)
+        hdr, v2 = _decode(_encode_v2(rows))
+        _hdr, v1 = _decode(self._v1_equivalent(rows))
+        self.assertEqual(v2, v1)
+        self.assertEqual(len(v2), 2000)
+        self.assertTrue(any(r[1] == lr.LAP_MARKER_SENTINEL for r in v2))
+
+    def test_compresses_slowly_varying_data(self):
+        rows = self._rows(5000)
+        v2 = _encode_v2(rows)
+        self.assertLess(len(v2) * 2, len(self._v1_equivalent(rows)))
+
+    def test_blocks_are_fixed_size_and_self_contained(self):
+        rows = self._rows(1000)
+        blob = _encode_v2(rows, block_size=128)
+        f = io.BytesIO(blob)
+        hdr = lr.read_header(f)
+        body = blob[hdr['header_size']:]
+        self.assertEqual(len(body) % 128, 0)
+        # Decoding from any block boundary yields that block's absolute rows.
+        all_rows = list(lr.iter_rows(io.BytesIO(body), hdr))
+        third = list(lr.iter_block(body[256:384]))
+        self.assertTrue(third)
+        self.assertEqual(third, all_rows[all_rows.index(third[0]):][:len(third)])
+
+    def test_torn_final_block_keeps_earlier_rows(self):
+        blob = _encode_v2(self._rows(1000), block_size=128)
+        _hdr, whole = _decode(blob)
+        _hdr, torn = _decode(blob[:-(128 + 64)])   # half of the penultimate block
+        self.assertLess(len(torn), len(whole))
+        self.assertEqual(torn, whole[:len(torn)])
+
+    def test_clear_mid_block_loses_nothing(self):
+        buf = bytearray(2 * 128)
+        enc = lr.BlockEncoder(buf, 128)
+        out = io.BytesIO()
+        out.write(lr.pack_header(0, 200, '{}', version=lr.HEADER_VERSION_V2, block_size=128))
+        rows = self._rows(300)
+        for k, (t, _kind, a, vt, vs) in enumerate(rows):
+            enc.sample(t, a, vt, vs)
+            if k % 40 == 39 or enc.full():        # periodic flush
+                out.write(bytes(buf[:enc.nbytes()]))
+                enc.clear()
+        enc.finish()
+        out.write(bytes(buf[:enc.nbytes()]))
+        _hdr, got = _decode(out.getvalue())
+        self.assertEqual(len(got), 300)
+
+    def test_bad_block_size_rejected(self):
+        with self.assertRaises(ValueError):
+            lr.BlockEncoder(bytearray(64), 16)
+        blob = lr.pack_header(0, 200, '{}', version=lr.HEADER_VERSION_V2, block_size=8)
+        with self.assertRaises(ValueError):
+            lr.read_header(io.BytesIO(blob))
+
+
+class TestTimebase(unittest.TestCase):
+    def _ticks(self, n, period_us=500):
+        """2 kHz ticks with +-37 us of jitter."""
+        return [k * period_us + (k * 37) % 75 - 37 for k in range(n)]
+
+    def _encode(self, ticks, unit_us):
+        buf = bytearray(2 * 256)
+        enc = lr.BlockEncoder(buf, 256, unit_us=unit_us)
+        out = io.BytesIO()
+        out.write(lr.pack_header(0, 2000, '{}', version=lr.HEADER_VERSION_V2,
+                                  block_size=256, time_unit_us=unit_us))
+        for t in ticks:
+            if enc.sample(t, 1.0, 12.0, 12.0):
+                out.write(buf)
+                enc.clear()
+        enc.finish()
+        out.write(bytes(buf[:enc.nbytes()]))
+        return out.getvalue()
+
+    def test_times_are_exact_in_any_unit(self):
+        ticks = self._ticks(20_000)
+        for unit in lr.TIME_UNITS_US:
+            hdr, rows = _decode(self._encode(ticks, unit))
+            self.assertEqual(hdr['time_unit_us'], unit)
+            self.assertEqual([r[0] for r in rows],
+                             [(t - ticks[0]) // unit for t in ticks])
+
+    def test_ms_record_encoder_does_not_drift(self):
+        enc = lr.RecordEncoder(bytearray(lr.RECORD_SIZE))
+        ticks = self._ticks(10_000, period_us=1300)
+        t_ms = 0
+        for t in ticks:
+            enc.sample(t, 0, 0, 0)
+            t_ms += struct.unpack_from(lr.RECORD_FMT, enc.buffer())[0]
+            enc.clear()
+        self.assertEqual(t_ms, (ticks[-1] - ticks[0]) // 1000)
+
+    def test_rows_window_is_in_ms(self):
+        ticks = self._ticks(4000)
+        r = lr.SessionReader(io.BytesIO(self._encode(ticks, 10)))
+        got = list(r.rows(1000, 1005))
+        self.assertTrue(got)
+        self.assertTrue(all(100_000 <= row[0] < 100_500 for row in got))
+        self.assertEqual(lr.format_ms(got[0][0], 10), '{:.2f}'.format(got[0][0] / 100))
+
+
+class TestBucketedRewrite(unittest.TestCase):
+    def test_header_carries_bucket_after_timebase(self):
+        blob = lr.pack_header(0, 200, '{}', version=lr.HEADER_VERSION_V2,
+                               time_unit_us=100, bucket_ms=50)
+        hdr = lr.read_header(io.BytesIO(blob))
+        self.assertEqual((hdr['time_unit_us'], hdr['bucket_ms']), (100, 50))
+        self.assertTrue(hdr['flags'] & lr.FLAG_BUCKETS)
+        self.assertEqual(lr.read_header(io.BytesIO(lr.pack_header(0, 200, '{}')))['bucket_ms'], 0)
+
+    def test_put_round_trips_stored_rows(self):
+        rows = [(0, 100, 1200, 1200), (0, 90, 1190, 1200), (10, -5, 1000, 1100),
+                (17, lr.LAP_MARKER_SENTINEL, 1000, 1100), (60, 120, 1300, 1250)]
+        buf = bytearray(lr.BLOCK_SIZE)
+        enc = lr.BlockEncoder(buf)
+        for t, i, vt, vs in rows:
+            enc.put(t, i, vt, vs, marker=i == lr.LAP_MARKER_SENTINEL)
+        enc.finish()
+        self.assertEqual(list(lr.iter_block(buf)), rows)
+
+
+class TestGapRecords(unittest.TestCase):
+    def _rows(self):
+        rows = [(k * 5000, lr.KIND_DATA, 2.0, 12.0, 12.5) for k in range(10)]
+        rows.append((50 * 5000, lr.KIND_GAP, 40, 0, 0))     # slots 10-49 lost
+        rows += [(k * 5000, lr.KIND_DATA, 2.5, 11.0, 12.5) for k in range(50, 60)]
+        return rows
+
+    def test_gap_row_decodes_before_the_next_sample(self):
+        _hdr, got = _decode(_encode_v2(self._rows()))
+        self.assertEqual(len(got), 21)
+        self.assertEqual(got[10], (250, lr.GAP_SENTINEL, 40, 0))
+        self.assertEqual(got[11], (250, 250, 1100, 1250))
+        self.assertEqual(got[9], (45, 200, 1200, 1250))
+        row = lr.row_dict(205, *got[10][1:])
+        self.assertEqual((row['gap'], row['marker'], row['current_A']), (40, False, None))
+        self.assertEqual(lr.row_dict(0, *got[11][1:])['gap'], 0)
+
+    def test_gap_is_not_a_sample_in_the_summary(self):
+        f = io.BytesIO(_encode_v2(self._rows()))
+        stats = dict(lr.SessionReader(f).rebuild_sections())[lr.TAG_SUMMARY]
+        summary = lr.unpack_summary(stats)
+        self.assertEqual((summary['samples'], summary['markers']), (20, 0))
+        self.assertEqual(summary['duration_ms'], 295)
+
+    def test_put_round_trips_gap_rows(self):
+        _hdr, rows = _decode(_encode_v2(self._rows()))
+        buf = bytearray(lr.BLOCK_SIZE)
+        enc = lr.BlockEncoder(buf)
+        for t, i, vt, vs in rows:
+            enc.put(t, i, vt, vs)
+        enc.finish()
+        self.assertEqual(list(lr.iter_block(buf)), rows)
+
+
+class TestBlockCrc(unittest.TestCase):
+    def _blob(self):
+        return _encode_v2(_v2_rows(1000), block_size=128, crc=True)
+
+    def test_crc_blocks_decode_like_plain_ones(self):
+        rows = _v2_rows(1000)
+        hdr, got = _decode(_encode_v2(rows, block_size=128, crc=True))
+        self.assertTrue(hdr['flags'] & lr.FLAG_BLOCK_CRC)
+        _hdr, plain = _decode(_encode_v2(rows, block_size=128))
+        self.assertEqual(got, plain)
+
+    def test_verify_clean_file(self):
+        blob = self._blob()
+        r = lr.verify(io.BytesIO(blob))
+        self.assertTrue(r['ok'])
+        self.assertTrue(r['crc'])
+        self.assertEqual(r['good_end'], len(blob))
+        self.assertEqual(r['good_end'], lr.read_header(io.BytesIO(blob))['header_size'] + r['blocks'] * 128)
+
+    def test_bit_flip_is_caught_and_block_skipped(self):
+        blob = bytearray(self._blob())
+        hsize = lr.read_header(io.BytesIO(blob))['header_size']
+        blob[hsize + 3 * 128 + 40] ^= 0x10        # inside the fourth block
+        r = lr.verify(io.BytesIO(blob))
+        self.assertFalse(r['ok'])
+        self.assertEqual(r['blocks'], 3)
+        self.assertEqual(r['good_end'], hsize + 3 * 128)
+        _hdr, whole = _decode(self._blob())
+        _hdr, got = _decode(bytes(blob))
+        self.assertLess(len(got), len(whole))
+        self.assertTrue(set(got) <= set(whole))
+
+    def test_torn_tail_reports_last_good_offset(self):
+        blob = self._blob()
+        r = lr.verify(io.BytesIO(blob[:-50]))
+        self.assertFalse(r['ok'])
+        self.assertEqual(r['good_end'], len(blob) - 128)
+
+    def test_v1_trims_to_whole_records(self):
+        blob = lr.pack_header(0, 200, '{}') + lr.pack_record(0, 1.0, 12.0, 12.0) * 3
+        self.assertTrue(lr.verify(io.BytesIO(blob))['ok'])
+        r = lr.verify(io.BytesIO(blob[:-3]))
+        self.assertFalse(r['ok'])
+        self.assertEqual(r['good_end'], len(blob) - lr.RECORD_SIZE)
+
+
+class TestSessionStats(unittest.TestCase):
+    def test_accumulates_in_physical_units(self):
+        st = lr.SessionStats()
+        st.sample(0, 100, 1200, 1250)       # 1 A @ 12 V, supply 12.5 V
+        st.sample(1000, 300, 1000, 1150)    # 3 A @ 10 V for 1 s
+        st.marker(500)
+        st.sample(500, 200, 1200, 1200)     # 2 A @ 12 V for 0.5 s
+        got = lr.unpack_summary(st.pack())
+        self.assertEqual(got['samples'], 3)
+        self.assertEqual(got['markers'], 1)
+        self.assertEqual(got['duration_ms'], 2000)
+        self.assertEqual((got['current_min_A'], got['current_max_A']), (1.0, 3.0))
+        self.assertAlmostEqual(got['current_mean_A'], 2.0, places=3)
+        self.assertAlmostEqual(got['supply_sag_V'], 1.0)
+        self.assertAlmostEqual(got['charge_Ah'], 4.0 / 3600, places=6)
+        self.assertAlmostEqual(got['energy_Wh'], 42.0 / 3600, places=5)
+
+    def test_folding_keeps_long_sessions_exact(self):
+        st = lr.SessionStats()
+        for _ in range(200_000):               # 1000 s at 200 Hz, 30 A @ 20 V
+            st.sample(5, 3000, 2000, 2000)
+        got = lr.unpack_summary(st.pack())
+        self.assertAlmostEqual(got['current_mean_A'], 30.0, places=3)
+        self.assertAlmostEqual(got['charge_Ah'], 30.0 * 1000 / 3600, places=3)
+        self.assertAlmostEqual(got['energy_Wh'], 600.0 * 1000 / 3600, places=1)
+
+    def test_empty_session(self):
+        got = lr.unpack_summary(lr.SessionStats().pack())
+        self.assertEqual(got['samples'], 0)
+        self.assertEqual(got['energy_Wh'], 0.0)
+
+
+class TestSessionReader(unittest.TestCase):
+    def _session(self, n=4000, trailer=True, block_size=128):
+        """v2 session with a sample every 5 ms, built like FlashWriter does."""
+        import array
+        idx = array.array('I')
+        buf = bytearray(block_size)
+        enc = lr.BlockEncoder(buf, block_size)
+        enc.reset(idx)
+        out = io.BytesIO()
+        out.write(lr.pack_header(0, 200, '{}', version=lr.HEADER_VERSION_V2,
+                                  block_size=block_size))
+        for k in range(n):
+            if enc.sample(k * 5000, (k % 9) / 10.0, 12.0, 11.0 + (k % 3) / 100.0):
+                out.write(buf)
+                enc.clear()
+        enc.finish()
+        out.write(bytes(buf[:enc.nbytes()]))
+        if trailer:
+            sec = lr.pack_section(lr.TAG_TIME_INDEX, idx.tobytes())
+            out.write(sec + lr.pack_trailer_end(len(sec)))
+        return out.getvalue()
+
+    def test_trailer_located_and_excluded_from_rows(self):
+        r = lr.SessionReader(io.BytesIO(self._session()))
+        self.assertIsNotNone(r.index())
+        self.assertEqual(len(r.index()), r.n_blocks())
+        rows = list(r.rows())
+        self.assertEqual(len(rows), 4000)
+        self.assertEqual(rows[-1][0], 3999 * 5)
+
+    def test_time_range_with_index(self):
+        r = lr.SessionReader(io.BytesIO(self._session()))
+        got = [row[0] for row in r.rows(7_003, 9_000)]
+        self.assertEqual(got, list(range(7_005, 9_000, 5)))
+
+    def test_time_range_without_trailer_bisects_keyframes(self):
+        r = lr.SessionReader(io.BytesIO(self._session(trailer=False)))
+        self.assertIsNone(r.index())
+        got = [row[0] for row in r.rows(7_003, 9_000)]
+        self.assertEqual(got, list(range(7_005, 9_000, 5)))
+        self.assertEqual(r.find_block(0), 0)
+
+    def test_find_block_reads_few_blocks(self):
+        blob = self._session(n=20000, trailer=False)
+        reads = []
+
+        class CountingIO(io.BytesIO):
+            def read(self, n=-1):
+                reads.append(n)
+                return super().read(n)
+
+        r = lr.SessionReader(CountingIO(blob))
+        del reads[:]
+        r.find_block(50_000)
+        self.assertLess(len(reads), 2 * r.n_blocks().bit_length() + 2)
+
+    def test_malformed_trailer_is_ignored(self):
+        blob = self._session()
+        r = lr.SessionReader(io.BytesIO(blob[:-3] + b'XYZ'))
+        self.assertIsNone(r.index())
+
+    def test_v1_range_is_a_scan(self):
+        blob = lr.pack_header(0, 200, '{}')
+        blob += b''.join(lr.pack_record(0 if k == 0 else 5, 1.0, 12.0, 12.0) for k in range(100))
+        r = lr.SessionReader(io.BytesIO(blob))
+        self.assertEqual(r.n_blocks(), 0)
+        self.assertEqual([row[0] for row in r.rows(100, 120)], [100, 105, 110, 115])
+
+
 if __name__ == '__main__':
     unittest.main()
@@ -0,0 +1,89 @@
+# Copyright @ 2026 Adrian Blakey. All rights reserved
+# test_record_queue.py — record_queue.py needs only asyncio, so it's tested
+# directly under CPython's.
+
+import sys
+import os
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'src'))
+
+import array
+import asyncio
+import unittest
+from record_queue import RecordQueue
+
+
+def _rows(*ts):
+    """Records (t, t+1, t+2, t+3), flattened."""
+    return array.array('i', [t + j for t in ts for j in range(4)])
+
+
+class TestRecordQueue(unittest.TestCase):
+
+    def test_put_get_in_order(self):
+        q = RecordQueue(8)
+        self.assertEqual(q.put_many(_rows(0, 10, 20), 3), 0)
+        self.assertEqual(q.qsize(), 3)
+        dst = array.array('i', [0] * 16)
+        self.assertEqual(q.get_many_nowait(dst), 3)
+        self.assertEqual(list(dst[:12]), list(_rows(0, 10, 20)))
+        self.assertTrue(q.empty())
+        self.assertEqual(q.get_many_nowait(dst), 0)
+
+    def test_get_limited_by_dst(self):
+        q = RecordQueue(8)
+        q.put_many(_rows(0, 10, 20), 3)
+        dst = array.array('i', [0] * 8)
+        self.assertEqual(q.get_many_nowait(dst), 2)
+        self.assertEqual(q.get_many_nowait(dst), 1)
+        self.assertEqual(list(dst[:4]), list(_rows(20)))
+
+    def test_put_offset(self):
+        q = RecordQueue(8)
+        q.put_many(_rows(0, 10, 20), 2, off=1)
+        dst = array.array('i', [0] * 32)
+        self.assertEqual(q.get_many_nowait(dst), 2)
+        self.assertEqual(list(dst[:8]), list(_rows(10, 20)))
+
+    def test_wraps(self):
+        q = RecordQueue(4)
+        dst = array.array('i', [0] * 16)
+        for base in range(0, 100, 30):
+            q.put_many(_rows(base, base + 10, base + 20), 3)
+            self.assertEqual(q.get_many_nowait(dst), 3)
+            self.assertEqual(list(dst[:12]), list(_rows(base, base + 10, base + 20)))
+        self.assertEqual(q.dropped, 0)
+
+    def test_full_drops_oldest(self):
+        q = RecordQueue(4)
+        q.put_many(_rows(0, 10, 20), 3)
+        self.assertEqual(q.put_many(_rows(30, 40, 50), 3), 2)
+        self.assertTrue(q.full())
+        dst = array.array('i', [0] * 16)
+        self.assertEqual(q.get_many_nowait(dst), 4)
+        self.assertEqual(list(dst), list(_rows(20, 30, 40, 50)))
+        self.assertEqual(q.dropped, 2)
+
+    def test_batch_larger_than_queue_keeps_newest(self):
+        q = RecordQueue(2)
+        q.put_many(_rows(0), 1)
+        self.assertEqual(q.put_many(_rows(10, 20, 30), 3), 2)   # 0 and 10
+        dst = array.array('i', [0] * 8)
+        self.assertEqual(q.get_many_nowait(dst), 2)
+        self.assertEqual(list(dst), list(_rows(20, 30)))
+
+    def test_get_many_waits_for_a_batch(self):
+        async def run():
+            q = RecordQueue(16)
+            dst = array.array('i', [0] * 64)
+            getter = asyncio.ensure_future(q.get_many(dst))
+            await asyncio.sleep(0)
+            self.assertFalse(getter.done())
+            q.put_many(_rows(0, 10, 20, 30, 40), 5)
+            return await getter, dst
+        got, dst = asyncio.run(run())
+        self.assertEqual(got, 5)
+        self.assertEqual(list(dst[:20]), list(_rows(0, 10, 20, 30, 40)))
+
+
+if __name__ == '__main__':
+    unittest.main()
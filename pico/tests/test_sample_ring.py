@@ -0,0 +1,146 @@
+# Copyright @ 2026 Adrian Blakey. All rights reserved
+# test_sample_ring.py — sample_ring.py has no hardware imports, so its
+# lock-free protocol is exercised directly: single-threaded for the
+# bookkeeping, then with a real producer thread racing the consumer.
+#
+# CPython's GIL makes each array store atomic, like a word store on the
+# RP2040, but with the switch interval forced down a thread switch can still
+# land between any two of put()'s stores or get()'s loads — exactly the
+# interleavings that would tear a slot if the protocol were wrong.
+
+import sys
+import os
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'src'))
+
+import array
+import threading
+import time
+import unittest
+from sample_ring import SampleRing, SEQ_MASK
+
+
+def _slot(k):
+    """Every field derived from the sequence number, so a slot mixing two
+    writes can't pass _check()."""
+    return (k, k & 0xFFFF, (k * 7) & 0xFFFF, (k ^ 0x5A5A) & 0xFFFF)
+
+
+class _SlowOut(list):
+    """get()'s destination, yielding the GIL on every field it's given —
+    the producer gets to run in the middle of each slot copy."""
+
+    def __setitem__(self, k, v):
+        super().__setitem__(k, v)
+        time.sleep(0)
+
+
+def _check(out):
+    k = out[0]
+    return tuple(out) == _slot(k)
+
+
+class TestSampleRing(unittest.TestCase):
+
+    def test_slots_must_be_power_of_two(self):
+        with self.assertRaises(ValueError):
+            SampleRing(100)
+
+    def test_fifo_and_empty(self):
+        r = SampleRing(8)
+        out = array.array('i', [0] * 4)
+        self.assertEqual(r.get(out), -1)
+        for k in range(5):
+            r.put(*_slot(k))
+        self.assertEqual(r.available(), 5)
+        for k in range(5):
+            self.assertEqual(r.get(out), 0)
+            self.assertEqual(tuple(out), _slot(k))
+        self.assertEqual(r.get(out), -1)
+
+    def test_lapped_consumer_skips_and_counts(self):
+        r = SampleRing(8)
+        out = array.array('i', [0] * 4)
+        for k in range(20):
+            r.put(*_slot(k))
+        # 20 written, 8 slots: only the newest 7 are safe to read (the 8th is
+        # the producer's next), so 13 are lost.
+        self.assertEqual(r.get(out), 13)
+        self.assertEqual(tuple(out), _slot(13))
+        self.assertEqual((r.overruns, r.lost), (1, 13))
+        got = []
+        while r.get(out) == 0:
+            got.append(out[0])
+        self.assertEqual(got, list(range(14, 20)))
+
+    def test_sequence_wraps(self):
+        r = SampleRing(4)
+        r.head[0] = r.tail[0] = SEQ_MASK - 1
+        out = array.array('i', [0] * 4)
+        for k in range(3):
+            r.put(*_slot(k))
+        self.assertEqual([r.get(out) for _ in range(3)], [0, 0, 0])
+        self.assertEqual(r.head[0], 1)
+        self.assertEqual(r.get(out), -1)
+
+
+class TestSampleRingStress(unittest.TestCase):
+
+    N = 50_000
+
+    def setUp(self):
+        self._interval = sys.getswitchinterval()
+        sys.setswitchinterval(1e-6)
+
+    def tearDown(self):
+        sys.setswitchinterval(self._interval)
+
+    def _run(self, slots):
+        """Race a producer thread against the consumer; every slot get()
+        returns must be whole and in order, and returned + lost must
+        account for every slot written."""
+        r = SampleRing(slots)
+        done = []
+
+        def producer():
+            put = r.put
+            for k in range(self.N):
+                put(*_slot(k))
+            done.append(True)
+
+        th = threading.Thread(target=producer)
+        out = _SlowOut([0] * 4)
+        seen = torn = 0
+        last = -1
+        th.start()
+        while True:
+            lost = r.get(out)
+            if lost < 0:
+                if not done:
+                    continue
+                # The producer may have published its last slot between
+                # that get() and setting done: look once more.
+                lost = r.get(out)
+                if lost < 0:
+                    break
+            if not _check(out):
+                torn += 1
+            self.assertGreater(out[0], last)
+            self.assertEqual(out[0] - last - 1, lost)
+            last = out[0]
+            seen += 1
+        th.join()
+        self.assertEqual(torn, 0)
+        self.assertEqual(last, self.N - 1)
+        self.assertEqual(seen + r.lost, self.N)
+        return r
+
+    def test_no_tearing_with_frequent_overruns(self):
+        r = self._run(4)          # tiny ring: the producer laps constantly
+        self.assertGreater(r.overruns, 0)
+
+    def test_no_tearing_with_room_to_spare(self):
+        self._run(256)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -22,6 +22,7 @@
 #   python3 tools/ble_cli.py profile --set track=Daytona --set lane=3
 #   python3 tools/ble_cli.py list-files
 #   python3 tools/ble_cli.py download session_20260101_120000.bin
+#   python3 tools/ble_cli.py laps session_20260101_120000.bin
 #
 # All commands except scan take --address to connect directly (skips
 # scanning — faster once you know the device's address) and --timeout for
@@ -56,7 +57,12 @@ PROFILE_UUID = "b1190efd-176f-4b32-a715-89b3425a4076"
 FILE_SELECT_UUID = "b1190f02-176f-4b32-a715-89b3425a4076"
 FILE_CHUNK_UUID  = "b1190f03-176f-4b32-a715-89b3425a4076"
 
-STATUS_FMT = "<BBHB"   # recording, flash_free_pct, record_count, wifi_up
+STATUS_FMT = "<BBHBHHH"  # recording, flash_free_pct, record_count, wifi_up, time_left_s,
+                         # core1_missed, core1_max_late_us
+# Older firmware sends only the leading fields: the base four, then each
+# later u16 was appended in turn. decode_status() reads what's there.
+STATUS_BASE_FMT = "<BBHB"
+STATUS_BASE_SIZE = struct.calcsize(STATUS_BASE_FMT)
 
 CMD_STOP, CMD_START, CMD_MARK, CMD_ERASE = 0, 1, 2, 3
 CMD_WIFI_START, CMD_WIFI_STOP = 4, 5
@@ -65,6 +71,7 @@ CMD_LANE_ROTATE, CMD_LANE_SET, CMD_RACE_TOGGLE = 6, 7, 8
 CTRL_NEXT = b"\x00"
 CTRL_LIST = b"\x01"
 CTRL_SELECT = 0x02
+CTRL_LAPS = 0x03
 
 # Minimum delay between writing "advance" and reading the next chunk.
 # Confirmed on hardware (see README's "found and fixed on hardware" #15):
@@ -77,12 +84,25 @@ PROFILE_FIELDS = ("track", "race", "lane", "controller", "car")
 
 
 def decode_status(raw: bytes) -> dict:
-    recording, flash_pct, record_count, wifi_up = struct.unpack(STATUS_FMT, bytes(raw))
+    """Decode the status characteristic; fields older firmware doesn't send
+    come back as None."""
+    raw = bytes(raw)
+    recording, flash_pct, record_count, wifi_up = struct.unpack_from(STATUS_BASE_FMT, raw)
+    extra = [None, None, None]      # time_left_s, core1_missed, core1_max_late_us
+    for k in range(len(extra)):
+        off = STATUS_BASE_SIZE + 2 * k
+        if len(raw) < off + 2:
+            break
+        extra[k] = struct.unpack_from("<H", raw, off)[0]
+    left, missed, max_late = extra
     return {
         "recording": bool(recording),
         "flash_free_pct": flash_pct,
         "record_count": record_count,
         "wifi_up": bool(wifi_up),
+        "time_left_s": None if left in (None, 0xFFFF) else left,
+        "core1_missed": missed,
+        "core1_max_late_us": max_late,
     }
 
 
@@ -147,8 +167,8 @@ async def fetch_file_list(client: BleakClient) -> list:
     return json.loads(raw.decode()) if raw else []
 
 
-async def download_by_index(client: BleakClient, index: int) -> bytes:
-    payload = bytes([CTRL_SELECT, index & 0xFF, (index >> 8) & 0xFF])
+async def download_by_index(client: BleakClient, index: int, ctrl: int = CTRL_SELECT) -> bytes:
+    payload = bytes([ctrl, index & 0xFF, (index >> 8) & 0xFF])
     await client.write_gatt_char(FILE_SELECT_UUID, payload, response=True)
     await asyncio.sleep(CHUNK_PACING_S)
     return await pull_chunks(client)
@@ -309,6 +329,34 @@ async def cmd_download(args) -> None:
         print("Wrote {} bytes to {}".format(len(data), out_path), file=sys.stderr)
 
 
+async def cmd_laps(args) -> None:
+    async with await connect(args) as client:
+        files = await fetch_file_list(client)
+        index = next((i for i, f in enumerate(files)
+                      if f["name"] == args.name and f["kind"] == "data"), None)
+        if index is None:
+            print("'{}' not found on device. Run list-files to see what's there.".format(
+                args.name), file=sys.stderr)
+            sys.exit(1)
+        raw = await download_by_index(client, index, CTRL_LAPS)
+        laps = json.loads(raw.decode()) if raw else []
+        if laps is None:
+            print("{} needs a full scan for its laps; stop recording and retry".format(
+                args.name), file=sys.stderr)
+            sys.exit(1)
+        if args.json:
+            print(json.dumps(laps, indent=2))
+            return
+        if not laps:
+            print("No lap markers in {}".format(args.name))
+            return
+        prev = 0
+        for n, lap in enumerate(laps, 1):
+            print("lap {:3d}  t={:>9} ms  ({:>7.3f} s)".format(
+                n, lap["t_ms"], (lap["t_ms"] - prev) / 1000))
+            prev = lap["t_ms"]
+
+
 # ── argument parsing ─────────────────────────────────────────────────────
 
 def build_parser() -> argparse.ArgumentParser:
@@ -379,6 +427,12 @@ def build_parser() -> argparse.ArgumentParser:
     sp.add_argument("-o", "--output", help="output path (default: same name, current directory)")
     sp.set_defaults(func=cmd_download)
 
+    sp = sub.add_parser("laps", help="fetch just a session's lap table (from the catalog or file trailer)")
+    add_common(sp)
+    sp.add_argument("name")
+    sp.add_argument("--json", action="store_true", help="raw JSON instead of a table")
+    sp.set_defaults(func=cmd_laps)
+
     return p
 
 
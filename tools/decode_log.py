@@ -3,14 +3,32 @@
 # tools/decode_log.py — decode a compact binary session log (see
 # pico/src/log_record.py) to CSV, or load it as a pandas DataFrame.
 #
-# The device stores 8 bytes/record instead of CSV text (see the "Flash
-# budget" section of the README for why) — this is the host-side tool that
-# turns that back into something readable/analysable.
+# The device stores 8 bytes/record (v1) or compressed delta/varint blocks
+# (v2, 'SCL2') instead of CSV text (see the "Flash budget" section of the
+# README for why) — this is the host-side tool that turns either back into
+# something readable/analysable.
+#
+# Decoding is bulk/vectorized when numpy is installed (decode_arrays(): one
+# read of the whole record region, one structured-dtype view over it, a
+# cumulative sum over dt_ms; for v2, every varint of every block split out
+# at once and each channel's deltas summed per block) — thousands of
+# multi-hour sessions decode in seconds instead of minutes. Without numpy
+# it falls back to the original per-record iter_records() path; the output
+# is identical either way.
+#
+# Samples the device lost to a ring overrun (v2 gap records, see
+# log_record's GAPS notes) are never interpolated over: they come out as a
+# row with empty readings and the lost-sample count in a last `gap`
+# column, and a count of them goes to stderr. Only a CSV with gap rows has
+# that column; a v1 session's, or a v2 session's without gaps, is unchanged.
 #
 # Usage:
 #   python3 tools/decode_log.py session_20260101_120000.bin
 #   python3 tools/decode_log.py session_20260101_120000.bin -o session.csv
 #   python3 tools/decode_log.py session_20260101_120000.bin --pandas
+#   python3 tools/decode_log.py session_20260101_120000.bin --from-ms 180000 --to-ms 240000
+#   python3 tools/decode_log.py session_20260101_120000.bin --summary
+#   python3 tools/decode_log.py /path/to/data/*.bin --verify
 
 import argparse
 import csv
@@ -20,80 +38,417 @@ import sys
 sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'pico', 'src'))
 import log_record as lr
 
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+# Structured dtype mirroring log_record.RECORD_FMT '<HhHH' field for field,
+# so a whole record region can be viewed in place with np.frombuffer.
+RECORD_DTYPE = None if np is None else np.dtype([
+    ('dt_ms', '<u2'), ('i_cA', '<i2'), ('vt_cV', '<u2'), ('vs_cV', '<u2'),
+])
+# Likewise log_record.BLOCK_HDR_FMT '<HIhHH', a v2 block's keyframe.
+BLOCK_HDR_DTYPE = None if np is None else np.dtype([
+    ('n', '<u2'), ('t', '<u4'), ('i_cA', '<i2'), ('vt_cV', '<u2'), ('vs_cV', '<u2'),
+])
 
-def iter_records(path):
-    """Yields ('header', dict) once, then ('record', dict) per row."""
+
+def iter_records(path, t_from=0, t_to=None):
+    """Yields ('header', dict) once, then ('record', dict) per row with
+    t_from <= elapsed ms < t_to. Reads both the v1 fixed-record and v2
+    compressed-block formats; a v2 time range seeks straight to it (see
+    log_record.SessionReader) instead of decoding from the start. Each
+    record dict is row_dict() plus 't_ms', the elapsed time (a float on a
+    sub-ms timebase, as is dt_ms)."""
     with open(path, 'rb') as f:
-        header = lr.read_header(f)
-        yield ('header', header)
-        while True:
-            buf = f.read(lr.RECORD_SIZE)
-            if len(buf) < lr.RECORD_SIZE:
-                break
-            yield ('record', lr.unpack_record(buf))
+        reader = lr.SessionReader(f)
+        yield ('header', reader.header)
+        prev_t = 0
+        scale = reader.header['scale']
+        unit = reader.header['time_unit_us']
+        for t, i, vt, vs in reader.rows(t_from, t_to):
+            row = lr.row_dict(lr.units_to_ms(t - prev_t, unit), i, vt, vs, scale)
+            row['t_ms'] = lr.units_to_ms(t, unit)
+            yield ('record', row)
+            prev_t = t
+
+
+def _unzigzag(z):
+    return (z >> 1) ^ -(z & 1)
+
+
+def _decode_blocks(raw, header):
+    """
+    Vectorized log_record.iter_rows() over a v2 record region (raw, read
+    from a block boundary): (t, i_cA, vt_cV, vs_cV) int64 arrays, row for
+    row what SessionReader.rows() yields — whole blocks only, bad-CRC
+    blocks skipped, a damaged block cut where iter_block() would stop.
+    """
+    bs = header['block_size']
+    n_blocks = len(raw) // bs
+    buf = np.frombuffer(raw, dtype=np.uint8, count=n_blocks * bs).reshape(n_blocks, bs)
+    if header['flags'] & lr.FLAG_BLOCK_CRC:
+        buf = buf[[lr.block_ok(raw[k * bs:(k + 1) * bs], bs, True) for k in range(n_blocks)]]
+    key = np.frombuffer(buf[:, :lr.BLOCK_HDR_SIZE].tobytes(), dtype=BLOCK_HDR_DTYPE)
+    body = buf[:, lr.BLOCK_HDR_SIZE:]
+    if not len(body):
+        empty = np.zeros(0, dtype=np.int64)
+        return empty, empty, empty, empty
+
+    # Every varint in every block at once: a byte under 0x80 ends one, and
+    # none runs past its block (one that would is marked torn, as is every
+    # record that uses it).
+    end = body < 0x80
+    torn = ~end[:, -1]
+    end[:, -1] = True
+    b = body.ravel().astype(np.int64) & 0x7F
+    end = end.ravel()
+    vid = np.cumsum(end) - end                     # varint each byte belongs to
+    start = np.flatnonzero(np.concatenate(([True], end[:-1])))
+    shift = np.minimum(7 * (np.arange(len(b)) - start[vid]), 63)
+    v = np.add.reduceat(b << shift, start)
+    n_v = len(v)
+    per_block = end.reshape(body.shape).sum(axis=1)
+    first = np.cumsum(per_block) - per_block       # each block's first varint
+    limit = first + per_block - torn               # ...and the end of its good ones
+
+    # Each record is a head varint plus one per changed channel; chase the
+    # heads through each block by pointer doubling.
+    mask = (v >> 2) & 7
+    # (n_v + 1, past every block's limit, stands for "off the end".)
+    nxt = np.minimum(np.arange(n_v) + 1 + (mask & 1) + (mask >> 1 & 1) + (mask >> 2),
+                     n_v + 1)
+    nxt = np.append(nxt, [n_v + 1, n_v + 1])
+    n = key['n'].astype(np.int64)
+    width = int(n.max()) if len(n) else 0
+    pos = np.empty((len(n), max(width, 1)), dtype=np.int64)
+    pos[:, 0] = first
+    jump = nxt
+    span = 1
+    while span < width:
+        pos[:, span:2 * span] = jump[pos[:, :min(span, width - span)]]
+        jump = jump[jump]
+        span *= 2
+    pos = pos[:, :width]
+    lim = limit[:, None]
+    ok = (pos < lim) & (nxt[pos] <= lim) & (np.arange(width) < n[:, None])
+    ok = np.logical_and.accumulate(ok, axis=1)
+    pos = np.where(ok, pos, 0)
+
+    vx = np.append(v, 0)
+    head = vx[pos]
+    kind = head & 3
+    m = (head >> 2) & 7
+    has_i, has_vt, has_vs = m & 1, m >> 1 & 1, m >> 2 & 1
+    d_i = np.where(has_i, _unzigzag(vx[pos + 1]), 0)
+    d_vt = np.where(has_vt, _unzigzag(vx[pos + 1 + has_i]), 0)
+    d_vs = np.where(has_vs, _unzigzag(vx[pos + 1 + has_i + has_vt]), 0)
+    dt = np.cumsum(_unzigzag(head >> 5), axis=1)
+    t = key['t'].astype(np.int64)[:, None] + np.cumsum(dt, axis=1)
+    i = key['i_cA'].astype(np.int64)[:, None] + np.cumsum(d_i, axis=1)
+    vt = key['vt_cV'].astype(np.int64)[:, None] + np.cumsum(d_vt, axis=1)
+    vs = key['vs_cV'].astype(np.int64)[:, None] + np.cumsum(d_vs, axis=1)
+    is_gap = kind == lr.KIND_GAP
+    out_i = np.where(is_gap, lr.GAP_SENTINEL,
+                     np.where(kind == lr.KIND_MARKER, lr.LAP_MARKER_SENTINEL, i))
+    out_vt = np.where(is_gap, i, vt)
+    out_vs = np.where(is_gap, 0, vs)
+    return t[ok], out_i[ok], out_vt[ok], out_vs[ok]
+
+
+def decode_arrays(path, t_from=0, t_to=None):
+    """
+    Bulk-decode a session with numpy. Returns (header dict, columns dict)
+    where columns holds equal-length arrays: t_ms (int64, cumulative),
+    current_A (float64, NaN on marker and gap rows), track_V, supply_V
+    (float64, NaN on gap rows), marker (bool) and gap (int64, samples lost
+    just before the row, else 0), limited to t_from <= t_ms < t_to. A torn trailing
+    partial record is ignored, same as iter_records(). Requires numpy.
+    """
+    with open(path, 'rb') as f:
+        reader = lr.SessionReader(f)
+        header = reader.header
+        if header['version'] == lr.HEADER_VERSION_V2:
+            # Same window as reader.rows(): seek to its first block, compare
+            # in the session's time units.
+            unit = header['time_unit_us']
+            lo, hi = -(-t_from * 1000 // unit), None
+            if t_to is not None:
+                hi = -(-t_to * 1000 // unit)
+            start = header['header_size']
+            if lo > 0:
+                start += reader.find_block(lo) * header['block_size']
+            f.seek(start)
+            t_ms, i_cA, vt_cV, vs_cV = _decode_blocks(
+                f.read(max(reader.data_end - start, 0)), header)
+            keep = t_ms >= lo
+            if hi is not None:
+                # rows() stops at the first row past the window.
+                keep &= np.logical_and.accumulate(t_ms < hi)
+            t_ms, i_cA, vt_cV, vs_cV = t_ms[keep], i_cA[keep], vt_cV[keep], vs_cV[keep]
+            if unit != 1000:
+                t_ms = t_ms * (unit / 1000)
+        else:
+            raw = f.read()
+            n = len(raw) // lr.RECORD_SIZE
+            rec = np.frombuffer(raw, dtype=RECORD_DTYPE, count=n)
+            t_ms = np.cumsum(rec['dt_ms'], dtype=np.int64)
+            i_cA, vt_cV, vs_cV = rec['i_cA'], rec['vt_cV'], rec['vs_cV']
+            if t_from > 0 or t_to is not None:
+                keep = t_ms >= t_from
+                if t_to is not None:
+                    keep &= t_ms < t_to
+                t_ms, i_cA, vt_cV, vs_cV = t_ms[keep], i_cA[keep], vt_cV[keep], vs_cV[keep]
+    marker = i_cA == lr.LAP_MARKER_SENTINEL
+    is_gap = i_cA == lr.GAP_SENTINEL
+    gap = np.where(is_gap, vt_cV, 0).astype(np.int64)
+    scale = header['scale']
+    if scale is None:
+        current_A = i_cA / 100.0
+        track_V, supply_V = vt_cV / 100.0, vs_cV / 100.0
+    else:
+        i_zero, a, v = scale          # raw ADC counts (see log_record.raw_scale)
+        current_A = (i_cA - i_zero) * a
+        track_V, supply_V = vt_cV * v, vs_cV * v
+    current_A[marker | is_gap] = np.nan
+    track_V[is_gap] = np.nan
+    supply_V[is_gap] = np.nan
+    return header, {
+        't_ms': t_ms,
+        'current_A': current_A,
+        'track_V': track_V,
+        'supply_V': supply_V,
+        'marker': marker,
+        'gap': gap,
+    }
+
+
+def _write_csv_header(out, writer, header, gaps):
+    for k, v in header['profile'].items():
+        out.write('# {}={}\n'.format(k, v))
+    out.write('# start_epoch={}\n'.format(header['start_epoch']))
+    out.write('# sample_rate_hz={}\n'.format(header['sample_rate_hz']))
+    if header['time_unit_us'] != 1000:
+        out.write('# time_unit_us={}\n'.format(header['time_unit_us']))
+    if header['oversample'] > 1:
+        out.write('# oversample={}\n'.format(header['oversample']))
+    cols = ['t_ms', 'current_A', 'track_V', 'supply_V', 'marker']
+    if header['bucket_ms']:
+        # Compacted session: data rows are (min, max, mean) triples per
+        # bucket (see log_record's BUCKETS notes), labelled in a stat column.
+        out.write('# bucket_ms={}\n'.format(header['bucket_ms']))
+        cols.append('stat')
+    if gaps:
+        cols.append('gap')
+    writer.writerow(cols)
+
+
+def _report_gaps(gaps, lost):
+    if gaps:
+        print('warning: {} gap(s), {} sample(s) lost on the device'.format(gaps, lost),
+              file=sys.stderr)
+
+
+def _bucket_stats(markers):
+    """'min'/'max'/'mean' per row of a compacted session ('' on markers
+    and gaps — pass both as true)."""
+    k = 0
+    for m in markers:
+        if m:
+            yield ''
+        else:
+            yield lr.BUCKET_STATS[k % 3]
+            k += 1
 
 
-def to_csv(path, out):
+def _has_gaps(path, t_from, t_to):
+    """Whether the rows to_csv() will write include any gap rows — always
+    False for v1, which has no gap records; a v2 session is scanned."""
+    with open(path, 'rb') as f:
+        reader = lr.SessionReader(f)
+        if reader.header['version'] != lr.HEADER_VERSION_V2:
+            return False
+        return any(i == lr.GAP_SENTINEL for _, i, _, _ in reader.rows(t_from, t_to))
+
+
+def _to_csv_numpy(path, out, t_from, t_to):
+    header, cols = decode_arrays(path, t_from, t_to)
+    writer = csv.writer(out)
+    has_gaps = bool(cols['gap'].any())
+    _write_csv_header(out, writer, header, has_gaps)
+    t_col = cols['t_ms'].tolist()
+    unit = header['time_unit_us']
+    if unit != 1000:
+        t_col = [lr.format_ms(round(t * 1000 / unit), unit) for t in t_col]
+    gaps = cols['gap'].tolist()
+    rows = (
+        (t, '', '', '', 0) if g else
+        (t, '' if m else '{:.2f}'.format(i), '{:.2f}'.format(vt),
+         '{:.2f}'.format(vs), 1 if m else 0)
+        for t, i, vt, vs, m, g in zip(
+            t_col, cols['current_A'].tolist(),
+            cols['track_V'].tolist(), cols['supply_V'].tolist(),
+            cols['marker'].tolist(), gaps))
+    if header['bucket_ms']:
+        skip = (cols['marker'] | (cols['gap'] > 0)).tolist()
+        rows = (r + (s,) for r, s in zip(rows, _bucket_stats(skip)))
+    if has_gaps:
+        rows = (r + (g,) for r, g in zip(rows, gaps))
+    writer.writerows(rows)
+    _report_gaps(sum(1 for g in gaps if g), sum(gaps))
+
+
+def to_csv(path, out, t_from=0, t_to=None):
+    if np is not None:
+        _to_csv_numpy(path, out, t_from, t_to)
+        return
     writer = csv.writer(out)
-    t_ms = 0
-    for kind, item in iter_records(path):
+    unit = 1000
+    bucketed = False
+    has_gaps = _has_gaps(path, t_from, t_to)
+    k = 0
+    gaps = lost = 0
+    for kind, item in iter_records(path, t_from, t_to):
         if kind == 'header':
-            for k, v in item['profile'].items():
-                out.write('# {}={}\n'.format(k, v))
-            out.write('# start_epoch={}\n'.format(item['start_epoch']))
-            out.write('# sample_rate_hz={}\n'.format(item['sample_rate_hz']))
-            writer.writerow(['t_ms', 'current_A', 'track_V', 'supply_V', 'marker'])
+            _write_csv_header(out, writer, item, has_gaps)
+            unit = item['time_unit_us']
+            bucketed = bool(item['bucket_ms'])
+            continue
+        t = lr.format_ms(round(item['t_ms'] * 1000 / unit), unit)
+        if item['gap']:
+            gaps += 1
+            lost += item['gap']
+            writer.writerow([t, '', '', '', 0] + ([''] if bucketed else []) + [item['gap']])
             continue
-        t_ms += item['dt_ms']
-        writer.writerow([
-            t_ms,
+        row = [
+            t,
             '' if item['marker'] else '{:.2f}'.format(item['current_A']),
             '{:.2f}'.format(item['track_V']),
             '{:.2f}'.format(item['supply_V']),
             1 if item['marker'] else 0,
-        ])
+        ]
+        if bucketed:
+            if item['marker']:
+                row.append('')
+            else:
+                row.append(lr.BUCKET_STATS[k % 3])
+                k += 1
+        if has_gaps:
+            row.append(0)
+        writer.writerow(row)
+    _report_gaps(gaps, lost)
 
 
-def to_dataframe(path):
+def to_dataframe(path, t_from=0, t_to=None):
     """Return (pandas.DataFrame, header dict). Requires pandas."""
     import pandas as pd
+    if np is not None:
+        header, cols = decode_arrays(path, t_from, t_to)
+        return pd.DataFrame(cols), header
     rows = []
     header = None
-    t_ms = 0
-    for kind, item in iter_records(path):
+    for kind, item in iter_records(path, t_from, t_to):
         if kind == 'header':
             header = item
             continue
-        t_ms += item['dt_ms']
         rows.append({
-            't_ms': t_ms,
+            't_ms': item['t_ms'],
             'current_A': None if item['marker'] else item['current_A'],
             'track_V': item['track_V'],
             'supply_V': item['supply_V'],
             'marker': item['marker'],
+            'gap': item['gap'],
         })
     return pd.DataFrame(rows), header
 
 
+def summary(path):
+    """(summary dict, source): the session's trailer summary if it has one
+    ('trailer' — no records read), else one computed by a full scan
+    ('scan')."""
+    with open(path, 'rb') as f:
+        reader = lr.SessionReader(f)
+        stats = reader.summary()
+        if stats is not None:
+            return stats, 'trailer'
+        return reader.summarize(), 'scan'
+
+
+def core1_timing(path):
+    """The trailer's Core 1 pacing record (log_record.unpack_timing()), or
+    None if the session has none."""
+    with open(path, 'rb') as f:
+        return lr.SessionReader(f).timing()
+
+
+def verify(path):
+    """log_record.verify() report for one file — block CRCs/keyframes only,
+    no record decoding."""
+    with open(path, 'rb') as f:
+        return lr.verify(f)
+
+
 def main():
     ap = argparse.ArgumentParser(description=__doc__)
-    ap.add_argument('path', help='binary session file (.bin)')
+    ap.add_argument('path', nargs='+', help='binary session file (.bin); several with --verify')
     ap.add_argument('-o', '--output', help='output CSV path (default: stdout)')
     ap.add_argument('--pandas', action='store_true',
                      help='load with pandas and print a summary instead of CSV')
+    ap.add_argument('--from-ms', type=int, default=0,
+                     help='only rows at or after this elapsed time (ms)')
+    ap.add_argument('--to-ms', type=int, default=None,
+                     help='only rows before this elapsed time (ms)')
+    ap.add_argument('--summary', action='store_true',
+                     help='print the session summary (current, supply sag, Ah, Wh) instead of CSV')
+    ap.add_argument('--verify', action='store_true',
+                     help='check block integrity (CRCs) and report the last good offset; '
+                          'exit status 1 if any file is damaged')
     args = ap.parse_args()
 
+    if args.verify:
+        damaged = 0
+        for path in args.path:
+            r = verify(path)
+            state = 'ok' if r['ok'] else 'DAMAGED'
+            if r['ok'] and not r['closed'] and r['version'] == lr.HEADER_VERSION_V2:
+                state = 'ok (no trailer)'
+            print('{}: {} v{} crc={} blocks={} good_end={} size={}'.format(
+                path, state, r['version'], r['crc'], r['blocks'], r['good_end'], r['size']))
+            damaged += not r['ok']
+        sys.exit(1 if damaged else 0)
+    if len(args.path) != 1:
+        ap.error('only --verify takes more than one file')
+    args.path = args.path[0]
+
+    if args.summary:
+        stats, source = summary(args.path)
+        print('# from {}'.format(source))
+        for key, value in stats.items():
+            print('{:16s} {}'.format(key, value))
+        timing = core1_timing(args.path)
+        if timing is not None:
+            print('# core 1 pacing')
+            print('{:16s} {}'.format('missed_slots', timing['missed']))
+            print('{:16s} {}'.format('max_late_us', timing['max_late_us']))
+            lo = 0
+            for hi, count in zip(timing['edges_us'] + (None,), timing['counts']):
+                label = 'late<{}us'.format(hi) if hi is not None else 'late>={}us'.format(lo)
+                print('{:16s} {}'.format(label, count))
+                lo = hi
+        return
+
     if args.pandas:
-        df, header = to_dataframe(args.path)
+        df, header = to_dataframe(args.path, args.from_ms, args.to_ms)
         print('Session header:', header)
         print(df.describe())
         return
 
     if args.output:
         with open(args.output, 'w', newline='') as out:
-            to_csv(args.path, out)
+            to_csv(args.path, out, args.from_ms, args.to_ms)
     else:
-        to_csv(args.path, sys.stdout)
+        to_csv(args.path, sys.stdout, args.from_ms, args.to_ms)
 
 
 if __name__ == '__main__':